@@ -7,14 +7,28 @@ import time
 import matplotlib
 import logging
 import sys
+from concurrent.futures import Future
 from PyQt6 import QtCore, QtGui, QtWidgets
 from matplotlib.backends.backend_qt import NavigationToolbar2QT as NavigationToolbar
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
 from matplotlib.figure import Figure
 from motorController import MotorController
-from arduinoController import ArduinoController
+from arduinoController import ArduinoController, VentState
+from ringBuffer import RingBuffer
+from pressureLogger import PressureLogger, BinaryPressureLogger
+from calibration import PressureCalibration
+from sequenceEngine import SequenceEngine
+from sequenceCompiler import compile_sequence, SequenceError, SequenceProgram
+from sequenceWatcher import (SequenceFileWatcher, write_atomic,
+                             SEQUENCE_PATH, PROSPA_PATH)
+from motionProfile import MotionProfile, plan_motion
+from reconnectSupervisor import ReconnectSupervisor
+from portDiscovery import PortDiscovery
+from modbusTransport import (get_transport, DeadlineExceeded, Priority,
+                             log_failure)
 from pathlib import Path
 import os
+import numpy as np
 os.environ['MPLCONFIGDIR'] = str(Path.home())+"/.matplotlib/"
 matplotlib.use('QtAgg')
 
@@ -25,7 +39,7 @@ class Ui_MainWindow(object):
 
         # Initialise variables
 
-        # how frequently the valve states are checked (ms)
+        # how frequently the pressures and valve states are sampled (ms)
         self.valveCheckInterval = 100
 
         # List of valve settings for each step type
@@ -104,6 +118,9 @@ class Ui_MainWindow(object):
         self.motor_connected = False
 
         self.vent_flag = False
+        # Quick vent running in the firmware, and whether it has reported in
+        self.quick_venting = False
+        self.quick_vent_started = False
 
         # Show debug logs
         self.verbosity = False
@@ -117,11 +134,23 @@ class Ui_MainWindow(object):
         # Bool to track pressure reading saving
         self.saving = False
 
+        # Background writer for the save file, exists while saving
+        self.pressure_logger = None
+
+        # Per-gauge conversion from raw counts, fitted with calibration.py
+        self.calibration = PressureCalibration.load()
+
         # Default save path
         self.default_save_path = os.path.join("C:\\", "ssbubble")
 
-        # Array for storing sequence steps
-        self.steps = []
+        # Compiled sequence steps, empty until a sequence is loaded
+        self.steps = SequenceProgram.empty()
+
+        # Predicted motor moves, used to check sequence steps are long enough
+        self.motion_profile = MotionProfile()
+        self.motion_plan = None
+        # Lengthen steps shorter than their motor move instead of rejecting
+        self.pad_motor_steps = False
 
         # Watchdog gets activated when valve arduino is connected and updates the connection status
         self.watchdog = None
@@ -129,17 +158,25 @@ class Ui_MainWindow(object):
         # Array for keeping track of valve states
         self.valveStates = [0, 0, 0, 0, 0, 0, 0, 0]
 
-        # QTimer for updating the sequence step and time display
-        self.stepTimer = QtCore.QTimer()
-        self.stepTimer.setSingleShot(False)
-        self.stepTimer.timeout.connect(self.update_step)
+        # Thread that runs the loaded sequence, exists while one is running
+        self.sequence_engine = None
+        # Watches for sequence files written by Prospa
+        self.sequence_watcher = SequenceFileWatcher()
+        self.sequence_watcher.file_ready.connect(self.on_sequence_file_ready)
+        # Finds the port of each device, overriding the COM spin boxes with
+        # ports that are not COM ports, e.g. {"valve": "/dev/ttyACM0"}
+        self.port_discovery = PortDiscovery()
+        self.port_discovery.ports_found.connect(self.on_ports_found)
+        self.device_ports = {}
+        # Roles whose port was picked by hand, which discovery leaves alone
+        self.manual_ports = set()
 
         self.bubbleTimer = QtCore.QTimer()
         self.bubbleTimer.setSingleShot(True)
         self.bubbleTimer.timeout.connect(self.bubble_timeout)
 
-        # Bool that avoids "Step complete" message on sequence init
-        self.seq_new = True
+        # Index of the running sequence step, -1 when no sequence is running
+        self.current_step_index = -1
 
         # Ensure the prospa file is removed - prospa must be activated once gui already open
         # self.delete_sequence_file()
@@ -898,6 +935,18 @@ class Ui_MainWindow(object):
         self.editValveMacroAction.setObjectName("editValveMacroAction")
         self.motorMacroMenu.addAction(self.editValveMacroAction)
         self.menuBar.addAction(self.motorMacroMenu.menuAction())
+        self.sequenceMenu = QtWidgets.QMenu(parent=self.menuBar)
+        self.sequenceMenu.setObjectName("sequenceMenu")
+        self.previewTrajectoryAction = QtGui.QAction(parent=MainWindow)
+        self.previewTrajectoryAction.setObjectName("previewTrajectoryAction")
+        self.sequenceMenu.addAction(self.previewTrajectoryAction)
+        self.menuBar.addAction(self.sequenceMenu.menuAction())
+        self.devicesMenu = QtWidgets.QMenu(parent=self.menuBar)
+        self.devicesMenu.setObjectName("devicesMenu")
+        self.findDevicesAction = QtGui.QAction(parent=MainWindow)
+        self.findDevicesAction.setObjectName("findDevicesAction")
+        self.devicesMenu.addAction(self.findDevicesAction)
+        self.menuBar.addAction(self.devicesMenu.menuAction())
 
         # Create the graph widgets container
         self.graphContainer = QtWidgets.QWidget(self.centralwidget)
@@ -993,9 +1042,19 @@ class Ui_MainWindow(object):
         # Connect menu actions to their slots
         self.editMotorMacroAction.triggered.connect(self.edit_motor_macro)
         self.editValveMacroAction.triggered.connect(self.edit_valve_macro)
+        self.previewTrajectoryAction.triggered.connect(
+            self.preview_motor_trajectory)
+        self.findDevicesAction.triggered.connect(
+            lambda: self.find_devices(refresh=True))
+        # A port picked by hand replaces the discovered one
+        self.ardCOMPortSpinBox.valueChanged.connect(
+            lambda: self.set_manual_port("valve"))
+        self.motorCOMPortSpinBox.valueChanged.connect(
+            lambda: self.set_manual_port("motor"))
 
         self.retranslateUi(MainWindow)
         self.update_controls()
+        self.find_devices()
 
     def retranslateUi(self, MainWindow):
         _translate = QtCore.QCoreApplication.translate
@@ -1074,6 +1133,12 @@ class Ui_MainWindow(object):
             _translate("MainWindow", "Edit Motor Macros"))
         self.editValveMacroAction.setText(_translate(
             "MainWindow", "Edit Valve Macros"))
+        self.sequenceMenu.setTitle(_translate("MainWindow", "Sequence"))
+        self.previewTrajectoryAction.setText(
+            _translate("MainWindow", "Preview Motor Trajectory"))
+        self.devicesMenu.setTitle(_translate("MainWindow", "Devices"))
+        self.findDevicesAction.setText(
+            _translate("MainWindow", "Find Devices"))
         self.savePathEdit.setText(_translate("MainWindow", "C:\\ssbubble"))
         self.resetButton.setText(_translate("MainWindow", "Reset"))
         self.buildPressureButton.setText(
@@ -1106,14 +1171,17 @@ class Ui_MainWindow(object):
                     i+1}Button').setText(self.motor_macro_settings[str(i+1)]['Label'])
 
     def disconnect_ard(self):
+        self.sequence_watcher.stop()
+        self.stop_sequence()
         try:
-            self.arduino_worker.command_signal.emit("RESET")
-            self.arduino_worker.stop_timer()
+            # Stopping the worker resets the Arduino and releases the port
+            self.arduino_worker.stop()
         except Exception:
             pass
         if self.watchdog != None:
             self.watchdog.stop()
         self.ardConnected = False
+        self.finish_quick_vent()
         self.valveStates = [0, 0, 0, 0, 0, 0, 0, 0]
         self.update_valve_button_states()
         self.ardWarningLabel.setText("Connection closed")
@@ -1134,65 +1202,58 @@ class Ui_MainWindow(object):
             self.UIUpdateArdConnection()
         else:
             # Create the worker and start the Arduino communication
-            port = self.ardCOMPortSpinBox.value()
+            port = self.device_ports.get(
+                "valve", self.ardCOMPortSpinBox.value())
             self.arduino_worker = ArduinoWorker(
                 self, port=port, mode=self.selectedMode, verbose=self.verbosity)
 
-            self.arduino_worker.start()
-
             self.connect_arduino_signals()    # Connect the worker signals to appropriate slots
 
-            # Create an event loop
-            loop = QtCore.QEventLoop()
-
-            # Define a function to check connection status
-            def check_connection():
-                if self.arduino_worker.isConnected():
-                    loop.quit()  # Exit event loop if connected
-
-            # Set up a timer to periodically check connection
-            connection_timer = QtCore.QTimer()
-            connection_timer.timeout.connect(check_connection)
-            connection_timer.start(100)  # Check every 100 ms
-
-            # Set a timeout to exit the event loop after the specified time
-            QtCore.QTimer.singleShot(5000, loop.quit)  # Timeout after 5000 ms
-
-            # Start the event loop
-            loop.exec()
+            # The worker reports back through connected, so the GUI keeps
+            # running while the port opens
+            self.ardConnectButton.setEnabled(False)
+            self.ardWarningLabel.setText("Connecting...")
+            self.ardWarningLabel.setStyleSheet("color: black")
+            self.arduino_worker.start()
 
-            # Stop the connection timer
-            connection_timer.stop()
+    @QtCore.pyqtSlot(bool)
+    def on_arduino_connected(self, connected):
+        """Finish connecting once the worker has tried to open the port."""
+        # Update the UI based on the connection status
+        if connected:
+            self.ardConnected = True
+            # Start the watchdog timer that updates arduino connection status
+            self.setup_arduino_watchdog()
+            # Start sampling pressure readings on the acquisition thread
+            self.arduino_worker.start_timer()
+        else:
+            self.ardConnected = False
+            self.arduino_worker.stop()
+            self.ardWarningLabel.setText("Connection failed")
+            self.ardWarningLabel.setStyleSheet("color: red")
+        self.UIUpdateArdConnection()
+        if not connected:
+            return
 
-            # Update the UI based on the connection status
-            if self.arduino_worker.isConnected():
-                self.ardConnected = True
-                # Start the watchdog timer that updates arduino connection status
-                self.setup_arduino_watchdog()
-                # Start the arduino time that read pressure readings every 500ms
-                self.arduino_worker.start_timer()
-            else:
-                self.ardConnected = False
-                self.arduino_worker.stop()
-                self.ardWarningLabel.setText("Connection failed")
-                self.ardWarningLabel.setStyleSheet("color: red")
-            self.UIUpdateArdConnection()
+        # If in manual mode, make sure buttons reflect actual valve states
+        if self.selectedMode == 0:
+            self.arduino_worker.command_signal.emit(
+                "TTLDISABLE")  # ensure tTL mode disabled
+            # Buttons are updated by on_valve_states_updated
+            self.arduino_worker.get_valve_signal.emit()
 
-            time.sleep(1)
+        # If in automatic mode, begin sequence processing
+        if self.selectedMode == 1:
+            self.arduino_worker.command_signal.emit(
+                "TTLDISABLE")  # ensure tTL mode disabled
+            # begin sequence loading
+            self.find_file()
 
-            # If in manual mode, make sure buttons reflect actual valve states
-            if self.selectedMode == 0:
-                self.arduino_worker.command_signal.emit(
-                    "TTLDISABLE")  # ensure tTL mode disabled
-                self.update_valve_states()
-                self.update_valve_button_states()
-
-            # If in automatic mode, begin sequence processing
-            if self.selectedMode == 1:
-                self.arduino_worker.command_signal.emit(
-                    "TTLDISABLE")  # ensure tTL mode disabled
-                # begin sequence loading
-                self.find_file()
+    @QtCore.pyqtSlot(list)
+    def on_valve_states_updated(self, valve_states):
+        if self.ardConnected:
+            self.valveStates = valve_states
+            self.update_valve_button_states()
 
     def update_valve_button_states(self):
         special_cases = {
@@ -1206,190 +1267,132 @@ class Ui_MainWindow(object):
             if i in special_cases:
                 special_cases[i].setChecked(self.valveStates[i] == 1)
 
-    """Recurring function that updates the current step and valve states as well as the time labels."""
+    """Run the loaded sequence on its own thread."""
 
-    def update_step(self):
+    def start_sequence(self):
+        if not self.ardConnected:
+            self.on_sequence_finished(False)
+            return
+        motor_worker = self.motor_worker if self.motor_flag else None
+        self.sequence_engine = SequenceEngine(
+            self.steps, self.arduino_worker, motor_worker)
+        self.sequence_engine.step_started.connect(self.on_sequence_step_started)
+        self.sequence_engine.progress.connect(self.on_sequence_progress)
+        self.sequence_engine.sequence_finished.connect(
+            self.on_sequence_finished)
+        self.sequence_engine.start(QtCore.QThread.Priority.TimeCriticalPriority)
+
+    def stop_sequence(self):
+        if self.sequence_engine is not None:
+            self.sequence_engine.stop()
+
+    def on_sequence_step_started(self, index, step_type, time_length):
+        # Report the end of the previous step, not the start of the first
+        if index > 0:
+            logging.info("Step complete")
+        self.current_step_index = index
+        self.current_step_time = time_length
+        self.current_step_type = step_type
+        # Update the labels
+        self.currentStepTypeEdit.setText(self.step_types[step_type])
+        self.stepsRemainingLabel.setText(
+            f"Steps: {len(self.steps) - index}")
+        # Log the step type and time
+        logging.info(f"Step {self.step_types[step_type]} for {
+            time_length} ms")
+
+    def on_sequence_progress(self, step_left, total_left):
         # Check the connection
-        if self.ardConnected:
-            if not self.motor_flag or (self.motor_worker.motor.serial_connected and self.motor_worker.calibrated):
-                # Get the current time
-                current_time = time.perf_counter()
-
-                # Initialize last_update_time if it doesn't exist
-                if not hasattr(self, 'last_update_time'):
-                    self.last_update_time = current_time
-
-                # Calculate elapsed time in milliseconds
-                # Convert to milliseconds
-                elapsed_time = (current_time - self.last_update_time) * 1000
-
-                # Update last_update_time
-                self.last_update_time = current_time
-
-                # Increment time trackers by elapsed time
-                self.sequence_running_time += elapsed_time
-                self.step_running_time += elapsed_time
-
-                # Update the time labels
-                self.currentStepTimeEdit.setText(
-                    f"{(self.current_step_time - self.step_running_time) / 1000:.2f}")
-                self.stepsTimeRemainingLabel.setText(
-                    f"Time: {(self.total_sequence_time - self.sequence_running_time) / 1000:.2f}")
-
-                # Check if the current step is complete
-                if self.step_running_time >= self.current_step_time:
-                    # Check if sequence has been initialized
-                    if self.seq_new == True:
-                        self.seq_new = False
-                    # If not, step is complete
-                    else:
-                        logging.info("Step complete")
-
-                    # Reset the step timer
-                    self.step_running_time = 0
-
-                    # Check if there are more steps
-                    if len(self.steps) == 0:
-                        # If not, sequence is complete
-                        self.ardWarningLabel.setText("Sequence complete")
-                        self.ardWarningLabel.setStyleSheet("color: green")
-                        self.currentStepTypeEdit.setText("")
-                        self.stepsRemainingLabel.setText("Steps: 0")
-                        self.stepsTimeRemainingLabel.setText("Time: 0.00")
-                        self.currentStepTimeEdit.setText("0.00")
-
-                        # Stop the timer to prevent this function from recurring
-                        self.stepTimer.stop()
-
-                        # Stop saving at the end of the sequence
-                        if self.saving:
-                            self.on_beginSaveButton_clicked()
-
-                        # Reset sequence init flag
-                        self.seq_new = True
-                        return
-                    else:
-                        # Get the next step
-                        self.current_step = self.steps.pop(0)
-                        # Get the key values
-                        self.current_step_time = self.current_step.time_length
-                        self.current_step_type = self.current_step.step_type
-                        # Update the labels
-                        self.currentStepTypeEdit.setText(
-                            self.step_types[self.current_step_type])
-
-                        self.stepsRemainingLabel.setText(
-                            f"Steps: {len(self.steps) + 1}")
-
-                        # Update the valves with new step state
-                        self.arduino_worker.set_valve_signal.emit(
-                            self.valve_settings[self.current_step_type])
-
-                        # Update the motor position if motor_flag is True
-                        if self.motor_flag and self.current_step.motor_position >= 0:
-                            self.motor_worker.command_signal.emit(
-                                self.current_step.motor_position)
-
-                        # Log the step type and time
-                        logging.info(f"Step {self.step_types[self.current_step_type]} for {
-                            self.current_step_time} ms")
-            else:
-                # If motor is not ready, stop the timer and reset all labels
-                logging.error("Motor not connected and calibrated")
-                self.ardWarningLabel.setText("Motor not ready")
-                self.ardWarningLabel.setStyleSheet("color: red")
-                self.stepTimer.stop()
-                self.currentStepTypeEdit.setText("")
-                self.stepsRemainingLabel.setText("Steps: 0")
-                self.currentStepTimeEdit.setText("0.00")
-                self.stepsTimeRemainingLabel.setText("Time: 0.00")
-        else:
-            # If arduino is not connected, stop the timer and reset all labels
+        if not self.ardConnected:
             logging.error("Arduino not connected")
             self.ardWarningLabel.setText("Arduino not connected")
             self.ardWarningLabel.setStyleSheet("color: red")
-            self.stepTimer.stop()
-            self.currentStepTypeEdit.setText("")
-            self.stepsRemainingLabel.setText("Steps: 0")
-            self.currentStepTimeEdit.setText("0.00")
-            self.stepsTimeRemainingLabel.setText("Time: 0.00")
-
-            # Stop saving if it was started
-            if self.saving:
-                self.on_beginSaveButton_clicked()
+            self.stop_sequence()
+        elif self.motor_flag and not (self.motor_worker.motor.serial_connected and self.motor_worker.calibrated):
+            logging.error("Motor not connected and calibrated")
+            self.ardWarningLabel.setText("Motor not ready")
+            self.ardWarningLabel.setStyleSheet("color: red")
+            self.stop_sequence()
+        else:
+            # Update the time labels
+            self.currentStepTimeEdit.setText(f"{step_left:.2f}")
+            self.stepsTimeRemainingLabel.setText(f"Time: {total_left:.2f}")
+
+    def on_sequence_finished(self, completed):
+        if completed:
+            logging.info("Step complete")
+            self.ardWarningLabel.setText("Sequence complete")
+            self.ardWarningLabel.setStyleSheet("color: green")
+        # Reset all labels
+        self.currentStepTypeEdit.setText("")
+        self.stepsRemainingLabel.setText("Steps: 0")
+        self.stepsTimeRemainingLabel.setText("Time: 0.00")
+        self.currentStepTimeEdit.setText("0.00")
 
-            # Reset sequence init flag
-            self.seq_new = True
-            return
+        # Stop saving at the end of the sequence
+        if self.saving:
+            self.on_beginSaveButton_clicked()
 
-        # Recur the function every 10ms until sequence is over
-        self.stepTimer.start(10)
+        self.current_step_index = -1
+        self.sequence_engine = None
 
     def calculate_sequence_time(self):
         """Calculate the total time of the sequence."""
-        self.sequence_running_time = -10/1000
-        self.step_running_time = -10/1000
-        self.total_sequence_time = 0
+        self.total_sequence_time = self.steps.total_time
         self.current_step_time = 0
-        for step in self.steps:
-            self.total_sequence_time += step.time_length
         logging.info(f"Sequence length is {self.total_sequence_time} ms")
 
-    @QtCore.pyqtSlot()
     def find_file(self):
-        self.file_timer = QtCore.QTimer()
-        self.file_timer.timeout.connect(self.find_file)
-        if os.path.exists(r"C:\ssbubble\sequence.txt"):
-            logging.info("Sequence file found")
-            if (self.load_sequence()):
-                logging.info("Sequence loaded successfully")
-                logging.info("Starting sequence")
-                # Calculate time to show on the labels
-                self.calculate_sequence_time()
-                self.currentStepTypeEdit.setText(
-                    self.step_types[self.steps[0].step_type])
-                # logging.info(f"Step {self.steps[0].step_type} for {self.steps[0].time_length} ms")
-
-                # Tell prospa that sequence was loaded successfully and is now running
-                self.write_to_prospa(True)
-                self.delete_sequence_file()
-
-                # Update valve states for current step and start recurring timer
-                self.update_step()
-
-                # Update the UI
-                self.UIUpdateArdConnection()
-                self.ardWarningLabel.setText("Sequence running")
-            else:
-                self.write_to_prospa(False)
-                self.delete_sequence_file()
+        """Wait for Prospa to write the sequence file."""
+        self.sequence_watcher.start()
 
-                self.disconnect_ard()
+    @QtCore.pyqtSlot(str)
+    def on_sequence_file_ready(self, path):
+        self.sequence_watcher.stop()
+        if not self.ardConnected:
+            return
+        logging.info("Sequence file found")
+        if (self.load_sequence()):
+            logging.info("Sequence loaded successfully")
+            logging.info("Starting sequence")
+            # Calculate time to show on the labels
+            self.calculate_sequence_time()
+            self.currentStepTypeEdit.setText(
+                self.step_types[self.steps.step_type(0)])
+
+            # Tell prospa that sequence was loaded successfully and is now running
+            self.write_to_prospa(True)
+            self.delete_sequence_file()
+
+            # Start running the steps on the sequence thread
+            self.start_sequence()
+
+            # Update the UI
+            self.UIUpdateArdConnection()
+            self.ardWarningLabel.setText("Sequence running")
+        else:
+            self.write_to_prospa(False)
+            self.delete_sequence_file()
 
-                # Update the UI
-                self.ardWarningLabel.setText(
-                    "Error loading sequence file")
-                self.ardWarningLabel.setStyleSheet("color: red")
-                logging.error("Error loading sequence file")
+            self.disconnect_ard()
 
-                # Stop the arduino worker
-                self.ardConnected = False
-                self.arduino_worker.stop()
-                self.UIUpdateArdConnection()
+            # Update the UI
+            self.ardWarningLabel.setText(
+                "Error loading sequence file")
+            self.ardWarningLabel.setStyleSheet("color: red")
+            logging.error("Error loading sequence file")
 
-            self.file_timer.stop()
-        else:
-            if self.ardConnected:
-                logging.info("Sequence file not found, checking again...")
-                self.file_timer.singleShot(500, self.find_file)
+            # Stop the arduino worker
+            self.ardConnected = False
+            self.arduino_worker.stop()
+            self.UIUpdateArdConnection()
 
     def load_sequence(self):
         """Load a sequence from a file."""
 
         try:
             # Get the file path
-            self.steps = []  # initialise steps
-            with open(r"C:\ssbubble\sequence.txt", "r") as f:
+            with open(SEQUENCE_PATH, "r") as f:
                 # sequence format is a long string e.g. d100e200f400
                 raw_sequence = f.readlines()
 
@@ -1399,83 +1402,38 @@ class Ui_MainWindow(object):
                     return False
 
                 # Get the save path from the second line of the sequence file
-                seq_save_path = raw_sequence[1].strip()
+                seq_save_path = raw_sequence[1].strip() if len(
+                    raw_sequence) > 1 else ""
                 sequence_string = raw_sequence[0].strip()
-                i = 0
 
-                # Check for capital 'M' in the sequence string
-                self.motor_flag = False
-                if 'M' in sequence_string:
-                    self.motor_flag = True
-                    sequence_string = sequence_string.replace(
-                        'M', '')  # Remove 'M' from the sequence string
+                # Parse the sequence string into arrays of steps
+                try:
+                    self.steps = compile_sequence(
+                        sequence_string, self.valve_settings)
+                except SequenceError as e:
+                    logging.error(f"{e} in sequence file")
+                    return False
 
+                # Capital 'M' in the sequence string means the motor is used
+                self.motor_flag = self.steps.motor_flag
                 if self.motor_flag:
                     try:
                         if not self.motor_worker.motor.serial_connected or not self.motor_worker.calibrated:
                             logging.error(
                                 "Sequence requires motor, but motor is not ready")
                             return False
-                    except Exception as e:
-                        # logging.error(f"Error checking motor status: {e}")
+                    except Exception:
                         logging.error(
                             "Sequence requires motor, but motor is not ready")
                         return False
-
-                # Parse the sequence string
-                while i < len(sequence_string):
-                    # Check for valid step types based on dictionaries in the class (at the top of the file)
-                    if sequence_string[i] in self.step_types.keys():
-                        step_type = sequence_string[i]
-                    else:
-                        logging.error("Invalid step type in sequence file")
-                        return False
-
-                    # Get the time length of the step
-                    i += 1
-                    time_length = ""
-                    while i < len(sequence_string) and sequence_string[i].isdigit():
-                        time_length += sequence_string[i]
-                        i += 1
-                    try:
-                        time_length = int(time_length)
-                    except ValueError:
-                        logging.error("Invalid time length in sequence file")
-                        return False
-                    if time_length <= 0:
-                        logging.error("Invalid time length in sequence file")
+                    if not self.plan_motor_moves():
                         return False
 
-                    # Get motor position if motor_flag is True
-                    motor_position = 0
-                    if self.motor_flag and i < len(sequence_string) and sequence_string[i] == 'm':
-                        i += 1
-                        motor_position_str = ""
-                        # Check for negative sign
-                        if i < len(sequence_string) and sequence_string[i] == '-':
-                            motor_position_str += sequence_string[i]
-                            i += 1
-                        # Collect digits
-                        while i < len(sequence_string) and sequence_string[i].isdigit():
-                            motor_position_str += sequence_string[i]
-                            i += 1
-                        try:
-                            motor_position = int(motor_position_str)
-                        except ValueError:
-                            logging.error(
-                                "Invalid motor position in sequence file")
-                            return False
-
-                    # Create a step object and add it to the list
-                    step = Step(step_type, time_length, motor_position)
-                    # logging.info("Step loaded: " + str(step.step_type) + " " + str(step.time_length))
-                    self.steps.append(step)
-
                 # Automatically start saving at sequence start
                 if self.saving == False:
                     # Get the save path from the sequence file
                     if len(seq_save_path) > 1:    # Look for save path in second line of seqeunce file
-                        if seq_save_path.endswith('.csv'):
+                        if seq_save_path.endswith(('.csv', '.bin')):
                             self.savePathEdit.setText(seq_save_path)
                         else:   # Add timestamped csv to the file path if no file specified
                             self.savePathEdit.setText(os.path.join(
@@ -1498,20 +1456,93 @@ class Ui_MainWindow(object):
             logging.error(f"Error reading sequence file: {e}")
             return False
 
+    def plan_motor_moves(self):
+        """Check that every motor move finishes within its step."""
+        self.motion_plan = plan_motion(
+            self.steps, self.motion_profile, self.motor_worker.position,
+            pad=self.pad_motor_steps)
+        infeasible = self.motion_plan.infeasible
+        if len(infeasible):
+            steps = ", ".join(str(i + 1) for i in infeasible[:10])
+            if len(infeasible) > 10:
+                steps += f" and {len(infeasible) - 10} more"
+            if not self.pad_motor_steps:
+                logging.error(f"Steps {steps} are shorter than their motor move")
+                return False
+            logging.warning(f"Lengthened steps {steps} to fit their motor move")
+            self.steps.durations = self.motion_plan.durations
+        return True
+
+    def preview_motor_trajectory(self):
+        """Plot the planned motor position of a sequence file."""
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self.centralwidget,
+            "Select Sequence File",
+            self.default_save_path,
+            "Sequence Files (*.txt)"
+        )
+        if not path:
+            return
+        try:
+            with open(path, "r") as f:
+                program = compile_sequence(
+                    f.readline().strip(), self.valve_settings)
+        except (OSError, SequenceError) as e:
+            logging.error(f"Cannot preview sequence: {e}")
+            return
+        # Plan from the current position if the motor is connected
+        start = self.motor_worker.position if self.motor_connected else 0.0
+        plan = plan_motion(program, self.motion_profile, start,
+                           pad=self.pad_motor_steps)
+        TrajectoryPreview(self.centralwidget, plan).exec()
+
+    def find_devices(self, refresh=False):
+        """Look for the devices in the background, see on_ports_found."""
+        if self.ardConnected or self.motor_connected:
+            # Probing would disturb a port that is in use
+            logging.info("Disconnect the devices before searching for them")
+            return
+        if refresh:
+            # Asked for by the user, so the ports found replace those set by hand
+            self.manual_ports.clear()
+        self.port_discovery.start(refresh=refresh)
+
+    def set_manual_port(self, role):
+        """Use the spin box port of a role rather than a discovered one."""
+        self.manual_ports.add(role)
+        self.device_ports.pop(role, None)
+
+    @QtCore.pyqtSlot(dict)
+    def on_ports_found(self, ports):
+        spin_boxes = {"valve": self.ardCOMPortSpinBox,
+                      "motor": self.motorCOMPortSpinBox}
+        for role, device in ports.items():
+            if role in self.manual_ports:
+                logging.info(f"Found the {role} Arduino on {device}, "
+                             f"keeping the port set by hand")
+                continue
+            if device.upper().startswith("COM") and device[3:].isdigit():
+                self.device_ports.pop(role, None)
+                # Not picked by hand, so kept from set_manual_port
+                spin_boxes[role].blockSignals(True)
+                spin_boxes[role].setValue(int(device[3:]))
+                spin_boxes[role].blockSignals(False)
+            else:
+                # Not a COM port, so used in place of the spin box value
+                self.device_ports[role] = device
+
     def write_to_prospa(self, start):
         """Write the file to Prospa."""
-        if start:
-            with open(r"C:\ssbubble\prospa.txt", "w") as f:
-                f.write("1")    # Signal success
-        else:
-            with open(r"C:\ssbubble\prospa.txt", "w") as f:
-                f.write("0")    # Signal failure
+        # Replaced in one step so Prospa never reads an empty file
+        try:
+            write_atomic(PROSPA_PATH, "1" if start else "0")
+        except OSError as e:
+            logging.error(f"Error writing to Prospa: {e}")
 
     def delete_sequence_file(self):
         """Delete the sequence file that Prospa makes."""
         try:
-            os.remove(r"C:\ssbubble\sequence.txt")
-            pass
+            os.remove(SEQUENCE_PATH)
         except FileNotFoundError:
             pass
 
@@ -1547,12 +1578,10 @@ class Ui_MainWindow(object):
     """Update the valve states with a thread safe call."""
 
     def update_valve_states(self):
-        # Event loop ensures that state is updated before continuing
-        loop = QtCore.QEventLoop()
-        self.arduino_worker.valve_states_updated.connect(loop.quit)
-        QtCore.QMetaObject.invokeMethod(
-            self.arduino_worker, "get_valve_states", QtCore.Qt.ConnectionType.QueuedConnection)
-        loop.exec()
+        # The valve cache already includes every write requested so far,
+        # and is reconciled with the coils on every pressure reading
+        if self.ardConnected:
+            self.valveStates = self.arduino_worker.valve_states()
 
     """Toggle valve 1"""
 
@@ -1699,7 +1728,7 @@ class Ui_MainWindow(object):
             self.savePathEdit,
             "Select CSV File",
             self.savePathEdit.text(),
-            "CSV Files (*.csv)"
+            "CSV Files (*.csv);;Binary Recordings (*.bin)"
         )
 
         if self.save_path:
@@ -1724,30 +1753,60 @@ class Ui_MainWindow(object):
     @QtCore.pyqtSlot()
     def on_quickVentButton_clicked(self):
         logging.debug("Quick vent button clicked")
-        self.update_valve_states()
+        if not self.ardConnected:
+            self.quickVentButton.setChecked(False)
+            return
+        if self.quick_venting:
+            # The firmware closes every valve when the vent is cancelled
+            self.arduino_worker.command_signal.emit("CANCEL_VENT")
+            self.finish_quick_vent()
+            return
+        # The firmware vents in the background and reports its progress
+        # with each reading, see update_vent_progress()
+        self.arduino_worker.command_signal.emit("QUICK_VENT")
+        self.quick_venting = True
+        self.quick_vent_started = False
+        self.toggle_valve_controls(False)
+        self.quickVentButton.setEnabled(True)
+        self.quickVentButton.setChecked(True)
+        self.quickVentButton.setText("Venting...")
+
+    @QtCore.pyqtSlot(object)
+    def update_vent_progress(self, snapshot):
+        """Show the progress of a quick vent and finish it once it ends."""
+        if not self.quick_venting or not snapshot:
+            return
+        if not self.arduino_worker.controller.vent_supported:
+            # Older firmware vents before answering again
+            self.finish_quick_vent()
+            return
+        if snapshot.vent_state == VentState.VENTING:
+            self.quick_vent_started = True
+            self.quickVentButton.setText(
+                f"Venting {snapshot.vent_progress}%")
+        elif self.quick_vent_started:
+            # Readings taken before the vent began are skipped above
+            if snapshot.vent_state == VentState.TIMED_OUT:
+                logging.warning("Quick vent timed out before the pressure fell")
+            self.finish_quick_vent()
+
+    def finish_quick_vent(self):
+        """Return the quick vent button and valve controls to normal."""
+        if not self.quick_venting:
+            return
+        self.quick_venting = False
+        self.quickVentButton.setChecked(False)
+        self.quickVentButton.setText("Quick Vent")
         if self.ardConnected:
-            if self.vent_flag or self.sc.p2_data[-1] < 0.1:
-                self.quickVentButton.setChecked(False)
-                self.arduino_worker.set_valve_signal.emit(
-                    self.previous_valve_states)
-                self.toggle_valve_controls(True)
-                self.vent_flag = False
-            else:
-                self.previous_valve_states = self.valveStates.copy()
-                self.quickVentButton.setChecked(True)
-                self.arduino_worker.set_valve_signal.emit(
-                    [2, 2, 1, 0, 1, 2, 2, 2])
-                self.toggle_valve_controls(False)
-                self.quickVentButton.setEnabled(True)
-                self.vent_flag = True
-        self.update_valve_states()
-        self.update_valve_button_states()
+            self.toggle_valve_controls(True)
+            self.update_valve_states()
+            self.update_valve_button_states()
 
     def on_slowVentButton_clicked(self):
         logging.debug("Slow vent button clicked")
         self.update_valve_states()
         if self.ardConnected:
-            if self.vent_flag or self.sc.p2_data[-1] < 0.1:
+            if self.vent_flag or self.sc.latest_pressures[1] < 0.1:
                 self.slowVentButton.setChecked(False)
                 self.arduino_worker.set_valve_signal.emit(
                     self.previous_valve_states)
@@ -1770,6 +1829,7 @@ class Ui_MainWindow(object):
         if self.ardConnected:
             if self.saving:
                 self.saving = False
+                self.stop_saving()
                 self.beginSaveButton.setChecked(False)
                 self.beginSaveButton.setText("Begin Saving")
             else:
@@ -1920,24 +1980,32 @@ class Ui_MainWindow(object):
             self.bubbleTimer.start(timer_duration)
 
     def start_saving(self):
-        if self.savePathEdit.text().endswith(".csv"):
+        if self.savePathEdit.text().endswith((".csv", ".bin")):
             self.save_path = self.savePathEdit.text()
         else:
             self.save_path = os.path.join(
                 self.savePathEdit.text(), f"pressure_data_{time.strftime('%m%d-%H%M')}.csv").replace("/", "\\")
             self.savePathEdit.setText(self.save_path)
         try:
-            with open(self.save_path, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(
-                    ["Time", "Pressure 1", "Pressure 2", "Pressure 3", "Pressure 4"])
-                self.saving = True
-                return True
-        except Exception as e:
+            # Binary recordings keep raw counts, valves, step and motor position
+            if self.save_path.endswith(".bin"):
+                self.pressure_logger = BinaryPressureLogger(self.save_path)
+            else:
+                self.pressure_logger = PressureLogger(self.save_path)
+            self.pressure_logger.start()
+            self.saving = True
+            return True
+        except Exception:
             logging.error("Could not open save file")
             self.saving = False
             return False
 
+    def stop_saving(self):
+        """Flush any readings still queued and close the save file."""
+        if self.pressure_logger is not None:
+            self.pressure_logger.close()
+            self.pressure_logger = None
+
     def setup_arduino_watchdog(self):
         self.watchdog = QtCore.QTimer()
         self.watchdog.timeout.connect(self.check_arduino_state)
@@ -1945,10 +2013,17 @@ class Ui_MainWindow(object):
 
     def check_arduino_state(self):
         # logging.debug("Checking arduino connection")
-        self.update_valve_states()
+        # Valve states arrive with every pressure snapshot, no extra read needed
         self.update_valve_button_states()
-        if self.arduino_worker.controller.serial_connected == False:
+        supervisor = self.arduino_worker.supervisor
+        if supervisor.gave_up:
             self.disconnect_ard()
+        elif supervisor.down:
+            # The worker is reopening the port, keep the session going
+            self.ardWarningLabel.setText("Reconnecting...")
+            self.ardWarningLabel.setStyleSheet("color: orange")
+        elif self.ardWarningLabel.text() == "Reconnecting...":
+            self.UIUpdateArdConnection()
 
     def setup_motor_watchdog(self):
         self.motor_watchdog = QtCore.QTimer()
@@ -1957,7 +2032,8 @@ class Ui_MainWindow(object):
 
     def check_motor_state(self):
         # logging.debug("Checking motor connection")
-        if self.motor_worker.is_connected() == False:   # type: ignore
+        # Transient failures are retried by the worker's supervisor
+        if self.motor_worker.supervisor.gave_up:   # type: ignore
             self.motor_connected = False
             self.UIUpdateArdConnection()
             self.motor_worker.running = False   # type: ignore
@@ -1983,56 +2059,43 @@ class Ui_MainWindow(object):
                     # self.motor_worker = None
                     self.motor_worker.running = False
                     self.motor_worker.timer.stop()
-            except Exception as e:
+            except Exception:
                 pass
 
             self.UIUpdateArdConnection()
         else:
             logging.info("Connecting motor")
-            logging.info(f"Motor COM port: {self.motorCOMPortSpinBox.value()}")
-            self.motor_worker = MotorWorker(
-                parent=self, port=self.motorCOMPortSpinBox.value())
-            self.motor_worker.connect()
+            port = self.device_ports.get(
+                "motor", self.motorCOMPortSpinBox.value())
+            logging.info(f"Motor port: {port}")
+            self.motor_worker = MotorWorker(parent=self, port=port)
 
             self.connect_motor_signals()    # Connect the worker signals to appropriate slots
 
-            # Start the arduino time that read pressure readings every 500ms
-            self.motor_worker.start_timer()
-
-            # Create an event loop
-            loop = QtCore.QEventLoop()
-
-            # Define a function to check connection status
-            def check_connection():
-                if self.motor_worker.is_connected():
-                    loop.quit()  # Exit event loop if connected
-
-            # Set up a timer to periodically check connection
-            connection_timer = QtCore.QTimer()
-            connection_timer.timeout.connect(check_connection)
-            connection_timer.start(100)  # Check every 100 ms
-
-            # Set a timeout to exit the event loop after the specified time
-            QtCore.QTimer.singleShot(5000, loop.quit)  # Timeout after 5000 ms
-
-            # Start the event loop
-            loop.exec()
-
-            # Stop the connection timer
-            connection_timer.stop()
+            # Finished by on_motor_connected, without blocking the GUI
+            self.motorConnectButton.setEnabled(False)
+            self.motor_worker.connect()
+        self.UIUpdateArdConnection()
 
-            # Update the UI based on the connection status
-            if self.motor_worker.is_connected():
-                logging.info("Motor connected")
-                self.motor_connected = True
-                # Start the watchdog timer that updates arduino connection status
-                self.setup_motor_watchdog()
-            else:
-                logging.error("Motor connection failed")
-                self.motor_connected = False
-                self.motor_worker.shutdown_signal.emit()
-                self.ardWarningLabel.setText("Connection failed")
-                self.ardWarningLabel.setStyleSheet("color: red")
+    @QtCore.pyqtSlot(bool)
+    def on_motor_connected(self, connected):
+        """Finish connecting once the motor port has been opened."""
+        self.motorConnectButton.setEnabled(True)
+        # Update the UI based on the connection status
+        if connected:
+            logging.info("Motor connected")
+            self.motor_connected = True
+            # Start polling the motor position
+            self.motor_worker.start_timer()
+            # Start the watchdog timer that updates arduino connection status
+            self.setup_motor_watchdog()
+        else:
+            logging.error("Motor connection failed")
+            self.motor_connected = False
+            self.motor_worker.running = False
+            self.motor_worker.shutdown_signal.emit()
+            self.ardWarningLabel.setText("Connection failed")
+            self.ardWarningLabel.setStyleSheet("color: red")
         self.UIUpdateArdConnection()
 
     def on_motorCalibrateButton_clicked(self):
@@ -2091,19 +2154,6 @@ class Ui_MainWindow(object):
             self.motor_worker.command_signal.emit(
                 self.motor_macro_settings["6"]["Position"])
 
-    def add_step(self, step_type, time_length):
-        step = Step(step_type, time_length)
-        self.steps.append(step)
-
-    def remove_step(self, index):
-        if 0 <= index < len(self.steps):
-            del self.steps[index]
-
-    def list_steps(self):
-        for step in self.steps:
-            print(f"Step Type: {step.step_type}, Time Length: {
-                  step.time_length}")
-
     def edit_motor_macro(self):
         self.motor_macro_editor.exec()
 
@@ -2323,15 +2373,21 @@ class Ui_MainWindow(object):
 
     def connect_arduino_signals(self):
         self.arduino_worker.data_signal.connect(
-            self.sc.update_plot)  # To update the plot
+            self.sc.update_plot)  # To update the latest readings
+        self.arduino_worker.data_signal.connect(self.update_vent_progress)
+        self.sc.set_buffer(self.arduino_worker.buffer)  # To update the plot
         self.arduino_worker.command_signal.connect(
             self.arduino_worker.send_command)
         self.arduino_worker.set_valve_signal.connect(
             self.arduino_worker.set_valve_states)
         self.arduino_worker.get_valve_signal.connect(
             self.arduino_worker.get_valve_states)
+        self.arduino_worker.valve_states_updated.connect(
+            self.on_valve_states_updated)
+        self.arduino_worker.connected.connect(self.on_arduino_connected)
 
     def connect_motor_signals(self):
+        self.motor_worker.connected.connect(self.on_motor_connected)
         self.motor_worker.command_signal.connect(
             self.motor_worker.move_to_target)
         self.motor_worker.shutdown_signal.connect(self.motor_worker.stop)
@@ -2340,13 +2396,6 @@ class Ui_MainWindow(object):
         self.motor_worker.top_signal.connect(self.motor_worker.to_top)
 
 
-class Step:
-    def __init__(self, step_type, time_length, motor_position=0):
-        self.step_type = step_type
-        self.time_length = time_length
-        self.motor_position = motor_position
-
-
 class QTextEditLogger(logging.Handler, QtCore.QObject):  # Console window
     appendPlainText = QtCore.pyqtSignal(str)
 
@@ -2661,6 +2710,37 @@ class ValveMacroEditor(QtWidgets.QDialog):  # Valve Macro Editor
         super().closeEvent(event)
 
 
+class TrajectoryPreview(QtWidgets.QDialog):  # Planned motor trajectory
+    def __init__(self, parent, plan):
+        super().__init__(parent)
+        self.setWindowTitle("Motor Trajectory Preview")
+        self.resize(700, 400)
+
+        figure = Figure(layout="tight")
+        canvas = FigureCanvasQTAgg(figure)
+        ax = figure.add_subplot(111)
+        times, positions = plan.trace()
+        ax.plot(times, positions)
+        # Shade the steps that are too short for their move
+        starts = np.concatenate(([0], np.cumsum(plan.durations))) / 1000
+        ax.broken_barh(
+            [(starts[i], starts[i + 1] - starts[i]) for i in plan.infeasible],
+            (0, 1), transform=ax.get_xaxis_transform(), color="red", alpha=0.2)
+        ax.invert_yaxis()  # Position is measured down from the top
+        ax.set_xlabel("Time (s)")
+        ax.set_ylabel("Position (mm)")
+
+        if plan.feasible:
+            summary = f"{len(plan.durations)} steps, {starts[-1]:.1f} s"
+        else:
+            summary = (f"{len(plan.infeasible)} steps are shorter than their "
+                       f"motor move (shaded)")
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(NavigationToolbar(canvas, self))
+        layout.addWidget(canvas)
+        layout.addWidget(QtWidgets.QLabel(summary))
+
+
 class RealTimePlot(FigureCanvasQTAgg, QtCore.QObject):
 
     def __init__(self, parent):
@@ -2669,60 +2749,66 @@ class RealTimePlot(FigureCanvasQTAgg, QtCore.QObject):
         QtCore.QObject.__init__(self)
 
         self.parent = parent
-        self.max_points = 500
-
-        # Initialize data
-        self.p1_data = []
-        self.p2_data = []
-        self.p3_data = []
-        self.p4_data = []
-        self.x_data = []
-        self.parent = parent
-        # Initialize an empty plot
-        self.line1, = self.ax.plot([], [], lw=2, color="red")
-        # Initialize an empty plot
-        self.line2, = self.ax.plot([], [], lw=2, color="blue")
-        # Initialize an empty plot
-        self.line3, = self.ax.plot([], [], lw=2, color="green")
-        # Initialize an empty plot
-        self.line4, = self.ax.plot([], [], lw=2, color="purple")
+        # Length of the plotted history (s)
+        self.window_seconds = 50
+        # Maximum redraw rate (frames per second), independent of sample rate
+        self.frame_rate = 20
+        # Only redraw the lines over a cached background where supported
+        self.use_blit = self.supports_blit
+
+        # Source of the plotted samples, set once the Arduino worker exists
+        self.buffer = None
+        self.drawn_count = -1
+        self.background = None
+
+        # Most recent converted reading from each gauge
+        self.latest_pressures = [0.0, 0.0, 0.0, 0.0]
+
+        # Animated lines are left out of the cached background
+        self.line1, = self.ax.plot([], [], lw=2, color="red", animated=True)
+        self.line2, = self.ax.plot([], [], lw=2, color="blue", animated=True)
+        self.line3, = self.ax.plot([], [], lw=2, color="green", animated=True)
+        self.line4, = self.ax.plot([], [], lw=2, color="purple", animated=True)
+        self.lines = [self.line1, self.line2, self.line3, self.line4]
 
         # Set plot limits and labels
-        self.ax.set_xlim(0, self.max_points)
+        self.ax.set_xlim(-self.window_seconds, 0)
         self.ax.set_ylim(0, 11)
-        self.ax.set_xlabel('Time')
+        self.ax.set_xlabel('Time (s)')
         self.ax.set_ylabel('mBar')
 
-    @QtCore.pyqtSlot(list)
-    def update_plot(self, pressure_values):
-        if pressure_values:
-            # Update x_data and y_data with the newest value
-            # Append new x (time) point
-            if self.x_data == []:
-                self.x_data.append(0)
-            else:
-                self.x_data.append(self.x_data[-1] + 1)
+        # Re-cache the background whenever the full figure is redrawn
+        self.mpl_connect('draw_event', self.on_draw)
+
+        self.redraw_timer = QtCore.QTimer()
+        self.redraw_timer.timeout.connect(self.redraw)
+        self.redraw_timer.start(int(1000 / self.frame_rate))
 
-            # Limit the x_data size
-            if len(self.x_data) > self.max_points:
-                self.x_data = self.x_data[-self.max_points:]
+    def set_buffer(self, buffer):
+        """Plot samples from the given RingBuffer."""
+        self.buffer = buffer
+        self.drawn_count = -1
 
-            # Convert and append new y (pressure) points
-            for i in range(4):
-                pressure_values[i] = (
-                    float(pressure_values[i]) - 203.53) / 0.8248 / 100
-                p_data = getattr(self, f'p{i+1}_data')
-                p_data.append(pressure_values[i])
+    def on_draw(self, event):
+        """Cache the axes background and draw the lines on top of it."""
+        self.background = self.copy_from_bbox(self.ax.bbox)
+        for line in self.lines:
+            self.ax.draw_artist(line)
 
-                # Limit the p_data size
-                if len(p_data) > self.max_points:
-                    setattr(self, f'p{i+1}_data', p_data[-self.max_points:])
+    @QtCore.pyqtSlot(object)
+    def update_plot(self, snapshot):
+        if snapshot:
+            # Readings are calibrated by the controller as they arrive
+            pressure_values = snapshot.mbar.tolist()
+            self.latest_pressures = pressure_values
 
-            # check this for time lag
+            # Hand the readings to the background writer
             if self.parent.saving:
-                with open(self.parent.save_path, "a") as f:
-                    f.write(f"{time.strftime('%H:%M:%S')}, {pressure_values[0]}, {
-                            pressure_values[1]}, {pressure_values[2]}, {pressure_values[3]}\n")
+                motor_worker = getattr(self.parent, 'motor_worker', None)
+                self.parent.pressure_logger.log(
+                    snapshot, pressure_values,
+                    step=self.parent.current_step_index,
+                    motor_position=motor_worker.position if motor_worker else 0.0)
 
             # Check if venting is complete
             if self.parent.vent_flag:
@@ -2730,71 +2816,208 @@ class RealTimePlot(FigureCanvasQTAgg, QtCore.QObject):
                 if pressure_values[2] < 0.1:
                     logging.info("Venting complete")
 
-            # Update the plot's data without clearing
-            if self.parent.pressure1RadioButton.isChecked():
-                self.line1.set_data(self.x_data, self.p1_data)
-            else:
-                self.line1.set_data([], [])
-            if self.parent.pressure2RadioButton.isChecked():
-                self.line2.set_data(self.x_data, self.p2_data)
-            else:
-                self.line2.set_data([], [])
-            if self.parent.pressure3RadioButton.isChecked():
-                self.line3.set_data(self.x_data, self.p3_data)
-            else:
-                self.line3.set_data([], [])
-            if self.parent.pressure4RadioButton.isChecked():
-                self.line4.set_data(self.x_data, self.p4_data)
-            else:
-                self.line4.set_data([], [])
-
-            # Adjust limits if necessary
-            if len(self.x_data) >= self.max_points:
-                self.ax.set_xlim(self.x_data[0], self.x_data[-1])
-            # Ensure y lim
-            self.ax.set_ylim(0, 11)
+    def redraw(self):
+        """Redraw the pressure lines, at most once per frame."""
+        if self.buffer is None or not self.isVisible():
+            return
+        count = self.buffer.count
+        visible = [self.parent.pressure1RadioButton.isChecked(),
+                   self.parent.pressure2RadioButton.isChecked(),
+                   self.parent.pressure3RadioButton.isChecked(),
+                   self.parent.pressure4RadioButton.isChecked()]
+        if count == self.drawn_count and visible == [
+                line.get_visible() for line in self.lines]:
+            return
+        self.drawn_count = count
 
-            # Redraw the canvas with the new data
+        # Copy the recent samples out of the buffer
+        window_samples = int(
+            self.window_seconds * 1000 / self.buffer.sample_period) + 1
+        _, timestamps, _, pressures, _ = self.buffer.latest(window_samples)
+        if len(timestamps) == 0:
+            return
+        x = (timestamps - timestamps[-1]) / 1e9
+        in_window = np.searchsorted(x, -self.window_seconds)
+        x = x[in_window:]
+        y = pressures[in_window:]
+
+        # Reduce to a min/max pair per pixel column
+        x, y = self.decimate(x, y, int(self.ax.bbox.width))
+
+        for i, line in enumerate(self.lines):
+            line.set_visible(visible[i])
+            line.set_data(x, y[:, i])
+
+        if self.use_blit and self.background is not None:
+            self.restore_region(self.background)
+            for line in self.lines:
+                self.ax.draw_artist(line)
+            self.blit(self.ax.bbox)
+        else:
+            # Full redraw, also caches the background for the next frame
             self.draw()
 
+    @staticmethod
+    def decimate(x, y, pixels):
+        """
+        Reduce samples to the minimum and maximum within each pixel column.
+
+        Args:
+            x: Sample times, ascending
+            y: Sample values, one column per channel
+            pixels (int): Number of pixel columns available
+
+        Returns:
+            tuple: Decimated x and y, unchanged if already small enough
+        """
+        if pixels <= 0 or len(x) <= 2 * pixels:
+            return x, y
+        starts = np.searchsorted(
+            x, np.linspace(x[0], x[-1], pixels, endpoint=False))
+        starts = np.unique(starts)
+        y_min = np.minimum.reduceat(y, starts, axis=0)
+        y_max = np.maximum.reduceat(y, starts, axis=0)
+        # Interleave so each column is drawn as a vertical min-max segment
+        x_out = np.repeat(x[starts], 2)
+        y_out = np.empty((2 * len(starts), y.shape[1]))
+        y_out[0::2] = y_min
+        y_out[1::2] = y_max
+        return x_out, y_out
+
 
 class ArduinoWorker(QtCore.QThread):
     # Signal to send data to the main thread
-    data_signal = QtCore.pyqtSignal(list)
+    data_signal = QtCore.pyqtSignal(object)  # ArduinoSnapshot
     command_signal = QtCore.pyqtSignal(str)
     set_valve_signal = QtCore.pyqtSignal(list)
     get_valve_signal = QtCore.pyqtSignal()
-    valve_states_updated = QtCore.pyqtSignal()
+    # Valve states read from the coils
+    valve_states_updated = QtCore.pyqtSignal(list)
+    # Emitted once the port has been opened, True if it succeeded
+    connected = QtCore.pyqtSignal(bool)
+
+    # Time between drains of the firmware sample FIFO (ms), each drain is
+    # kept within ArduinoController.DRAIN_TIME
+    DRAIN_INTERVAL = 250
+    # Reads in a row that may miss their deadline before the Arduino is
+    # probed, as a dead Arduino only ever misses deadlines
+    MAX_DEADLINE_MISSES = 4
+    # Longest time the thread waits for the reset sent when stopping (s)
+    RESET_TIMEOUT = 2.0
+    # Workers still stopping, kept until their thread has finished
+    _stopping = set()
 
     def __init__(self, parent, port, mode, verbose):
         super().__init__()
         self.controller = ArduinoController(
-            port=port, mode=mode, verbose=verbose)
+            port=port, mode=mode, verbose=verbose,
+            calibration=parent.calibration)
         self.running = True
+        self.acquiring = False
         self.parent = parent
-        self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.poll_readings)
-        self.mutex = QtCore.QMutex()
+        # Sample period of the acquisition loop (ms)
+        self.sample_interval = parent.valveCheckInterval
+        # Number of sample ticks skipped because a read overran its slot
+        self.missed_samples = 0
+        # Reads in a row that missed their deadline
+        self.deadline_misses = 0
+        # Samples shared with the plot, logger and sequence engine
+        self.buffer = RingBuffer(sample_period=self.sample_interval)
+        # Set to wake the acquisition loop when stopping
+        self._stop_event = threading.Event()
+        # Callbacks waiting for the pending valve write to land
+        self._valve_lock = threading.Lock()
+        self._valve_callbacks = []
+        # Reopens the port after a transient failure
+        self.supervisor = ReconnectSupervisor("valve Arduino")
+        # Set after a reconnect to mark the gap in the recording
+        self._gap = False
+        self.finished.connect(self._release)
 
     def run(self):
-        """Run the Arduino controller in a background thread."""
-        self.controller.start()
+        """Sample the Arduino at a fixed rate through the Modbus transport."""
+        # Every request runs on the transport thread that owns the port, so
+        # GUI commands go straight to the transport between samples
+        self.controller.submit(self.controller.start).result()
+        self.connected.emit(self.controller.serial_connected)
+        if not self.controller.serial_connected:
+            return
+
+        period = self.sample_interval / 1000
+        if self.controller.fifo_supported:
+            # The firmware samples at its own rate, drained a batch at a time
+            period = self.DRAIN_INTERVAL / 1000
+            self.buffer.sample_period = self.controller.sample_period
+        next_sample = time.perf_counter()
+        while self.running:
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                self._stop_event.wait(delay)
+                continue
+            if not self.controller.serial_connected:
+                self.supervise()
+            elif self.acquiring:
+                # A sample not read before the next one is due is dropped
+                self.poll_readings(deadline=next_sample + period)
+            # Schedule against the ideal timeline so the rate doesn't drift
+            next_sample += period
+            if next_sample <= time.perf_counter():
+                skipped = int(
+                    (time.perf_counter() - next_sample) // period) + 1
+                self.missed_samples += skipped
+                next_sample += skipped * period
+
+        # Sent ahead of anything still queued, and closes the port
+        reset = self.controller.submit(self.controller.send_reset,
+                                       priority=Priority.EMERGENCY)
+        try:
+            reset.result(timeout=self.RESET_TIMEOUT)
+        except Exception as e:
+            logging.warning(f"Arduino reset not confirmed: {e!r}")
+        self.controller.serial_connected = False
+
+    def supervise(self):
+        """Reopen the port after a failure, backing off between attempts."""
+        if not self.supervisor.down:
+            # One failed transaction is no reason to reopen the port, which
+            # resets the Arduino and drops every valve
+            if self.controller.submit(self.controller.probe,
+                                      priority=Priority.EMERGENCY).result():
+                return
+            self.supervisor.lost()
+        if not self.supervisor.due():
+            return
+        # Restores the TTL and valve states once the port is open
+        if self.controller.submit(self.controller.reconnect,
+                                  priority=Priority.EMERGENCY).result():
+            self.supervisor.recovered()
+            self._gap = True
+        else:
+            self.supervisor.failed()
 
     def start_timer(self):
-        self.timer.start(self.parent.valveCheckInterval)
+        self.acquiring = True
 
     def stop_timer(self):
-        self.timer.stop()
+        self.acquiring = False
 
     def stop(self):
-        with QtCore.QMutexLocker(self.mutex):
-            """Stop the worker and the Arduino controller."""
-            self.running = False
-            # if last step was pressurised then depressurise?
-            self.controller.send_reset()
-            self.controller.serial_connected = False
-            self.quit()
-            self.wait(100)
+        """
+        Stop the worker and the Arduino controller without waiting.
+
+        The thread resets the Arduino and finishes on its own, emitting
+        finished, so the GUI never waits on the port.
+        """
+        if not self.running:
+            return
+        self.running = False
+        self._stop_event.set()
+        if self.isRunning():
+            ArduinoWorker._stopping.add(self)
+
+    @QtCore.pyqtSlot()
+    def _release(self):
+        ArduinoWorker._stopping.discard(self)
 
     def isConnected(self):
         # logging.info(f"Connection is {self.controller.serial_connected}")
@@ -2802,43 +3025,138 @@ class ArduinoWorker(QtCore.QThread):
 
     @QtCore.pyqtSlot()
     def get_valve_states(self):
-        with QtCore.QMutexLocker(self.mutex):
-            self.parent.valveStates = self.controller.get_valve_states()
-            self.valve_states_updated.emit()
+        """
+        Read the valve coils without waiting for the result.
 
-    def poll_readings(self):
+        Returns:
+            concurrent.futures.Future: Valve states once read, also emitted
+                by valve_states_updated
+        """
+        if not self.running:
+            future = Future()
+            future.set_result(self.valve_states())
+            return future
+
+        def read_valve_states():
+            self.controller.get_valve_states()
+            # Reconciled with any writes still in flight
+            states = self.valve_states()
+            self.valve_states_updated.emit(states)
+            return states
+        # Reads that pile up are merged into one
+        return self._submit(read_valve_states, "reading valve states",
+                            key="read_valves")
+
+    def _submit(self, fn, description, *args,
+                priority=Priority.TELEMETRY, key=None):
+        future = self.controller.submit(fn, *args, priority=priority, key=key)
+        future.add_done_callback(lambda f: log_failure(f, description))
+        return future
+
+    def poll_readings(self, deadline=None):
         if self.controller.serial_connected:
-            with QtCore.QMutexLocker(self.mutex):
-                if self.controller.get_readings():
-                    data = self.controller.readings  # Get new readings from Arduino
-                    # Emit signal with data to update the graph
-                    self.data_signal.emit(data)
-                # mode = self.controller.get_mode()
-                # ttl_state = self.controller.get_ttl_state()
-                # logging.info(f"mode: {mode} ttl: {ttl_state}")
+            # Every sample since the last drain, or else pressures, valve
+            # coils and TTL state in one transaction
+            if self.controller.fifo_supported:
+                read = self.controller.drain_samples
+            else:
+                read = self.controller.get_snapshot
+            try:
+                result = self.controller.submit(read, deadline=deadline).result()
+            except DeadlineExceeded:
+                self.missed_samples += 1
+                self.deadline_misses += 1
+                if self.deadline_misses >= self.MAX_DEADLINE_MISSES:
+                    # Check the Arduino is still there before the next read
+                    self.deadline_misses = 0
+                    self.controller.serial_connected = False
+                return
+            self.deadline_misses = 0
+            if not result:
+                return
+            snapshots = result if isinstance(result, list) else [result]
+            snapshots[0].gap_before = snapshots[0].gap_before or self._gap
+            self._gap = False
+            for snapshot in snapshots:
+                self.buffer.append(snapshot.host_time_ns, snapshot.pressures,
+                                   snapshot.mbar, snapshot.valve_mask)
+            # Read coils reconciled with any writes still in flight
+            self.parent.valveStates = self.valve_states()
+            for snapshot in snapshots:
+                # Emit signal with data to update the graph
+                self.data_signal.emit(snapshot)
 
     def depressurise(self):
-        with QtCore.QMutexLocker(self.mutex):
-            self.controller.send_depressurise()
+        self._drop_valve_writes()
+        self._submit(self.controller.send_depressurise, "depressurising",
+                     priority=Priority.EMERGENCY)
+
+    def valve_states(self):
+        """Valve states including every write requested so far."""
+        return list(self.controller.valve_cache.target)
+
+    def set_valve_states(self, states, done=None, priority=Priority.USER):
+        """
+        Queue a valve write.
+
+        The valve cache is updated straight away, and writes still waiting
+        are merged, so only the latest state of each valve is sent.
 
-    def set_valve_states(self, states):
-        with QtCore.QMutexLocker(self.mutex):
-            self.controller.set_valves(states)
+        Args:
+            states (list[int]): Valve states, 2 leaves a valve unchanged
+            done: Called with the perf_counter time once the write is sent
+            priority (Priority): Urgency of the write
+
+        Returns:
+            list[int]: Target state of every valve
+        """
+        target = self.controller.valve_cache.request(states)
+        if done is not None:
+            with self._valve_lock:
+                self._valve_callbacks.append(done)
+        self._submit(self._write_valve_target, "setting valve states",
+                     priority=priority, key="set_valves")
+        return target
+
+    def _write_valve_target(self):
+        with self._valve_lock:
+            callbacks, self._valve_callbacks = self._valve_callbacks, []
+        if not self.controller.write_valve_target():
+            return
+        written = time.perf_counter()
+        for done in callbacks:
+            done(written)
+
+    def _drop_valve_writes(self):
+        # Valve writes queued before a vent or reset must not undo it
+        self.controller.valve_cache.cancel_pending()
+        with self._valve_lock:
+            self._valve_callbacks = []
 
     def send_command(self, command):
-        with QtCore.QMutexLocker(self.mutex):
-            if command == "RESET":
-                self.controller.send_reset()
-                logging.info("Resetting Arduino")
-            elif command == "QUICK_VENT":
-                self.controller.send_depressurise()
-                logging.info("Depressurising Arduino")
-            elif command == "RESTART":
-                self.controller.start()
-            elif command == "TTLDISABLE":
-                self.controller.disableTTL()
-            else:
-                logging.info("Invalid command for arduino")
+        priority = Priority.USER
+        if command in ("RESET", "QUICK_VENT", "CANCEL_VENT"):
+            priority = Priority.EMERGENCY
+            self._drop_valve_writes()
+        self._submit(self._run_command, f"sending {command}", command,
+                     priority=priority, key=command)
+
+    def _run_command(self, command):
+        if command == "RESET":
+            self.controller.send_reset()
+            logging.info("Resetting Arduino")
+        elif command == "QUICK_VENT":
+            self.controller.send_depressurise()
+            logging.info("Depressurising Arduino")
+        elif command == "CANCEL_VENT":
+            self.controller.cancel_depressurise()
+            logging.info("Cancelled depressurising")
+        elif command == "RESTART":
+            self.controller.start()
+        elif command == "TTLDISABLE":
+            self.controller.disable_ttl()
+        else:
+            logging.info("Invalid command for arduino")
 
 
 class MotorWorker(QtCore.QThread):
@@ -2847,94 +3165,243 @@ class MotorWorker(QtCore.QThread):
     calibrate_signal = QtCore.pyqtSignal()
     ascent_signal = QtCore.pyqtSignal()
     top_signal = QtCore.pyqtSignal()
+    # Status read on the transport thread, handled on the GUI thread
+    status_signal = QtCore.pyqtSignal(object)  # MotorStatus or None
+    # Emitted once the port has been opened, True if it succeeded
+    connected = QtCore.pyqtSignal(bool)
+    # Outcome of a reconnect attempt, handled on the GUI thread
+    reconnect_signal = QtCore.pyqtSignal(bool)
+    # Outcome of a liveness probe, handled on the GUI thread
+    probe_signal = QtCore.pyqtSignal(bool)
+
+    # Polling intervals (ms). A status read takes ~30 ms at 9600 baud.
+    MOVING_INTERVAL = 50
+    CALIBRATING_INTERVAL = 250
+    IDLE_INTERVAL = 1000
+    # Checks for a due reconnect attempt while the port is down
+    RECONNECT_INTERVAL = 250
+    # Polls without a change in position before a move counts as finished
+    SETTLE_POLLS = 4
 
     def __init__(self, parent, port):
         super().__init__()
         self.motor = MotorController(port=port)
         self.parent = parent
         self.running = False
+        # Rescheduled after each poll, so polls never queue up
         self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.poll_position)
+        self.status_signal.connect(self.update_position)
+        self.reconnect_signal.connect(self.reconnect_finished)
+        self.probe_signal.connect(self.probe_finished)
+        # Reopens the port after a transient failure
+        self.supervisor = ReconnectSupervisor("motor")
+        # True while a status read is waiting on the transport
+        self.poll_pending = False
+        # Cached until a calibrate command or reconnect
         self.calibrated = False
-        self.mutex = QtCore.QMutex()
         self.top_position = "INIT"
+        # Last polled position (mm)
+        self.position = 0.0
+        self.moving = False
+        self.calibrating = False
+        self.settled_polls = 0
+
+    def _submit(self, fn, description, *args, priority=Priority.USER,
+                key=None):
+        # Queue a request on the transport without waiting for it
+        future = self.motor.submit(fn, *args, priority=priority, key=key)
+        future.add_done_callback(lambda f: log_failure(f, description))
+        return future
 
     @QtCore.pyqtSlot()
     def stop(self):
-        with QtCore.QMutexLocker(self.mutex):
-            if self.motor.serial_connected:
-                self.motor.shutdown()
+        if self.motor.serial_connected:
+            self._submit(self.motor.shutdown, "stopping motor",
+                         priority=Priority.EMERGENCY)
 
     @QtCore.pyqtSlot()
     def calibrate(self):
         """Handle command signals to control the Arduino (e.g., turn on/off valves)."""
-        with QtCore.QMutexLocker(self.mutex):
-            if self.motor.serial_connected:
-                self.top_position = "INIT"
-                self.motor.calibrate()
-                # logging.info("Calibrating motor, please wait")
+        if self.motor.serial_connected:
+            self.top_position = "INIT"
+            self.calibrated = False
+            self.calibrating = True
+            self._submit(self.motor.calibrate, "calibrating motor")
+            self.schedule_poll()
+            # logging.info("Calibrating motor, please wait")
+
+    def poll_interval(self):
+        """Time until the next poll (ms), short only while something changes."""
+        if self.supervisor.down:
+            return self.RECONNECT_INTERVAL
+        if self.moving:
+            return self.MOVING_INTERVAL
+        if self.calibrating:
+            return self.CALIBRATING_INTERVAL
+        return self.IDLE_INTERVAL
+
+    def schedule_poll(self):
+        """Poll again after the interval for the current motor state."""
+        if self.running:
+            interval = self.poll_interval()
+            # Only ever bring the next poll forward, never push it back
+            if not self.timer.isActive() or self.timer.remainingTime() > interval:
+                self.timer.start(interval)
+
+    def start_moving(self):
+        """Switch to fast polling until the motor stops."""
+        self.moving = True
+        self.settled_polls = 0
+        self.schedule_poll()
 
     def poll_position(self):
         # logging.info("Polling motor position")
-        with QtCore.QMutexLocker(self.mutex):
-            try:
-                if self.running:
-                    if self.motor.serial_connected:
-                        self.calibrated = self.motor.check_calibrated()
-                        if self.calibrated:
-                            if self.top_position == "INIT":
-                                self.top_position = self.motor.get_top_position()
-                                # logging.info(f"Top position: {
-                                #             self.top_position}")
-                            position = self.motor.get_current_position()
-                            position = (int(self.top_position) - int(position))
-                            position = self.steps_to_mm(position)
-                            # logging.info(f"Current motor position: {position}")
-                            self.parent.curMotorPosEdit.setText(str(position))
-                    self.parent.UIUpdateArdConnection()
-                else:
-                    self.timer.stop()
-                    self.running = False
-                    self.motor.reset()
-                    # self.stop()
-            except Exception as e:
-                logging.error(f"Error polling motor position: {e}")
-                self.timer.stop()
-                self.running = False
-                self.motor.reset()
-                # self.stop()
+        if not self.running:
+            self.timer.stop()
+            self._submit(self.motor.reset, "resetting motor")
+            return
+        if self.poll_pending:
+            return
+        if self.motor.serial_connected:
+            # Position, top position and calibration in one transaction
+            self.poll_pending = True
+            future = self.motor.submit(self.motor.get_status, key="status")
+            future.add_done_callback(self._status_received)
+        elif not self.supervisor.down:
+            # One failed transaction is no reason to reopen the port, which
+            # resets the Arduino and loses the calibration
+            self.poll_pending = True
+            future = self.motor.submit(self.motor.probe,
+                                       priority=Priority.EMERGENCY)
+            future.add_done_callback(
+                lambda f: self.probe_signal.emit(
+                    not f.exception() and f.result()))
+        else:
+            if self.supervisor.due():
+                # Resumes an unfinished move once the port is open
+                self.poll_pending = True
+                future = self.motor.submit(self.motor.reconnect,
+                                           priority=Priority.EMERGENCY)
+                future.add_done_callback(
+                    lambda f: self.reconnect_signal.emit(
+                        not f.exception() and f.result()))
+            self.parent.UIUpdateArdConnection()
+            self.schedule_poll()
+
+    @QtCore.pyqtSlot(bool)
+    def probe_finished(self, alive):
+        self.poll_pending = False
+        if not alive:
+            self.supervisor.lost()
+            self.parent.UIUpdateArdConnection()
+        self.schedule_poll()
+
+    @QtCore.pyqtSlot(bool)
+    def reconnect_finished(self, connected):
+        self.poll_pending = False
+        if connected:
+            self.supervisor.recovered()
+        else:
+            self.supervisor.failed()
+        self.schedule_poll()
+
+    def _status_received(self, future):
+        # Runs on the transport thread
+        status = None
+        if not future.cancelled():
+            if future.exception() is not None:
+                logging.error(
+                    f"Error polling motor position: {future.exception()}")
+            else:
+                status = future.result()
+        self.status_signal.emit(status)
+
+    @QtCore.pyqtSlot(object)
+    def update_position(self, status):
+        self.poll_pending = False
+        if self.running and status is not None:
+            self.apply_status(status)
+        self.parent.UIUpdateArdConnection()
+        self.schedule_poll()
+
+    def apply_status(self, status):
+        if status.calibrated and not self.calibrated:
+            # Calibration ends with the motor moving to the top
+            self.calibrating = False
+            self.start_moving()
+        self.calibrated = status.calibrated
+        # Moves run at the firmware's speed register, 0 if it was not read
+        profile = self.parent.motion_profile
+        if status.speed and status.speed != profile.max_velocity:
+            logging.info(f"Motor speed is {status.speed} steps/s")
+            profile.max_velocity = status.speed
+        if not self.calibrated:
+            return
+        self.top_position = status.top_position
+
+        position = self.steps_to_mm(status.top_position - status.position)
+        # The busy flag is only a guess on firmware without status registers
+        busy = status.busy and self.motor.status_supported
+        if position == self.position and not busy:
+            self.settled_polls += 1
+            if self.settled_polls >= self.SETTLE_POLLS:
+                self.moving = False
+        else:
+            self.settled_polls = 0
+        self.position = position
+        # logging.info(f"Current motor position: {position}")
+        self.parent.curMotorPosEdit.setText(str(position))
 
     def is_connected(self):
         return self.motor.serial_connected
 
     @QtCore.pyqtSlot(int)
     def move_to_target(self, target):
-        with QtCore.QMutexLocker(self.mutex):
-            if self.motor.serial_connected:
-                logging.info(f"Moving motor to position {target}")
-                target = self.mm_to_steps(target)
-                self.motor.move_to_position(target)
+        if self.motor.serial_connected:
+            move_time = self.parent.motion_profile.move_time_mm(
+                target - self.position)
+            logging.info(
+                f"Moving motor to position {target} (~{move_time:.1f} s)")
+            target = self.mm_to_steps(target)
+            # A move still waiting is replaced by the newer target
+            self._submit(self.motor.move_to_position, "moving motor", target,
+                         key="move")
+            self.start_moving()
 
     def start_timer(self):
-        self.timer.start(10)
+        self.timer.start(0)
 
     def connect(self):
-        self.motor.start()
+        """
+        Open the motor port without waiting for it.
+
+        Returns:
+            concurrent.futures.Future: Finishes once the port has been
+                opened, with the outcome emitted by connected
+        """
+        self.calibrated = False
+        self.top_position = "INIT"
         self.running = True
+        future = self._submit(self.motor.start, "connecting motor")
+        future.add_done_callback(
+            lambda f: self.connected.emit(self.motor.serial_connected))
+        return future
 
     @QtCore.pyqtSlot()
     def ascent(self):
-        with QtCore.QMutexLocker(self.mutex):
-            if self.motor.serial_connected:
-                logging.info("Ascent")
-                self.motor.ascent()
+        if self.motor.serial_connected:
+            logging.info("Ascent")
+            self._submit(self.motor.ascent, "moving motor up")
+            self.start_moving()
 
     @QtCore.pyqtSlot()
     def to_top(self):
-        with QtCore.QMutexLocker(self.mutex):
-            if self.motor.serial_connected:
-                logging.info("To Top")
-                self.motor.to_top()
+        if self.motor.serial_connected:
+            logging.info("To Top")
+            self._submit(self.motor.to_top, "moving motor to top")
+            self.start_moving()
 
     def steps_to_mm(self, steps):
         # 1mm = 6400 steps
@@ -2970,6 +3437,9 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
 
     def closeEvent(self, event):
 
+        self.stop_sequence()
+        self.saving = False
+        self.stop_saving()
         try:
             if self.arduino_worker:
                 self.arduino_worker.stop()
@@ -2984,6 +3454,10 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
                     print("Motor stopped")
         except AttributeError:
             pass
+        # Give the resets a moment to go out, without hanging on a dead port
+        for worker in list(ArduinoWorker._stopping):
+            worker.wait(int(ArduinoWorker.RESET_TIMEOUT * 1000))
+        get_transport().close(timeout=ArduinoWorker.RESET_TIMEOUT)
         if self.verbosity:
             print("Application is closing...")
 
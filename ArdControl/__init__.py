@@ -1 +1 @@
-from .arduinoController import ArduinoController
\ No newline at end of file
+from .arduinoController import ArduinoController, ArduinoSnapshot
@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
 import minimalmodbus
+import enum
 import threading
 import serial
 import logging
 import time
 import csv
 import os
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from calibration import PressureCalibration
+from modbusTransport import (BITS_PER_BYTE, DeadlineExceeded, ModbusTransport,
+                             Priority, deadline_cut, get_transport)
 
 # +--------------------------+---------+-----------------------------------------+
 # |         Coil/reg         | Address |                 Purpose                 |
@@ -17,9 +25,195 @@ import os
 # | TTL Coil                 | 16      | Used to enable/disable TTL control      |
 # | Reset Coil               | 17      | Used to reset the system from GUI       |
 # | depressurise Coil        | 18      | Used to depressurise system from GUI    |
+# | Valve mask register      | 4       | Input reg, bit n = valve coil n         |
+# | Status flags register    | 5       | Input reg, bit0 TTL, bit1 reset,        |
+# | ,                        | ,       | bit2 depressurise                       |
+# | Timestamp registers      | 6-7     | Input regs, firmware millis() of the    |
+# | ,                        | ,       | last pressure reading, high word first  |
+# | Stats mean registers     | 8-11    | Input regs, mean reading of each gauge  |
+# | ,                        | ,       | since the last host request, in 1/16    |
+# | ,                        | ,       | raw counts                              |
+# | Stats min registers      | 12-15   | Input regs, lowest reading of each      |
+# | ,                        | ,       | gauge in the window                     |
+# | Stats max registers      | 16-19   | Input regs, highest reading of each     |
+# | ,                        | ,       | gauge in the window                     |
+# | Stats count register     | 20      | Input reg, readings per gauge in the    |
+# | ,                        | ,       | window, the gauges are read every 4 ms  |
+# | Vent state register      | 21      | Input reg, see VentState                |
+# | Vent progress register   | 22      | Input reg, percent of the pressure drop |
+# | ,                        | ,       | done by the current vent                |
+# | Sample period register   | 0       | Holding reg, ms per sample (10-1000)    |
+# | FIFO head register       | 32      | Input reg, seq of the newest sample     |
+# | FIFO records             | 33-160  | Input regs, 16 records of 8 regs: seq,  |
+# | ,                        | ,       | millis() high/low, 4 raw pressures,     |
+# | ,                        | ,       | valve mask + status flags << 8. Sample  |
+# | ,                        | ,       | seq is held in slot seq % 16            |
 # +--------------------------+---------+-----------------------------------------+
 
 
+class VentState(enum.IntEnum):
+    """State of the firmware depressurise sequence."""
+    IDLE = 0        # Never started, or cancelled
+    VENTING = 1
+    DONE = 2        # Pressure fell below the target
+    TIMED_OUT = 3   # Gave up before the pressure fell
+
+
+@dataclass
+class PressureStats:
+    """
+    Oversampled gauge readings over the window since the previous request.
+
+    Attributes:
+        mean (np.ndarray): Mean raw reading of each gauge
+        minimum (np.ndarray): Lowest raw reading of each gauge
+        maximum (np.ndarray): Highest raw reading of each gauge
+        count (int): Readings of each gauge in the window, 0 if none
+        mean_mbar (np.ndarray): Calibrated mean of each gauge
+    """
+    mean: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    count: int
+    mean_mbar: np.ndarray | None = None
+
+    @property
+    def spread(self) -> np.ndarray:
+        """Peak to peak noise of each gauge in raw counts."""
+        return self.maximum - self.minimum
+
+
+@dataclass
+class ArduinoSnapshot:
+    """
+    State of the valve Arduino captured in a single Modbus transaction.
+
+    Attributes:
+        pressures (list[int]): Raw gauge readings, not converted to bar
+        valve_states (list[int]): State of the 8 valve coils
+        mbar (np.ndarray): Calibrated pressure of each gauge
+        ttl (bool): TTL control coil
+        reset (bool): Reset coil
+        depressurise (bool): Depressurise coil
+        firmware_time (int): Firmware millis() of the pressure reading
+        host_time_ns (int): Host monotonic time the snapshot was received
+        gap_before (bool): First snapshot after the connection was lost
+        stats (PressureStats): Oversampling statistics, None if the
+            firmware does not provide them
+        vent_state (VentState): State of the depressurise sequence
+        vent_progress (int): Percent of the pressure drop done by the vent
+    """
+    pressures: list[int]
+    valve_states: list[int]
+    ttl: bool = False
+    reset: bool = False
+    depressurise: bool = False
+    firmware_time: int = 0
+    host_time_ns: int = field(default_factory=time.monotonic_ns)
+    mbar: np.ndarray | None = None
+    gap_before: bool = False
+    stats: PressureStats | None = None
+    vent_state: VentState = VentState.IDLE
+    vent_progress: int = 0
+
+    @property
+    def valve_mask(self) -> int:
+        """Valve states packed into a bitmask, bit n = valve n."""
+        return sum(1 << i for i, state in enumerate(self.valve_states) if state)
+
+
+class ValveStateCache:
+    """
+    Authoritative record of the valve coil states.
+
+    Writes are requested against the target state, with 2 leaving a valve
+    unchanged, so the GUI sees the result of an action immediately. Each
+    request bumps the version. Once a write lands, the states it wrote are
+    confirmed. Coil reads are reconciled against the cache: the hardware is
+    taken as the truth unless a requested write has not landed yet.
+
+    Attributes:
+        states (list[int]): States last confirmed by the Arduino
+        target (list[int]): States once every requested write has landed
+        version (int): Number of writes requested
+        written_version (int): Version of the last write that landed
+        mismatches (int): Coil reads that disagreed with the cache
+    """
+
+    def __init__(self, channels: int = 8):
+        self._lock = threading.Lock()
+        self.states = [0] * channels
+        self.target = [0] * channels
+        self.version = 0
+        self.written_version = 0
+        self.mismatches = 0
+
+    @property
+    def pending(self) -> bool:
+        """True if a requested write has not landed yet."""
+        return self.written_version != self.version
+
+    def request(self, states) -> list[int]:
+        """
+        Apply a masked write to the target.
+
+        Args:
+            states (list[int]): Valve states, 2 leaves a valve unchanged
+
+        Returns:
+            list[int]: Target state of every valve
+        """
+        with self._lock:
+            self.target = [old if new == 2 else new
+                           for old, new in zip(self.target, states)]
+            self.version += 1
+            return list(self.target)
+
+    def pending_target(self):
+        """Target and its version if a write is needed, else (None, version)."""
+        with self._lock:
+            if not self.pending:
+                return None, self.version
+            return list(self.target), self.version
+
+    def written(self, states, version: int):
+        """Record that a write of the given target version has landed."""
+        with self._lock:
+            self.states = list(states)
+            self.written_version = max(self.written_version, version)
+
+    def resend(self):
+        """Mark the target as unwritten, e.g. after the Arduino has reset."""
+        with self._lock:
+            self.version += 1
+
+    def cancel_pending(self):
+        """Forget writes that have not landed, reverting to the hardware."""
+        with self._lock:
+            self.target = list(self.states)
+            self.written_version = self.version
+
+    def reconcile(self, states) -> bool:
+        """
+        Update the cache from a coil read.
+
+        Args:
+            states (list[int]): States read from the valve coils
+
+        Returns:
+            bool: False if the read disagreed with the cache
+        """
+        with self._lock:
+            states = [int(state) for state in states]
+            self.states = states
+            if self.pending or states == self.target:
+                return True
+            # Changed outside the GUI, e.g. by TTL control or a reset
+            self.mismatches += 1
+            self.target = list(states)
+            return False
+
+
 class ArduinoController:
     """
     Controls communication with Arduino for valve and pressure management.
@@ -38,19 +232,56 @@ class ArduinoController:
     TTL_ADDRESS = 16
     RESET_ADDRESS = 17
     DEPRESSURIZE_ADDRESS = 18
+    SNAPSHOT_ADDRESS = 0  # Input registers 0-7, see table above
+    SNAPSHOT_LENGTH = 8
+    STATS_ADDRESS = 8  # Input registers 8-20, read with the snapshot
+    STATS_LENGTH = 13
+    # Stats means are in 1/16 raw counts
+    STATS_MEAN_SCALE = 16
+    VENT_ADDRESS = 21  # Input registers 21-22, read with the snapshot
+    VENT_LENGTH = 2
+    SAMPLE_PERIOD_ADDRESS = 0  # Holding register
+    FIFO_HEAD_ADDRESS = 32
+    FIFO_BASE_ADDRESS = 33
+    FIFO_SIZE = 16
+    FIFO_RECORD_LENGTH = 8
+    # Records per drain, keeping each read under the 125 register limit
+    MAX_DRAIN = 15
+    # Longest a drain may take on the line (s), within the drain interval
+    # of ArduinoWorker with room for a valve write. A drain split at the end
+    # of the FIFO takes one more request and turnaround, about 25 ms, which
+    # still leaves room for the write.
+    DRAIN_TIME = 0.2
+    # Time the firmware takes to start replying (s), mostly spent finding
+    # each register of the request in its register list
+    TURNAROUND = 0.01
+    # Firmware sample period requested on start (ms)
+    SAMPLE_PERIOD = 50
     
-    def __init__(self, port: int, verbose: bool, mode: int):
+    def __init__(self, port: int | str, verbose: bool, mode: int,
+                 calibration: PressureCalibration | None = None,
+                 transport: ModbusTransport | None = None):
         """
         Initialize Arduino controller.
         
         Args:
-            port (int): COM port number
+            port (int | str): COM port number, or port name such as
+                "/dev/ttyACM0"
             verbose (bool): Enable verbose logging
             mode (int): Operation mode (0=manual, 1=sequence, 2=TTL)
+            calibration (PressureCalibration): Per-gauge conversion from raw
+                readings, defaults to the legacy fit for every gauge
+            transport (ModbusTransport): Owner of the serial port, defaults
+                to the shared transport
         """
         self.port = port
+        self.port_name = port if isinstance(port, str) else f"COM{port}"
+        self.transport = transport or get_transport()
         self.verbose = verbose
         self.mode = mode
+        self.calibration = calibration or PressureCalibration()
+        # Last commanded state of the TTL control coil
+        self.ttl_enabled = False
         
         # Status flags
         self.serial_connected = False
@@ -59,7 +290,28 @@ class ArduinoController:
         # State containers
         self.arduino = None
         self.valve_states = [0] * 8
+        self.valve_cache = ValveStateCache()
         self.readings = [0] * 4
+        self.snapshot = None
+        # Cleared if the firmware predates the snapshot registers
+        self.snapshot_supported = True
+        # Cleared if the firmware predates the oversampling statistics
+        self.stats_supported = True
+        # Cleared if the firmware predates the vent status registers
+        self.vent_supported = True
+        self.vent_state = VentState.IDLE
+        self.vent_progress = 0
+        # Cleared if the firmware has no sample FIFO, see configure_fifo()
+        self.fifo_supported = False
+        self.sample_period = self.SAMPLE_PERIOD
+        # Samples overwritten in the FIFO before they were drained
+        self.lost_samples = 0
+        self._last_seq = 0
+        self._last_drain = 0.0
+        self._fifo_gap = False
+        # Host monotonic time (ns) of firmware millis() 0, from the last
+        # drain that read up to the newest sample
+        self._clock_offset_ns = None
         
         self._configure_logging()
         self._validate_mode()
@@ -85,14 +337,13 @@ class ArduinoController:
         logging.info("Starting server...")
         if self.connect_arduino():
             try:
-                if self.mode == 2:
-                    # type: ignore # Enable TTL control
-                    self.arduino.write_bit(self.TTL_ADDRESS, 1)  # type: ignore
-                else:
-                    # type: ignore # Disable TTL control
-                    self.arduino.write_bit(self.TTL_ADDRESS, 0)  # type: ignore
+                # TTL control is only enabled in TTL mode
+                self.ttl_enabled = self.mode == 2
+                self.arduino.write_bit(    # type: ignore
+                    self.TTL_ADDRESS, int(self.ttl_enabled))
+                self.configure_fifo()
                 logging.info("Arduino started")
-            except:
+            except Exception:
                 logging.error("Failed to connect to Arduino. Server not started.")
                 self.arduino = None
                 self.serial_connected = False
@@ -103,76 +354,476 @@ class ArduinoController:
 
     def connect_arduino(self):
         try:
-            self.arduino = minimalmodbus.Instrument(f"COM{self.port}", 10)
+            self.arduino = minimalmodbus.Instrument(self.port_name, 10)
             self.arduino.serial.baudrate = self.BAUD_RATE    # type: ignore
             self.arduino.serial.timeout = self.DEFAULT_TIMEOUT   # type: ignore
             # self.arduino.close_port_after_each_call = True
             time.sleep(1)  # Wait for the connection to be established
             self.readings = self.arduino.read_registers(
                 0, 4, 4)    # type: ignore
-            logging.info(f"Connected to Arduino on port {self.port}")
+            logging.info(f"Connected to Arduino on {self.port_name}")
             self.serial_connected = True
             return True
         except Exception as e:
-            logging.error(f"Failed to connect to Arduino on port {
-                          self.port}: {e}")
+            logging.error(
+                f"Failed to connect to Arduino on {self.port_name}: {e}")
             self.serial_connected = False
             return False
 
+    def reconnect(self) -> bool:
+        """
+        Reopen the port after a failure and restore the commanded state.
+
+        The Arduino resets when its port is opened, so the TTL coil and,
+        outside TTL control, the last commanded valve states are written
+        again.
+
+        Returns:
+            bool: True if the Arduino is connected and restored
+        """
+        if self.arduino is not None:
+            try:
+                self.arduino.serial.close()  # type: ignore
+            except Exception:
+                pass
+        if not self.connect_arduino():
+            return False
+        try:
+            self.arduino.write_bit(    # type: ignore
+                self.TTL_ADDRESS, int(self.ttl_enabled))
+        except Exception as e:
+            logging.error(f"Failed to restore TTL state: {e}")
+            self.serial_connected = False
+            return False
+        # The sample sequence restarted with the firmware
+        self.configure_fifo(self.sample_period)
+        if self.ttl_enabled:
+            return self.serial_connected
+        self.valve_cache.resend()
+        return self.write_valve_target()
+
+    def probe(self) -> bool:
+        """
+        Check the Arduino still answers, without reopening the port.
+
+        Returns:
+            bool: True if it answered, serial_connected is then set again
+        """
+        if self.arduino is None:
+            return False
+        try:
+            self.arduino.read_registers(0, 4, 4)    # type: ignore
+            self.serial_connected = True
+            return True
+        except Exception as e:
+            logging.warning(f"Arduino did not answer: {e}")
+            return False
+
+    def submit(self, fn, *args, priority: Priority = Priority.TELEMETRY,
+               key=None, deadline: float | None = None):
+        """
+        Run a controller method on the thread that owns the serial port.
+
+        Args:
+            fn: Controller method, e.g. self.get_snapshot
+            *args: Arguments for fn
+            priority (Priority): Urgency of the request
+            key: Requests with the same key replace each other while waiting
+            deadline (float): perf_counter time after which the request is
+                dropped, or None to always send it
+
+        Returns:
+            concurrent.futures.Future: Result of fn
+        """
+        serial_port = self.arduino.serial if self.arduino else None
+        return self.transport.submit(self.port_name, fn, *args,
+                                     priority=priority, key=key,
+                                     deadline=deadline, serial=serial_port)
+
+    def _failed(self, message: str | None):
+        """
+        Handle a failed transaction, marking the Arduino as disconnected.
+
+        Args:
+            message (str): Error to log, or None to fail silently
+
+        Raises:
+            DeadlineExceeded: If the request's deadline cut the serial
+                timeout short, which says nothing about the Arduino
+        """
+        if deadline_cut():
+            raise DeadlineExceeded(f"{message or 'Request'}, deadline passed")
+        if message:
+            logging.error(message)
+        self.serial_connected = False
+
     def get_readings(self):
         try:
             self.readings = self.arduino.read_registers(    # type: ignore
                 0, 4, 4)
             self.serial_connected = True
-        except:
-            logging.error("Failed to read pressure readings")
-            self.serial_connected = False
+        except Exception:
+            self._failed("Failed to read pressure readings")
         return self.readings
 
+    def get_snapshot(self):
+        """
+        Read pressures, valve coils, status coils and firmware time at once.
+
+        The oversampling statistics and vent status are read in the same
+        transaction, and the calibrated pressures are taken from the means.
+        Falls back to shorter reads on firmware without them, and to
+        separate reads on firmware without snapshot registers.
+
+        Returns:
+            ArduinoSnapshot: Latest snapshot, or None if the read failed
+        """
+        if not self.snapshot_supported:
+            return self._get_legacy_snapshot()
+        length = self.SNAPSHOT_LENGTH
+        if self.vent_supported:
+            length = self.VENT_ADDRESS + self.VENT_LENGTH
+        elif self.stats_supported:
+            length = self.STATS_ADDRESS + self.STATS_LENGTH
+        try:
+            registers = self.arduino.read_registers(    # type: ignore
+                self.SNAPSHOT_ADDRESS, length, 4)
+            self.snapshot = self._unpack_snapshot(registers)
+            self.snapshot.mbar = self.convert_pressures(self.snapshot.pressures)
+            if self.stats_supported:
+                stats = self._unpack_stats(registers[self.STATS_ADDRESS:])
+                if stats.count:
+                    stats.mean_mbar = self.convert_pressures(stats.mean)
+                    self.snapshot.mbar = stats.mean_mbar
+                self.snapshot.stats = stats
+            if self.vent_supported:
+                self._update_vent(registers[self.VENT_ADDRESS:])
+            self.snapshot.vent_state = self.vent_state
+            self.snapshot.vent_progress = self.vent_progress
+            self.readings = self.snapshot.pressures
+            self.valve_states = self.snapshot.valve_states
+            self.valve_cache.reconcile(self.valve_states)
+            self.serial_connected = True
+            return self.snapshot
+        except minimalmodbus.IllegalRequestError:
+            if self.vent_supported:
+                logging.info("Firmware has no vent status")
+                self.vent_supported = False
+                self.vent_state = VentState.IDLE
+                return self.get_snapshot()
+            if self.stats_supported:
+                logging.info("Firmware has no pressure statistics")
+                self.stats_supported = False
+                return self.get_snapshot()
+            logging.info(
+                "Firmware has no snapshot registers, using separate reads")
+            self.snapshot_supported = False
+            return self._get_legacy_snapshot()
+        except Exception:
+            self._failed("Failed to read snapshot")
+            return None
+
+    def _get_legacy_snapshot(self):
+        try:
+            pressures = self.arduino.read_registers(0, 4, 4)  # type: ignore
+            valve_states = self.arduino.read_bits(0, 8, 1)  # type: ignore
+            flags = self.arduino.read_bits(    # type: ignore
+                self.TTL_ADDRESS, 3, 1)
+            self.snapshot = ArduinoSnapshot(
+                pressures=pressures,
+                valve_states=valve_states,
+                ttl=bool(flags[0]),
+                reset=bool(flags[1]),
+                depressurise=bool(flags[2]),
+                mbar=self.convert_pressures(pressures))
+            self.readings = pressures
+            self.valve_states = valve_states
+            self.valve_cache.reconcile(self.valve_states)
+            self.serial_connected = True
+            return self.snapshot
+        except Exception:
+            self._failed("Failed to read snapshot")
+            return None
+
+    def configure_fifo(self, period: int = SAMPLE_PERIOD) -> bool:
+        """
+        Set the firmware sample period and start draining from its newest sample.
+
+        Args:
+            period (int): Time between samples (ms)
+
+        Returns:
+            bool: False if the firmware has no sample FIFO
+        """
+        try:
+            self.arduino.write_register(    # type: ignore
+                self.SAMPLE_PERIOD_ADDRESS, period, functioncode=6)
+            self._last_seq = int(self.arduino.read_register(    # type: ignore
+                self.FIFO_HEAD_ADDRESS, functioncode=4))
+            self._last_drain = time.perf_counter()
+            self._clock_offset_ns = None
+            self.sample_period = period
+            self.fifo_supported = True
+        except minimalmodbus.IllegalRequestError:
+            logging.info("Firmware has no sample FIFO, using snapshots")
+            self.fifo_supported = False
+        except Exception as e:
+            self._failed(f"Failed to configure sample FIFO: {e}")
+            self.fifo_supported = False
+        return self.fifo_supported
+
+    def drain_samples(self):
+        """
+        Read every sample added to the firmware FIFO since the last drain.
+
+        The records are read in one transaction, sized from the time since
+        the last drain but no longer than fits in DRAIN_TIME, and any left
+        over are read by the next drain. A run of records past the last slot
+        of the FIFO takes a second transaction for the rest.
+        Samples overwritten before they could be read are counted in
+        lost_samples, and the sample after them has gap_before set.
+
+        Returns:
+            list[ArduinoSnapshot]: New samples, oldest first, or None if
+                the read failed
+        """
+        now = time.perf_counter()
+        elapsed = (now - self._last_drain) * 1000 / self.sample_period
+        limit = self.drain_limit()
+        count = min(max(int(elapsed) + 2, 1), limit)
+        # Skip samples already overwritten, or about to be, after a stall
+        skip = max(int(elapsed) + 2 - self.FIFO_SIZE, 0)
+        start = (self._last_seq + 1 + skip) % self.FIFO_SIZE
+        # Records past the last slot carry on from the first, in a second read
+        first = min(count, self.FIFO_SIZE - start)
+        # The firmware answers with the samples it has when the request
+        # arrives, so its newest sample was taken before the request was sent
+        host_time_ns = time.monotonic_ns()
+        try:
+            registers = self.arduino.read_registers(    # type: ignore
+                self.FIFO_BASE_ADDRESS + start * self.FIFO_RECORD_LENGTH,
+                first * self.FIFO_RECORD_LENGTH, 4)
+            if first < count:
+                registers += self.arduino.read_registers(    # type: ignore
+                    self.FIFO_BASE_ADDRESS,
+                    (count - first) * self.FIFO_RECORD_LENGTH, 4)
+            self.serial_connected = True
+        except Exception:
+            self._failed("Failed to drain samples")
+            return None
+        self._last_drain = now
+
+        records = np.array(registers, dtype=np.int64).reshape(
+            count, self.FIFO_RECORD_LENGTH)
+        # How far each record is past the last one read, modulo 2**16.
+        # New samples are the leading run that follows on without a break.
+        ahead = (records[:, 0] - self._last_seq) & 0xFFFF
+        run = (ahead == ahead[0] + np.arange(count)) & (ahead < 0x8000)
+        if ahead[0] == 0 or not run[0]:
+            if elapsed > 4:
+                # Nothing new for several periods, the firmware restarted
+                self.configure_fifo(self.sample_period)
+                self._fifo_gap = True
+            return []
+        records = records[:count if run.all() else int(np.argmin(run))]
+
+        lost = int(ahead[0]) - 1
+        if lost:
+            logging.warning(f"{lost} pressure samples lost from the FIFO")
+            self.lost_samples += lost
+        self._last_seq = int(records[-1, 0])
+
+        times = (records[:, 1] << 16) | records[:, 2]
+        if len(records) < limit or self._clock_offset_ns is None:
+            # The newest sample was taken just before the request
+            self._clock_offset_ns = host_time_ns - int(times[-1]) * 1_000_000
+        else:
+            # Cut at the limit with more samples left, which the next drain
+            # reads from where this one stopped
+            behind_ns = (host_time_ns - self._clock_offset_ns
+                         - int(times[-1]) * 1_000_000)
+            self._last_drain = now - max(behind_ns, 0) / 1e9
+        host_times = times * 1_000_000 + self._clock_offset_ns
+        mbar = self.convert_pressures(records[:, 3:7])
+        samples = []
+        for record, host_time, pressures in zip(records.tolist(),
+                                                host_times.tolist(), mbar):
+            status = record[7]
+            sample = self._unpack_snapshot(
+                record[3:7] + [status & 0xFF, status >> 8] + record[1:3])
+            sample.host_time_ns = host_time
+            sample.mbar = pressures
+            samples.append(sample)
+        samples[0].gap_before = bool(lost) or self._fifo_gap
+        self._fifo_gap = False
+
+        # The depressurise coil stays set while the firmware vents
+        if samples[-1].depressurise or self.vent_state == VentState.VENTING:
+            try:
+                self.get_vent_status()
+            except DeadlineExceeded:
+                pass  # Read again with the next drain, keep these samples
+        for sample in samples:
+            sample.vent_state = self.vent_state
+            sample.vent_progress = self.vent_progress
+
+        self.snapshot = samples[-1]
+        self.readings = self.snapshot.pressures
+        self.valve_states = self.snapshot.valve_states
+        self.valve_cache.reconcile(self.valve_states)
+        return samples
+
+    def drain_limit(self) -> int:
+        """Most records one drain can read within DRAIN_TIME at BAUD_RATE."""
+        # Request, and reply header and CRC
+        overhead = 8 + 5
+        line_bytes = ((self.DRAIN_TIME - self.TURNAROUND) * self.BAUD_RATE
+                      / BITS_PER_BYTE)
+        records = int(line_bytes - overhead) // (2 * self.FIFO_RECORD_LENGTH)
+        return min(max(records, 1), self.MAX_DRAIN)
+
+    @staticmethod
+    def _unpack_snapshot(registers):
+        valve_mask = registers[4]
+        flags = registers[5]
+        return ArduinoSnapshot(
+            pressures=list(registers[0:4]),
+            valve_states=[(valve_mask >> i) & 1 for i in range(8)],
+            ttl=bool(flags & 0x01),
+            reset=bool(flags & 0x02),
+            depressurise=bool(flags & 0x04),
+            firmware_time=(registers[6] << 16) | registers[7])
+
+    def get_vent_status(self):
+        """
+        Read the state and progress of the firmware depressurise sequence.
+
+        Returns:
+            VentState: Current state, or the last known one if the read
+                failed or the firmware has no vent status
+        """
+        if not self.vent_supported:
+            return self.vent_state
+        try:
+            self._update_vent(self.arduino.read_registers(    # type: ignore
+                self.VENT_ADDRESS, self.VENT_LENGTH, 4))
+        except minimalmodbus.IllegalRequestError:
+            logging.info("Firmware has no vent status")
+            self.vent_supported = False
+            self.vent_state = VentState.IDLE
+        except Exception:
+            self._failed("Failed to read vent status")
+        return self.vent_state
+
+    def _update_vent(self, registers):
+        try:
+            state = VentState(registers[0])
+        except ValueError:
+            logging.error(f"Unknown vent state {registers[0]}")
+            return
+        if state != self.vent_state:
+            logging.info(f"Vent state {state.name}")
+        self.vent_state = state
+        self.vent_progress = registers[1]
+
+    def _unpack_stats(self, registers):
+        registers = np.asarray(registers, dtype=np.int64)
+        return PressureStats(
+            mean=registers[0:4] / self.STATS_MEAN_SCALE,
+            minimum=registers[4:8],
+            maximum=registers[8:12],
+            count=int(registers[12]))
+
+    def convert_pressures(self, raw):
+        """
+        Convert a block of raw pressure readings using the calibration.
+
+        Args:
+            raw: Raw readings, one row per sample and one column per gauge
+
+        Returns:
+            np.ndarray: New array of calibrated pressures, same shape as raw
+        """
+        return self.calibration.convert(raw)
+
     def get_valve_states(self):
         try:
             # read_bits MUST use functioncode = 1
             self.valve_states = self.arduino.read_bits(0, 8, 1)  # type: ignore
+            self.valve_cache.reconcile(self.valve_states)
             self.serial_connected = True
-        except:
-            logging.error("Failed to read valve states")
-            self.serial_connected = False
+        except Exception:
+            self._failed("Failed to read valve states")
         return self.valve_states
 
     def set_valves(self, valve_states):
+        """
+        Write valve states, 2 leaves a valve unchanged.
+
+        Args:
+            valve_states (list[int]): State of each valve
+        """
+        self.valve_cache.request(valve_states)
+        self.write_valve_target()
+
+    def write_valve_target(self) -> bool:
+        """
+        Write the valve cache target, if a requested write has not landed.
+
+        Unchanged valves are resolved from the cache rather than a read, so
+        every write is a single transaction.
+
+        Returns:
+            bool: False if the write failed
+        """
+        states, version = self.valve_cache.pending_target()
+        if states is None:
+            return True
         try:
-            """
-            for i in range(8):
-                if valve_states[i] != 2:
-                    self.arduino.write_bit(i, valve_states[i])  # type: ignore
+            self.arduino.write_bits(0, states)  # type: ignore
+            self.valve_cache.written(states, version)
+            self.valve_states = states
             self.serial_connected = True
-            """
-            write_states = [self.valve_states[i] if valve_states[i]
-                            == 2 else valve_states[i] for i in range(8)]
-            self.arduino.write_bits(0, write_states)  # type: ignore
-            self.serial_connected = True
-        except:
-            logging.error("Failed to set valve states")
-            self.serial_connected = False
+            return True
+        except Exception:
+            self._failed("Failed to set valve states")
+            return False
 
     def send_reset(self):
         try:
             self.arduino.write_bit(self.RESET_ADDRESS, 1)  # type: ignore
             self.serial_connected = True
-        except:
-            #logging.error("Failed to reset system")
-            self.serial_connected = False
+        except Exception:
+            self._failed(None)
         finally:
             if hasattr(self.arduino, 'serial'):
                 self.arduino.serial.close()  # type: ignore
 
     def send_depressurise(self):
+        """
+        Start the firmware depressurise sequence.
+
+        The firmware vents over the following seconds while still answering
+        requests, and reports its progress in the vent status registers.
+        """
         try:
             self.arduino.write_bit(self.DEPRESSURIZE_ADDRESS, 1)  # type: ignore
             self.serial_connected = True
-        except:
-            logging.error("Failed to depressurise system")
-            self.serial_connected = False
+            # Read the status until the firmware reports the vent has ended,
+            # even if it ends before the next read
+            if self.vent_supported:
+                self.vent_state = VentState.VENTING
+                self.vent_progress = 0
+        except Exception:
+            self._failed("Failed to depressurise system")
+
+    def cancel_depressurise(self):
+        """Stop the firmware depressurise sequence, closing every valve."""
+        try:
+            self.arduino.write_bit(self.DEPRESSURIZE_ADDRESS, 0)  # type: ignore
+            self.serial_connected = True
+        except Exception:
+            self._failed("Failed to cancel depressurising")
 
     def get_mode(self):
         return self.mode
@@ -181,9 +832,9 @@ class ArduinoController:
         return self.arduino.read_bit(16, 1)  # type: ignore
 
     def disable_ttl(self):
+        self.ttl_enabled = False
         try:
             self.arduino.write_bit(self.TTL_ADDRESS, 0)  # type: ignore
             self.serial_connected = True
-        except:
-            logging.error("Failed to disable TTL")
-            self.serial_connected = False
+        except Exception:
+            self._failed("Failed to disable TTL")
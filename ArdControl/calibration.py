@@ -0,0 +1,306 @@
+"""
+File: calibration.py
+Description: Per-gauge pressure calibration, fitted from captures at known pressures.
+
+Usage:
+    python calibration.py "C:\\NMR Results\\pressure_data{}.csv" --count 18 \\
+        --real 189 236 286 336 386 436 486 537 587 638 688 738 788 839 889 940 990 1039 \\
+        --gauges 1
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pressureLogger import PressureLogger, load_recording
+
+# Calibration file loaded by the GUI at startup
+CALIBRATION_PATH = os.path.join("C:\\ssbubble", "pressure_calibration.json")
+
+# Original single-gauge fit: raw = 0.8248 * real + 203.53, displayed as real / 100
+LEGACY_COEFFICIENTS = [-203.53 / 0.8248 / 100, 1 / 0.8248 / 100]
+
+# 10-bit ADC readings at or above this are treated as saturated
+ADC_SATURATION = 1020
+
+
+class PressureCalibration:
+    """
+    Conversion from raw gauge counts to pressure for each gauge.
+
+    Each gauge uses a polynomial, or a lookup table of (raw, pressure) points
+    interpolated linearly when one is given.
+
+    Attributes:
+        coefficients (list[list[float]]): Ascending polynomial coefficients per
+            gauge, pressure = c0 + c1 * raw + c2 * raw**2 + ...
+        lookup (dict): Lookup table per gauge index, [[raw...], [pressure...]]
+        metadata (dict): Fit details for each gauge, saved with the file
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, coefficients=None, metadata=None, lookup=None,
+                 channels: int = 4):
+        """
+        Initialize the calibration.
+
+        Args:
+            coefficients: Coefficients per gauge, defaults to the legacy fit
+            metadata (dict): Fit details keyed by gauge number
+            lookup (dict): Lookup tables keyed by gauge index
+            channels (int): Number of gauges
+        """
+        if coefficients is None:
+            coefficients = [LEGACY_COEFFICIENTS] * channels
+        self.coefficients = [list(c) for c in coefficients]
+        self.metadata = metadata or {}
+        self.lookup = {}
+        for gauge, (raw, pressure) in (lookup or {}).items():
+            self.set_lookup(gauge, raw, pressure)
+        self._build_matrix()
+
+    def _build_matrix(self):
+        # Pad to a common degree so every gauge converts in one expression
+        degree = max(len(c) for c in self.coefficients)
+        self._matrix = np.zeros((degree, len(self.coefficients)))
+        for gauge, c in enumerate(self.coefficients):
+            self._matrix[:len(c), gauge] = c
+
+    def set_gauge(self, gauge: int, coefficients, **metadata):
+        """
+        Replace the calibration of one gauge.
+
+        Args:
+            gauge (int): Gauge index, starting at 0
+            coefficients: Ascending polynomial coefficients
+            **metadata: Fit details to store with the coefficients
+        """
+        self.coefficients[gauge] = [float(c) for c in coefficients]
+        self.lookup.pop(gauge, None)
+        self.metadata[str(gauge + 1)] = metadata
+        self._build_matrix()
+
+    def set_lookup(self, gauge: int, raw, pressure):
+        """
+        Use a lookup table for one gauge instead of its polynomial.
+
+        Args:
+            gauge (int): Gauge index, starting at 0
+            raw: Raw counts of the table points, ascending
+            pressure: Pressure at each point
+        """
+        raw = np.asarray(raw, dtype=np.float64)
+        pressure = np.asarray(pressure, dtype=np.float64)
+        if raw.shape != pressure.shape or np.any(np.diff(raw) <= 0):
+            raise ValueError("Lookup table raw values must be ascending")
+        self.lookup[gauge] = (raw, pressure)
+
+    def convert(self, raw):
+        """
+        Convert raw gauge counts to pressure.
+
+        Args:
+            raw: Raw counts, last axis is the gauge
+
+        Returns:
+            np.ndarray: Pressures, same shape as raw
+        """
+        raw = np.asarray(raw, dtype=np.float64)
+        # Horner's scheme over all gauges at once
+        result = np.broadcast_to(self._matrix[-1], raw.shape).copy()
+        for row in self._matrix[-2::-1]:
+            result *= raw
+            result += row
+        for gauge, (table_raw, table_pressure) in self.lookup.items():
+            result[..., gauge] = np.interp(
+                raw[..., gauge], table_raw, table_pressure)
+        return result
+
+    @classmethod
+    def load(cls, path: str = CALIBRATION_PATH):
+        """
+        Load a calibration file, falling back to the legacy fit.
+
+        Args:
+            path (str): Calibration file written by save()
+
+        Returns:
+            PressureCalibration: Loaded calibration
+        """
+        if not os.path.exists(path):
+            logging.info("No pressure calibration file, using default")
+            return cls()
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data["format_version"] > cls.FORMAT_VERSION:
+                raise ValueError(
+                    f"unsupported version {data['format_version']}")
+            gauges = data["gauges"]
+            coefficients = [gauges[str(i + 1)]["coefficients"]
+                            for i in range(len(gauges))]
+            lookup = {i: gauges[str(i + 1)]["lookup"]
+                      for i in range(len(gauges)) if "lookup" in gauges[str(i + 1)]}
+            metadata = {key: {k: v for k, v in gauge.items()
+                              if k not in ("coefficients", "lookup")}
+                        for key, gauge in gauges.items()}
+            logging.info(f"Loaded pressure calibration from {path}")
+            return cls(coefficients, metadata, lookup)
+        except (OSError, KeyError, ValueError) as e:
+            logging.error(f"Invalid pressure calibration file, using default: {e}")
+            return cls()
+
+    def save(self, path: str = CALIBRATION_PATH):
+        """
+        Write the calibration to a versioned JSON file.
+
+        Args:
+            path (str): File to write
+        """
+        gauges = {}
+        for i, c in enumerate(self.coefficients):
+            gauges[str(i + 1)] = {"coefficients": c,
+                                  **self.metadata.get(str(i + 1), {})}
+            if i in self.lookup:
+                gauges[str(i + 1)]["lookup"] = [
+                    values.tolist() for values in self.lookup[i]]
+        data = {
+            "format_version": self.FORMAT_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "gauges": gauges,
+        }
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, "w") as f:
+            json.dump(data, f, indent=4)
+
+
+def read_capture(path: str):
+    """
+    Read the raw gauge counts of a capture.
+
+    CSV captures must hold raw counts in columns named "Pressure1" etc.
+    CSV files saved by the GUI hold calibrated pressures and are rejected,
+    record a binary (.bin) file for calibration instead.
+
+    Args:
+        path (str): CSV capture or binary recording
+
+    Returns:
+        np.ndarray: Raw counts, one row per reading and one column per gauge
+
+    Raises:
+        ValueError: If path is a CSV file saved by the GUI
+    """
+    if path.endswith(".bin"):
+        _, records = load_recording(path)
+        return records["raw"].astype(np.float64)
+    with open(path, "r", newline="") as f:
+        header = next(csv.reader(f))
+    if header == PressureLogger.HEADER:
+        raise ValueError(f"{path} holds calibrated pressures saved by the "
+                         f"GUI, calibrate from a binary (.bin) recording")
+    columns = [i for i, name in enumerate(header)
+               if name.strip().replace(" ", "").startswith("Pressure")]
+    return np.loadtxt(path, delimiter=",", skiprows=1, usecols=columns,
+                      ndmin=2)
+
+
+def load_captures(paths, workers: int = 8):
+    """
+    Read several captures in parallel and average each one.
+
+    Args:
+        paths: Capture files
+        workers (int): Number of files read at once
+
+    Returns:
+        np.ndarray: Mean raw counts, one row per capture
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        captures = list(pool.map(read_capture, paths))
+    return np.array([capture.mean(axis=0) for capture in captures])
+
+
+def fit_gauge(recorded, real, degree: int = 1, scale: float = 0.01):
+    """
+    Least-squares fit of pressure as a polynomial in raw counts.
+
+    Args:
+        recorded: Mean raw count of each capture
+        real: Reference pressure of each capture
+        degree (int): Polynomial degree
+        scale (float): Factor from reference units to displayed units
+
+    Returns:
+        tuple: (ascending coefficients, RMS residual in displayed units)
+    """
+    recorded = np.asarray(recorded, dtype=np.float64)
+    target = np.asarray(real, dtype=np.float64) * scale
+    design = np.vander(recorded, degree + 1, increasing=True)
+    coefficients, *_ = np.linalg.lstsq(design, target, rcond=None)
+    residual = target - design @ coefficients
+    return coefficients, float(np.sqrt(np.mean(residual ** 2)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fit per-gauge pressure calibrations from captures.")
+    parser.add_argument("captures", nargs="+",
+                        help="Capture files, or one pattern with {} and --count")
+    parser.add_argument("--count", type=int,
+                        help="Number of captures matching the {} pattern")
+    parser.add_argument("--real", type=float, nargs="+", required=True,
+                        help="Reference pressure of each capture")
+    parser.add_argument("--gauges", type=int, nargs="+", default=[1, 2, 3, 4],
+                        help="Gauges to fit, starting at 1")
+    parser.add_argument("--degree", type=int, default=1,
+                        help="Polynomial degree (1 = linear)")
+    parser.add_argument("--scale", type=float, default=0.01,
+                        help="Factor from reference units to displayed units")
+    parser.add_argument("--output", default=CALIBRATION_PATH,
+                        help="Calibration file to update")
+    args = parser.parse_args()
+
+    paths = args.captures
+    if args.count is not None:
+        paths = [paths[0].format(i) for i in range(args.count)]
+    if len(paths) != len(args.real):
+        parser.error(f"{len(paths)} captures but {len(args.real)} pressures")
+
+    start = time.perf_counter()
+    try:
+        means = load_captures(paths)
+    except ValueError as e:
+        parser.error(str(e))
+    logging.info(f"Read {len(paths)} captures in "
+                 f"{time.perf_counter() - start:.3f} s")
+
+    calibration = PressureCalibration.load(args.output)
+    real = np.asarray(args.real)
+    for gauge in args.gauges:
+        recorded = means[:, gauge - 1]
+        # Saturated readings carry no information about the pressure
+        usable = recorded < ADC_SATURATION
+        coefficients, rms = fit_gauge(
+            recorded[usable], real[usable], args.degree, args.scale)
+        calibration.set_gauge(gauge - 1, coefficients,
+                              degree=args.degree, points=int(usable.sum()),
+                              rms_residual=rms)
+        print(f"Gauge {gauge}: coefficients {coefficients.tolist()}, "
+              f"RMS residual {rms:.4g} from {usable.sum()} points")
+    calibration.save(args.output)
+    print(f"Written {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
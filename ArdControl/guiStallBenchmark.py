@@ -0,0 +1,223 @@
+"""
+File: guiStallBenchmark.py
+Description: Measures how long the GUI thread is stalled while connecting to the valve Arduino.
+
+Compares the old connect path, which waited in nested QEventLoops and slept
+for a second on the GUI thread, with the signal based path of ArduinoWorker.
+The Arduino is replaced by an instrument that sleeps for the time each
+transaction takes at 9600 baud, so no hardware is needed.
+
+Usage:
+    python guiStallBenchmark.py [--runs N]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import minimalmodbus
+from PyQt6 import QtCore, QtWidgets
+
+from arduinoController import ArduinoController
+from calibration import PressureCalibration
+from modbusTransport import ModbusTransport
+
+# Time taken by one Modbus transaction at 9600 baud (s)
+TRANSACTION_TIME = 0.03
+# Time for the Arduino to come up after the port opens (s)
+SETTLE_TIME = 0.2
+
+
+class _SlowSerial:
+    timeout = 3
+
+    def close(self):
+        pass
+
+
+class _SlowInstrument:
+    """Answers like the valve Arduino after a transaction's delay."""
+
+    def __init__(self):
+        self.serial = _SlowSerial()
+        self.coils = [0] * 8
+
+    def read_registers(self, address, count, functioncode=3):
+        time.sleep(TRANSACTION_TIME)
+        registers = [0] * 23
+        registers[4] = sum(state << i for i, state in enumerate(self.coils))
+        return registers[address:address + count]
+
+    def read_bits(self, address, count, functioncode=1):
+        time.sleep(TRANSACTION_TIME)
+        return list(self.coils[:count])
+
+    def write_bits(self, address, values):
+        time.sleep(TRANSACTION_TIME)
+        self.coils[address:address + len(values)] = values
+
+    def write_bit(self, address, value, functioncode=5):
+        time.sleep(TRANSACTION_TIME)
+
+    def write_register(self, address, value, functioncode=16):
+        # Firmware without the sample FIFO
+        time.sleep(TRANSACTION_TIME)
+        raise minimalmodbus.IllegalRequestError("Illegal data address")
+
+
+class _SlowController(ArduinoController):
+    def connect_arduino(self):
+        time.sleep(SETTLE_TIME)
+        self.arduino = _SlowInstrument()
+        self.serial_connected = True
+        return True
+
+
+class _Parent:
+    # Attributes of the main window used by ArduinoWorker
+    calibration = PressureCalibration()
+    valveCheckInterval = 20
+    valveStates = [0] * 8
+
+
+class StallMonitor(QtCore.QObject):
+    """
+    Records gaps between ticks of a fast timer on the GUI thread.
+
+    A gap longer than the interval means the event loop was not running.
+    Ticks delivered while a handler is running mean it re-entered the loop.
+    """
+
+    def __init__(self, interval: int = 1):
+        super().__init__()
+        self.interval = interval / 1000
+        self.gaps = []
+        self.reentrant_ticks = 0
+        self.in_handler = False
+        self._last = 0.0
+        self._timer = QtCore.QTimer(self)
+        self._timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self):
+        self._last = time.perf_counter()
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.gaps.append(now - self._last)
+        self._last = now
+        if self.in_handler:
+            self.reentrant_ticks += 1
+
+    @property
+    def max_stall(self) -> float:
+        """Longest time the event loop did not run (s)."""
+        return max(self.gaps, default=0.0) - self.interval
+
+
+def _worker(transport, port):
+    # Imported here so the QApplication exists before matplotlib loads
+    from SpecControlVer5 import ArduinoWorker
+    worker = ArduinoWorker(_Parent(), port=port, mode=0, verbose=False)
+    worker.controller = _SlowController(
+        port=port, verbose=False, mode=0, transport=transport)
+    return worker
+
+
+def run_blocking(transport, port, monitor):
+    """Connect as the GUI used to, waiting on the GUI thread."""
+    worker = _worker(transport, port)
+    start = time.perf_counter()
+    monitor.in_handler = True
+    worker.start()
+
+    loop = QtCore.QEventLoop()
+
+    def check_connection():
+        if worker.isConnected():
+            loop.quit()
+    connection_timer = QtCore.QTimer()
+    connection_timer.timeout.connect(check_connection)
+    connection_timer.start(100)
+    QtCore.QTimer.singleShot(5000, loop.quit)
+    loop.exec()
+    connection_timer.stop()
+
+    time.sleep(1)
+
+    loop = QtCore.QEventLoop()
+    worker.valve_states_updated.connect(loop.quit)
+    worker.get_valve_states()
+    loop.exec()
+    monitor.in_handler = False
+    connected = time.perf_counter() - start
+    worker.stop()
+    worker.wait()
+    return connected
+
+
+def run_signals(transport, port, monitor):
+    """Connect through the worker's signals without waiting."""
+    worker = _worker(transport, port)
+    loop = QtCore.QEventLoop()
+    start = time.perf_counter()
+
+    def on_connected(ok):
+        monitor.in_handler = True
+        worker.get_valve_states()
+        monitor.in_handler = False
+
+    def on_valve_states(states):
+        loop.quit()
+
+    worker.connected.connect(on_connected)
+    worker.valve_states_updated.connect(on_valve_states)
+    monitor.in_handler = True
+    worker.start()
+    monitor.in_handler = False
+    # Stands in for the application event loop, not part of any handler
+    loop.exec()
+    connected = time.perf_counter() - start
+    worker.stop()
+    worker.wait()
+    return connected
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure GUI thread stalls while connecting to the Arduino.")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QtWidgets.QApplication(sys.argv)
+    app.setApplicationName("guiStallBenchmark")
+    transport = ModbusTransport()
+    transport.start()
+
+    for name, run in (("nested event loops", run_blocking),
+                      ("signals", run_signals)):
+        stalls, reentrant, times = [], [], []
+        for i in range(args.runs):
+            monitor = StallMonitor()
+            monitor.start()
+            times.append(run(transport, f"BENCH{i}", monitor))
+            monitor.stop()
+            stalls.append(monitor.max_stall)
+            reentrant.append(monitor.reentrant_ticks)
+        print(f"{name:>20}: max stall {statistics.median(stalls) * 1000:7.1f} ms, "
+              f"re-entrant ticks {statistics.median(reentrant):5.0f}, "
+              f"valves known after {statistics.median(times) * 1000:6.0f} ms")
+
+    transport.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+File: modbusTransport.py
+Description: Transport that owns the Modbus serial ports shared by the valve and motor controllers, one scheduler thread per port.
+"""
+
+import asyncio
+import enum
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+
+# Bits on the line per byte, 8N1
+BITS_PER_BYTE = 10
+# Bytes in the longest transaction, a read of 125 registers and its request
+LONGEST_TRANSACTION = 8 + 255
+# Time a device may take to start replying (s)
+TURNAROUND = 0.05
+
+# Deadline of the request running on each scheduler thread, set while its
+# serial timeout is cut short
+_current = threading.local()
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request could not be completed before its deadline."""
+
+
+class Priority(enum.IntEnum):
+    """Request classes, most urgent first."""
+    EMERGENCY = 0   # Venting and resets
+    SEQUENCE = 1    # Valve writes from a running sequence
+    USER = 2        # Valve toggles and other user commands
+    TELEMETRY = 3   # Polling reads
+
+
+class _Request:
+    __slots__ = ("fn", "args", "kwargs", "priority", "key", "deadline",
+                 "serial", "future", "started")
+
+    def __init__(self, fn, args, kwargs, priority, key, deadline, serial):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.key = key
+        self.deadline = deadline
+        self.serial = serial
+        self.future = Future()
+        self.started = False
+
+
+class _PortScheduler(threading.Thread):
+    """
+    Thread that owns one serial port and runs its requests by priority.
+
+    Requests of equal priority run in submission order. A request submitted
+    with the key of one still waiting replaces it: the newer call is made
+    instead, at the more urgent of the two priorities, and both callers get
+    the same future.
+    """
+
+    def __init__(self, port: str):
+        super().__init__(name=f"Modbus-{port}", daemon=True)
+        self.port = port
+        self._heap = []
+        self._waiting = {}  # key -> request not yet started
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._closing = False
+        # Requests merged into one already waiting
+        self.coalesced = 0
+
+    def submit(self, request: _Request) -> Future:
+        with self._condition:
+            if self._closing:
+                raise RuntimeError(f"{self.port} is closed")
+            waiting = self._waiting.get(request.key)
+            if request.key is not None and waiting is not None:
+                waiting.fn = request.fn
+                waiting.args = request.args
+                waiting.kwargs = request.kwargs
+                waiting.deadline = request.deadline
+                waiting.serial = request.serial
+                self.coalesced += 1
+                if request.priority < waiting.priority:
+                    # Requeue at the new priority, the old entry is skipped
+                    waiting.priority = request.priority
+                    heapq.heappush(self._heap, (
+                        waiting.priority, next(self._order), waiting))
+                return waiting.future
+            if request.key is not None:
+                self._waiting[request.key] = request
+            heapq.heappush(self._heap, (
+                request.priority, next(self._order), request))
+            self._condition.notify()
+            return request.future
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._heap and not self._closing:
+                    self._condition.wait()
+                if not self._heap:
+                    return  # Closing and every request has run
+                request = heapq.heappop(self._heap)[2]
+                if request.started:
+                    continue  # Entry left behind by a priority change
+                request.started = True
+                if request.key is not None:
+                    del self._waiting[request.key]
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = _run(request)
+            except BaseException as e:
+                request.future.set_exception(e)
+            else:
+                request.future.set_result(result)
+
+    def close(self):
+        """Run the requests already queued, then stop."""
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+
+
+def transaction_time(serial) -> float:
+    """Time the longest Modbus transaction takes on a serial port (s)."""
+    return LONGEST_TRANSACTION * BITS_PER_BYTE / serial.baudrate + TURNAROUND
+
+
+def deadline_cut() -> bool:
+    """
+    True if the running request's serial timeout was cut short by its
+    deadline, and the deadline has passed.
+
+    A transaction that fails then may have been cut off by the deadline,
+    so controllers raise DeadlineExceeded rather than treating the device
+    as lost.
+    """
+    deadline = getattr(_current, "deadline", None)
+    return deadline is not None and time.perf_counter() >= deadline
+
+
+def _run(request: _Request):
+    fn, args, kwargs = request.fn, request.args, request.kwargs
+    deadline, serial = request.deadline, request.serial
+    if deadline is None:
+        return fn(*args, **kwargs)
+    remaining = deadline - time.perf_counter()
+    if remaining <= 0:
+        name = getattr(fn, "__name__", "Request")
+        raise DeadlineExceeded(f"{name} missed its deadline")
+    if serial is None:
+        return fn(*args, **kwargs)
+    timeout = serial.timeout
+    # Never less than a whole transaction, or a healthy reply is cut off
+    cut = max(remaining, transaction_time(serial))
+    if timeout and cut >= timeout:
+        return fn(*args, **kwargs)
+    try:
+        serial.timeout = cut
+    except OSError:
+        # The port has gone, fn fails and reports it
+        return fn(*args, **kwargs)
+    _current.deadline = deadline
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _current.deadline = None
+        try:
+            serial.timeout = timeout
+            if time.perf_counter() >= deadline:
+                # A read cut short leaves the rest of its reply on the line
+                serial.reset_input_buffer()
+        except OSError:
+            pass
+
+
+class ModbusTransport:
+    """
+    Runs the Modbus requests of every serial port, shared by the controllers.
+
+    Each port is owned by its own scheduler thread, so requests to one port
+    run one at a time and back to back while requests to different ports
+    overlap. The blocking minimalmodbus calls never run on the caller's
+    thread. Waiting requests are taken most urgent first (see Priority), and
+    a request with the key of one still waiting replaces it, so a burst of
+    identical reads or superseded writes costs a single transaction.
+
+    Requests can carry a deadline. A request still waiting when its deadline
+    passes is dropped without being sent, and a running request has its
+    serial timeout cut to the time left, though never below the time the
+    longest transaction takes, so a dead device can only hold a port until
+    about the deadline rather than for the full serial timeout. A
+    transaction that fails after its timeout was cut is reported by the
+    controllers as DeadlineExceeded (see deadline_cut()), not as a lost
+    device, and the input buffer is flushed of any partial reply.
+
+    Qt code uses submit(), which returns a concurrent.futures.Future, while
+    coroutines await call(). Every request runs on the scheduler thread of
+    its port, never on an event loop. The asyncio loop only exists for
+    coroutines started with run_coroutine(), such as port discovery, which
+    await many ports at once. It is started on its own thread the first
+    time it is needed.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self._thread = None
+        self._ports = {}
+        self._lock = threading.Lock()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """
+        Start the event loop thread, if it is not already running.
+
+        Returns:
+            asyncio.AbstractEventLoop: The running loop
+        """
+        with self._lock:
+            loop, thread = self.loop, self._thread
+            if loop is None or thread is None or not thread.is_alive():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="ModbusTransport",
+                    daemon=True)
+                thread.start()
+                self.loop, self._thread = loop, thread
+            return loop
+
+    def close(self, timeout: float = 5.0):
+        """
+        Finish queued requests, then stop every port and the event loop.
+
+        Args:
+            timeout (float): Longest time to wait for queued requests (s)
+        """
+        with self._lock:
+            ports, self._ports = self._ports, {}
+        for scheduler in ports.values():
+            scheduler.close()
+        end = time.monotonic() + timeout
+        for scheduler in ports.values():
+            scheduler.join(max(end - time.monotonic(), 0))
+        with self._lock:
+            loop, thread = self.loop, self._thread
+            self.loop, self._thread = None, None
+        if loop is not None and thread is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+
+    def release(self, port: str):
+        """
+        Stop the thread of one port once its queued requests have run.
+
+        A later request to the port starts a new thread.
+
+        Args:
+            port (str): Serial port name, e.g. "COM3"
+        """
+        with self._lock:
+            scheduler = self._ports.pop(port, None)
+        if scheduler is not None:
+            scheduler.close()
+
+    def _scheduler(self, port: str) -> _PortScheduler:
+        with self._lock:
+            if port not in self._ports:
+                self._ports[port] = _PortScheduler(port)
+                self._ports[port].start()
+            return self._ports[port]
+
+    def submit(self, port: str, fn, *args,
+               priority: Priority = Priority.TELEMETRY, key=None,
+               deadline: float | None = None, serial=None, **kwargs):
+        """
+        Queue a blocking Modbus call from any thread without waiting for it.
+
+        Args:
+            port (str): Serial port name, e.g. "COM3"
+            fn: Callable making the Modbus request(s)
+            *args: Arguments for fn
+            priority (Priority): Urgency of the request
+            key: Requests with the same key replace each other while
+                waiting, or None to never merge
+            deadline (float): perf_counter time after which the request is
+                no longer wanted, or None to wait as long as it takes
+            serial (serial.Serial): Port whose timeout is limited by the
+                deadline
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            concurrent.futures.Future: Result of fn, or DeadlineExceeded if
+                the deadline passed before fn started or cut it short
+        """
+        request = _Request(fn, args, kwargs, priority, key, deadline, serial)
+        return self._scheduler(port).submit(request)
+
+    async def call(self, port: str, fn, *args, **kwargs):
+        """Awaitable form of submit(), taking the same arguments."""
+        return await asyncio.wrap_future(self.submit(port, fn, *args, **kwargs))
+
+    def run_coroutine(self, coroutine):
+        """
+        Run a coroutine on the transport event loop from any thread.
+
+        Returns:
+            concurrent.futures.Future: Result of the coroutine
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.start())
+
+    def coalesced(self, port: str) -> int:
+        """Number of requests to a port merged into one already waiting."""
+        return self._scheduler(port).coalesced
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> ModbusTransport:
+    """Transport shared by every controller in the process."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = ModbusTransport()
+        return _transport
+
+
+def log_failure(future, description: str):
+    """
+    Log the exception of a finished future, if it raised one.
+
+    Args:
+        future (concurrent.futures.Future): Finished request
+        description (str): What the request was doing, for the message
+    """
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logging.error(f"Error {description}: {error}")
@@ -0,0 +1,205 @@
+"""
+File: motionProfile.py
+Description: Trapezoidal motion model for predicting motor move times and planned trajectories.
+"""
+
+import math
+
+import numpy as np
+
+
+class MotionProfile:
+    """
+    Trapezoidal velocity profile of the motor.
+
+    A move accelerates at a constant rate up to the maximum velocity, cruises
+    and decelerates to a stop at the target. Short moves never reach the
+    maximum velocity and have a triangular profile instead.
+
+    Attributes:
+        max_velocity (float): Maximum velocity (steps/s)
+        acceleration (float): Acceleration and deceleration (steps/s^2)
+        steps_per_mm (float): Steps per mm of travel
+    """
+
+    # Defaults of the motor firmware, DAT_MotorControl_v1.ino: moves run at
+    # the speed register (9), set to 4000 steps/s at boot, with
+    # maxAcceleration. MotorWorker follows the speed register once connected.
+    MAX_VELOCITY = 4000
+    ACCELERATION = 23250
+    STEPS_PER_MM = 6400
+
+    def __init__(self, max_velocity: float = MAX_VELOCITY,
+                 acceleration: float = ACCELERATION,
+                 steps_per_mm: float = STEPS_PER_MM):
+        self.max_velocity = max_velocity
+        self.acceleration = acceleration
+        self.steps_per_mm = steps_per_mm
+
+    def move_time(self, distance):
+        """
+        Time to travel a distance from rest to rest.
+
+        Args:
+            distance: Distance of each move (steps), sign ignored
+
+        Returns:
+            Time of each move (s)
+        """
+        d = np.abs(np.asarray(distance, dtype=np.float64))
+        v, a = self.max_velocity, self.acceleration
+        # Distance covered while accelerating to full speed and stopping again
+        ramp = v * v / a
+        return np.where(d >= ramp, d / v + v / a, 2 * np.sqrt(d / a))
+
+    def move_time_mm(self, distance):
+        """Time to travel a distance given in mm (s)."""
+        return self.move_time(np.asarray(distance) * self.steps_per_mm)
+
+    def position(self, start, end, t):
+        """
+        Position during a move at times after it began.
+
+        Start, end and t broadcast against each other, so many moves can be
+        evaluated at once.
+
+        Args:
+            start: Start position (steps)
+            end: Target position (steps)
+            t: Times since the move began (s)
+
+        Returns:
+            np.ndarray: Position at each time (steps)
+        """
+        t = np.asarray(t, dtype=np.float64)
+        d = np.abs(np.asarray(end, dtype=np.float64) - start)
+        total = self.move_time(d)
+        a = self.acceleration
+        ramp_time = np.minimum(self.max_velocity / a, total / 2)
+        peak = a * ramp_time
+        ramp = 0.5 * a * ramp_time ** 2
+
+        travelled = np.select(
+            [t <= 0, t < ramp_time, t < total - ramp_time, t < total],
+            [0.0,
+             0.5 * a * t ** 2,
+             ramp + peak * (t - ramp_time),
+             d - 0.5 * a * (total - t) ** 2],
+            default=d)
+        return start + np.sign(end - start) * travelled
+
+    def _scalar_move(self, d: float, t: float) -> tuple[float, float]:
+        # Move time and distance travelled after t for one move, with plain
+        # floats because the sequence planner calls this once per step
+        v, a = self.max_velocity, self.acceleration
+        if d >= v * v / a:
+            total = d / v + v / a
+            ramp_time = v / a
+        else:
+            total = 2 * math.sqrt(d / a)
+            ramp_time = total / 2
+        if t >= total:
+            return total, d
+        if t < ramp_time:
+            return total, 0.5 * a * t * t
+        if t < total - ramp_time:
+            return total, 0.5 * a * ramp_time ** 2 + a * ramp_time * (t - ramp_time)
+        return total, d - 0.5 * a * (total - t) ** 2
+
+
+class MotionPlan:
+    """
+    Planned motor moves of a sequence.
+
+    Attributes:
+        durations (np.ndarray): Length of each step after any padding (ms)
+        move_times (np.ndarray): Predicted move time of each step, 0 if the
+            step does not move the motor (ms)
+        infeasible (np.ndarray): Indices of steps shorter than their move,
+            before padding
+        padded (bool): True if infeasible steps were lengthened to fit
+    """
+
+    def __init__(self, profile: MotionProfile, durations, targets,
+                 start_positions, move_times, infeasible, padded: bool):
+        self.profile = profile
+        self.durations = durations
+        self.targets = targets
+        self.start_positions = start_positions
+        self.move_times = move_times
+        self.infeasible = infeasible
+        self.padded = padded
+
+    @property
+    def feasible(self) -> bool:
+        """True if every move finishes within its step."""
+        return self.padded or len(self.infeasible) == 0
+
+    def trace(self, rate: float = 50):
+        """
+        Planned motor position against time for the whole sequence.
+
+        A move that is cut short by the next step is assumed to restart from
+        where it was stopped.
+
+        Args:
+            rate (float): Points per second
+
+        Returns:
+            tuple: (times (s), positions (mm))
+        """
+        starts = np.concatenate(([0], np.cumsum(self.durations))) / 1000
+        times = np.arange(0, starts[-1], 1 / rate)
+        step = np.searchsorted(starts, times, side="right") - 1
+        scale = self.profile.steps_per_mm
+        positions = self.profile.position(
+            self.start_positions[step] * scale, self.targets[step] * scale,
+            times - starts[step]) / scale
+        return times, positions
+
+
+def plan_motion(program, profile: MotionProfile, start_position: float = 0.0,
+                pad: bool = False) -> MotionPlan:
+    """
+    Predict the motor moves of a compiled sequence.
+
+    Args:
+        program (SequenceProgram): Compiled sequence using the motor
+        profile (MotionProfile): Motion model of the motor
+        start_position (float): Motor position when the sequence starts (mm)
+        pad (bool): Lengthen steps that are shorter than their move
+
+    Returns:
+        MotionPlan: Planned moves
+    """
+    durations = program.durations.tolist()
+    n = len(durations)
+    targets = [0.0] * n
+    start_positions = [0.0] * n
+    move_times = [0.0] * n
+    infeasible = []
+
+    scale = profile.steps_per_mm
+    position = float(start_position)
+    for i, target in enumerate(program.motor_positions.tolist()):
+        start_positions[i] = position
+        if target < 0:
+            # Negative positions leave the motor where it is
+            targets[i] = position
+            continue
+        targets[i] = target
+        distance = abs(target - position) * scale
+        move_time, _ = profile._scalar_move(distance, math.inf)
+        move_times[i] = move_time * 1000
+        if move_times[i] > durations[i]:
+            infeasible.append(i)
+            if pad:
+                durations[i] = math.ceil(move_times[i])
+        # Where the motor has got to by the end of the step
+        _, travelled = profile._scalar_move(distance, durations[i] / 1000)
+        position += math.copysign(travelled / scale, target - position)
+
+    return MotionPlan(profile, np.array(durations, dtype=np.int64),
+                      np.array(targets), np.array(start_positions),
+                      np.array(move_times), np.array(infeasible, dtype=np.int64),
+                      pad)
@@ -11,6 +11,60 @@ import csv
 import os
 import minimalmodbus
 import ctypes
+from dataclasses import dataclass, field
+
+from modbusTransport import ModbusTransport, Priority, get_transport
+
+# Register map of motor control code/DAT_MotorControl_v1
+# +--------------------------+---------+-----------------------------------------+
+# |         Coil/reg         | Address |                 Purpose                 |
+# +--------------------------+---------+-----------------------------------------+
+# | Command flag coil        | 1       | Set by host to run the command register |
+# | Calibrated coil          | 2       | Set by firmware once calibrated         |
+# | Init coil                | 3       | Set by host on connect                  |
+# | Command register         | 2       | Holding reg, command character          |
+# | ,                        | ,       | 'X' written together with the target    |
+# | ,                        | ,       | (FC16, regs 2-4) moves without the flag |
+# | Target registers         | 3-4     | Holding regs, target position in steps, |
+# | ,                        | ,       | high word first                         |
+# | Position registers       | 5-6     | Holding regs, current position in steps |
+# | Top position registers   | 7-8     | Holding regs, calibrated top position   |
+# | Speed register           | 9       | Holding reg, velocity of moves (steps/s)|
+# | Status flags register    | 10      | Holding reg, bit0 calibrated, bit1 busy,|
+# | ,                        | ,       | bit2 top limit, bit3 bottom limit       |
+# | Move sequence register   | 11      | Holding reg, incremented by firmware    |
+# | ,                        | ,       | each time a move command is accepted    |
+# +--------------------------+---------+-----------------------------------------+
+
+
+@dataclass
+class MotorStatus:
+    """
+    State of the motor Arduino captured in a single Modbus transaction.
+
+    Attributes:
+        position (int): Current position (steps)
+        target (int): Target of the last move (steps)
+        top_position (int): Calibrated top position (steps)
+        calibrated (bool): Calibration has finished
+        busy (bool): Motor is moving or calibrating
+        top_limit (bool): Top limit reached
+        bottom_limit (bool): Bottom limit reached
+        move_sequence (int): Number of move commands accepted, modulo 2**16
+        speed (int): Velocity of position moves (steps/s)
+        host_time_ns (int): Host monotonic time the status was received
+    """
+    position: int
+    target: int
+    top_position: int
+    calibrated: bool
+    busy: bool
+    top_limit: bool = False
+    bottom_limit: bool = False
+    move_sequence: int = 0
+    speed: int = 0
+    host_time_ns: int = field(default_factory=time.monotonic_ns)
+
 
 class MotorController:
     """
@@ -27,6 +81,10 @@ class MotorController:
     BAUD_RATE = 9600
     DEFAULT_TIMEOUT = 3
     STEPS_PER_MM = 25600  # microsteps per millimeter
+    STATUS_ADDRESS = 3  # Holding registers 3-11, see table above
+    STATUS_LENGTH = 9
+    COMMAND_ADDRESS = 2
+    MOVE_ACK_TIMEOUT = 1.0  # seconds
     
     # Modbus commands
     COMMANDS = {
@@ -41,18 +99,34 @@ class MotorController:
         "CALIBRATE": 'c',    # Calibrate
     }
 
-    def __init__(self, port: int):
+    def __init__(self, port: int | str,
+                 transport: ModbusTransport | None = None):
         """
         Initialize motor controller.
         
         Args:
-            port (int): COM port number for serial connection
+            port (int | str): COM port number, or port name such as
+                "/dev/ttyACM0"
+            transport (ModbusTransport): Owner of the serial port, defaults
+                to the shared transport
         """
         self.port = port
+        self.port_name = port if isinstance(port, str) else f"COM{port}"
+        self.transport = transport or get_transport()
         self.serial_connected = False
         self.motor_position = 0
         self.target_position = 0
         self.instrument = None
+        self.status = None
+        # Cleared if the firmware predates the status registers
+        self.status_supported = True
+        # Move sequence number expected back from the firmware, and when
+        # the move was sent (perf_counter s)
+        self.pending_move = None
+        self.move_sent_time = 0.0
+        # Target of the last move sent (steps), resumed after a reconnect.
+        # Cleared by any other motion command.
+        self.last_target = None
         
         # Thread management
         self.shutdown_flag = False
@@ -77,7 +151,7 @@ class MotorController:
             bool: True if connection successful, False otherwise
         """
         try:
-            self.instrument = minimalmodbus.Instrument(f"COM{self.port}", 11)
+            self.instrument = minimalmodbus.Instrument(self.port_name, 11)
             self.instrument.serial.baudrate = self.BAUD_RATE    # type: ignore
             self.instrument.serial.timeout = self.DEFAULT_TIMEOUT   # type: ignore
             time.sleep(2)  # Wait for connection establishment
@@ -85,7 +159,7 @@ class MotorController:
             # Initialize Arduino
             self.instrument.write_bit(3, 1)  # Toggle init flag
             self.serial_connected = True
-            logging.info(f"Connected to Arduino on port {self.port}")
+            logging.info(f"Connected to Arduino on {self.port_name}")
             
             # Verify initialization
             if self.instrument.read_bit(3, 1):  # Read init flag
@@ -96,9 +170,82 @@ class MotorController:
                 return False
                 
         except Exception as e:
-            logging.error(f"Failed to connect to Arduino on port {self.port}: {e}")
+            logging.error(f"Failed to connect to Arduino on {self.port_name}: {e}")
+            self.serial_connected = False
+            return False
+
+    def reconnect(self) -> bool:
+        """
+        Reopen the port after a failure and resume an unfinished move.
+
+        The motor keeps its calibration only if the Arduino did not reset.
+        Otherwise the move cannot be resumed and calibration is needed.
+
+        Returns:
+            bool: True if the motor is connected
+        """
+        if self.instrument is not None:
+            try:
+                self.instrument.serial.close()  # type: ignore
+            except Exception:
+                pass
+        self.status = None
+        self.pending_move = None
+        if not self._connect_arduino():
+            self.instrument = None
             self.serial_connected = False
             return False
+        status = self.get_status()
+        if status is None:
+            return False
+        # A reset Arduino has forgotten the target of the last move
+        if self.last_target is not None and status.target != self.last_target:
+            if status.calibrated:
+                logging.info(f"Resuming move to {self.last_target}")
+                self.move_to_position(self.last_target)
+            else:
+                logging.warning(
+                    "Motor lost its calibration while disconnected, "
+                    "recalibrate before moving")
+        return self.serial_connected
+
+    def probe(self) -> bool:
+        """
+        Check the motor Arduino still answers, without reopening the port.
+
+        Returns:
+            bool: True if it answered, serial_connected is then set again
+        """
+        if self.instrument is None:
+            return False
+        try:
+            self.instrument.read_bit(3, 1)  # type: ignore
+            self.serial_connected = True
+            return True
+        except Exception as e:
+            logging.warning(f"Motor Arduino did not answer: {e}")
+            return False
+
+    def submit(self, fn, *args, priority: Priority = Priority.TELEMETRY,
+               key=None, deadline: float | None = None):
+        """
+        Run a controller method on the thread that owns the serial port.
+
+        Args:
+            fn: Controller method, e.g. self.get_status
+            *args: Arguments for fn
+            priority (Priority): Urgency of the request
+            key: Requests with the same key replace each other while waiting
+            deadline (float): perf_counter time after which the request is
+                dropped, or None to always send it
+
+        Returns:
+            concurrent.futures.Future: Result of fn
+        """
+        serial_port = self.instrument.serial if self.instrument else None
+        return self.transport.submit(self.port_name, fn, *args,
+                                     priority=priority, key=key,
+                                     deadline=deadline, serial=serial_port)
 
     def get_current_position(self):
         """
@@ -116,8 +263,85 @@ class MotorController:
             self.serial_connected = False
         return self.motor_position
 
+    def get_status(self):
+        """
+        Read position, target, top position and status flags at once.
+
+        Falls back to separate reads if the firmware has no status registers.
+
+        Returns:
+            MotorStatus: Latest status, or None if the read failed
+        """
+        if not self.status_supported:
+            return self._get_legacy_status()
+        try:
+            registers = self.instrument.read_registers(    # type: ignore
+                self.STATUS_ADDRESS, self.STATUS_LENGTH, 3)
+            self.status = self._unpack_status(registers)
+            self.motor_position = self.status.position
+            self.serial_connected = True
+            self._check_move_ack(self.status)
+            return self.status
+        except minimalmodbus.IllegalRequestError:
+            logging.info(
+                "Firmware has no motor status registers, using separate reads")
+            self.status_supported = False
+            return self._get_legacy_status()
+        except Exception as e:
+            logging.error(f"Couldn't read motor status: {e}")
+            self.serial_connected = False
+            return None
+
+    def _get_legacy_status(self):
+        try:
+            registers = self.instrument.read_registers(3, 7, 3)  # type: ignore
+            calibrated = self.instrument.read_bit(2, 1)  # type: ignore
+            target = self._assemble(registers[0], registers[1])
+            position = self._assemble(registers[2], registers[3])
+            self.status = MotorStatus(
+                position=position,
+                target=target,
+                top_position=self._assemble(registers[4], registers[5]),
+                calibrated=bool(calibrated),
+                speed=registers[6],
+                # Best guess without the busy flag
+                busy=position != target)
+            self.motor_position = position
+            self.serial_connected = True
+            return self.status
+        except Exception as e:
+            logging.error(f"Couldn't read motor status: {e}")
+            self.serial_connected = False
+            return None
+
+    def _check_move_ack(self, status: MotorStatus):
+        if self.pending_move is None:
+            return
+        elapsed = time.perf_counter() - self.move_sent_time
+        if status.move_sequence == self.pending_move:
+            logging.debug(f"Move acknowledged after {elapsed * 1000:.0f} ms")
+            self.pending_move = None
+        elif elapsed > self.MOVE_ACK_TIMEOUT:
+            logging.error("Motor did not acknowledge move command")
+            self.pending_move = None
+
+    @classmethod
+    def _unpack_status(cls, registers):
+        flags = registers[7]
+        return MotorStatus(
+            target=cls._assemble(registers[0], registers[1]),
+            position=cls._assemble(registers[2], registers[3]),
+            top_position=cls._assemble(registers[4], registers[5]),
+            calibrated=bool(flags & 0x01),
+            busy=bool(flags & 0x02),
+            top_limit=bool(flags & 0x04),
+            bottom_limit=bool(flags & 0x08),
+            move_sequence=registers[8],
+            speed=registers[6])
+
     def calibrate(self):
         """Initiate motor calibration sequence."""
+        self.last_target = None
         try:
             self.instrument.write_register(2, ord('c'))  # Write calibrate command
             time.sleep(1)
@@ -144,29 +368,51 @@ class MotorController:
             self.serial_connected = False
             return False
 
-    def move_to_position(self, position: int):
+    def move_to_position(self, position: int) -> bool:
         """
         Move motor to specified position.
-        
+
+        The command and target are written in one write-multiple-registers
+        request. The firmware acknowledges the move by incrementing the move
+        sequence register, which get_status() checks. Firmware without the
+        status registers also needs the command flag coil set.
+
         Args:
             position (int): Target position in steps
+
+        Returns:
+            bool: True if the move was sent
         """
         try:
-            if self.check_calibrated():
-                high, low = self._disassemble(position)
-                self.instrument.write_register(3, high)  # Write high word
-                self.instrument.write_register(4, low)   # Write low word
-                self.instrument.write_register(2, ord('x'))  # Write move command
-                self.instrument.write_bit(1, 1)  # Toggle command flag
-                self.serial_connected = True
-            else:
+            # Use the last polled status rather than a fresh read
+            if self.status is None and self.get_status() is None:
+                return False
+            if not self.status.calibrated:    # type: ignore
                 logging.error("Motor not calibrated")
+                return False
+
+            high, low = self._disassemble(position)
+            self.last_target = position
+            if self.status_supported:
+                self.instrument.write_registers(    # type: ignore
+                    self.COMMAND_ADDRESS, [ord('X'), high, low])
+                self.pending_move = (
+                    self.status.move_sequence + 1) & 0xFFFF    # type: ignore
+                self.move_sent_time = time.perf_counter()
+            else:
+                self.instrument.write_registers(    # type: ignore
+                    self.COMMAND_ADDRESS, [ord('x'), high, low])
+                self.instrument.write_bit(1, 1)  # Toggle command flag
+            self.serial_connected = True
+            return True
         except Exception as e:
             logging.error(f"Couldn't move to position: {e}")
             self.serial_connected = False
+            return False
 
     def stop_motor(self):
         """Stop motor movement immediately."""
+        self.last_target = None
         try:
             self.instrument.write_register(2, ord('s'))
             self.instrument.write_bit(1, 1)
@@ -177,6 +423,7 @@ class MotorController:
 
     def shutdown(self):
         """Safely shutdown motor controller."""
+        self.last_target = None
         try:
             if hasattr(self, 'instrument') and self.instrument:
                 self.instrument.write_register(2, ord('s'))
@@ -220,6 +467,7 @@ class MotorController:
 
     def ascent(self):
         """Move motor upward."""
+        self.last_target = None
         try:
             self.instrument.write_register(2, ord('u'))
             self.instrument.write_bit(1, 1)
@@ -230,6 +478,7 @@ class MotorController:
 
     def to_top(self):
         """Move motor to top position."""
+        self.last_target = None
         try:
             self.instrument.write_register(2, ord('t'))
             self.instrument.write_bit(1, 1)
@@ -0,0 +1,341 @@
+"""
+File: perfBenchmark.py
+Description: Throughput benchmarks of acquisition, plotting, logging and sequence parsing, with a regression gate.
+
+Every benchmark reports a throughput, higher is better:
+    sequence_*   steps compiled per second, as load_sequence parses a
+                 sequence of 10, 1k and 100k steps
+    plot_update  samples per second through RealTimePlot, one update_plot
+                 and one redraw of a full 50 s window per sample
+    csv_write    rows per second written by PressureLogger, from the first
+    binary_write log() to the file being synced and closed, and the same
+                 for BinaryPressureLogger
+    end_to_end   samples per second reaching the ring buffer through
+                 ArduinoWorker, from a simulated valve Arduino on a
+                 pseudo-terminal at 9600 baud
+
+The best of several runs is kept, being the least disturbed by other load.
+Results can be saved as the baseline, and --check exits with status 1 if
+any throughput has dropped below the baseline by more than the tolerance.
+Baselines depend on the machine, so save them on the machine that checks.
+
+Usage:
+    python perfBenchmark.py [--runs N] [--only NAME ...] [--save] [--check]
+                            [--tolerance FRACTION] [--baseline PATH]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PyQt6 import QtWidgets
+
+from arduinoController import ArduinoController, ArduinoSnapshot
+from modbusTransport import ModbusTransport
+from pressureLogger import BinaryPressureLogger, PressureLogger
+from ringBuffer import RingBuffer
+from sequenceCompiler import compile_sequence
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "perfBaseline.json")
+# Fraction of the baseline throughput that may be lost before --check fails.
+# Runs on a busy PC vary by up to a third, the regressions worth catching
+# cost more than that.
+TOLERANCE = 0.4
+# Shortest time to repeat a fast benchmark for (s)
+MIN_TIME = 0.5
+
+# Valve settings of each step type, as in the GUI
+VALVE_SETTINGS = {
+    'd': [0, 0, 0, 0, 0, 2, 2, 2],
+    'n': [1, 1, 1, 1, 1, 2, 2, 2],
+    'e': [0, 0, 0, 0, 0, 2, 2, 2],
+    'b': [2, 1, 1, 1, 0, 2, 2, 2],
+    's': [2, 2, 2, 0, 0, 2, 2, 2],
+    'h': [2, 0, 0, 0, 0, 2, 2, 2]
+}
+
+# Sample period of the simulated Arduino (ms), as fast as a drain every
+# ArduinoWorker.DRAIN_INTERVAL still fits on the 9600 baud line
+END_TO_END_PERIOD = 25
+# Time samples are counted for once acquisition is running (s)
+END_TO_END_TIME = 5.0
+
+
+def _repeat(fn, items: int, min_time: float = MIN_TIME) -> float:
+    """Call fn until min_time has passed, returning items per second."""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return calls * items / elapsed
+
+
+def _snapshots(count: int) -> list[ArduinoSnapshot]:
+    """Readings as the controller produces them, slowly varying with noise."""
+    rng = np.random.default_rng(0)
+    phase = np.arange(count)[:, None] / 200 + np.arange(4)
+    raw = np.rint(550 + 300 * np.sin(phase)
+                  + rng.normal(0, 1.5, (count, 4))).astype(np.int64)
+    mbar = (raw - 203.53) / 0.8248 / 100
+    start = time.monotonic_ns()
+    return [ArduinoSnapshot(pressures=raw[i].tolist(),
+                            valve_states=[1, 1, 0, 0, 0, 0, 0, 0],
+                            host_time_ns=start + i * 50_000_000,
+                            mbar=mbar[i])
+            for i in range(count)]
+
+
+def sequence_benchmark(steps: int):
+    """Benchmark compiling a sequence of the given number of steps."""
+    pattern = ["d100", "n2000", "e500", "b5000", "s100", "h1500"]
+    sequence = "".join(pattern[i % len(pattern)] for i in range(steps))
+
+    def run():
+        return _repeat(lambda: compile_sequence(sequence, VALVE_SETTINGS),
+                       steps)
+    return run
+
+
+class _RadioButton:
+    def isChecked(self):
+        return True
+
+
+class _Parent:
+    # Attributes of the main window used by RealTimePlot and ArduinoWorker
+    saving = False
+    vent_flag = False
+    current_step_index = -1
+    valveCheckInterval = 100
+    valveStates = [0] * 8
+    pressure1RadioButton = _RadioButton()
+    pressure2RadioButton = _RadioButton()
+    pressure3RadioButton = _RadioButton()
+    pressure4RadioButton = _RadioButton()
+
+    def __init__(self):
+        from calibration import PressureCalibration
+        self.calibration = PressureCalibration()
+
+
+def plot_update(samples: int = 200) -> float:
+    """Benchmark the plot, one sample and one frame at a time."""
+    # Imported here so the QApplication exists before matplotlib loads
+    from SpecControlVer5 import RealTimePlot
+    plot = RealTimePlot(_Parent())
+    plot.redraw_timer.stop()
+    buffer = RingBuffer(sample_period=50)
+    plot.set_buffer(buffer)
+    plot.resize(800, 500)
+    plot.show()
+    # The first frame is a full draw, which caches the background
+    plot.draw()
+    QtWidgets.QApplication.processEvents()
+
+    snapshots = _snapshots(int(plot.window_seconds * 1000 / 50) + samples)
+    for snapshot in snapshots[:-samples]:
+        buffer.append(snapshot.host_time_ns, snapshot.pressures,
+                      snapshot.mbar, snapshot.valve_mask)
+    start = time.perf_counter()
+    for snapshot in snapshots[-samples:]:
+        buffer.append(snapshot.host_time_ns, snapshot.pressures,
+                      snapshot.mbar, snapshot.valve_mask)
+        plot.update_plot(snapshot)
+        plot.redraw()
+    elapsed = time.perf_counter() - start
+    plot.close()
+    return samples / elapsed
+
+
+def write_benchmark(logger_class, rows: int = 50_000):
+    """Benchmark writing rows to a recording with the given logger."""
+    def run():
+        snapshots = _snapshots(rows)
+        pressures = [snapshot.mbar.tolist()  # type: ignore
+                     for snapshot in snapshots]
+        with tempfile.TemporaryDirectory() as directory:
+            extension = ".bin" if logger_class is BinaryPressureLogger else ".csv"
+            logger = logger_class(os.path.join(directory, "bench" + extension),
+                                  queue_size=rows)
+            logger.start()
+            start = time.perf_counter()
+            for snapshot, p in zip(snapshots, pressures):
+                logger.log(snapshot, p, step=3, motor_position=12.5)
+            logger.close()
+            elapsed = time.perf_counter() - start
+        if logger.dropped:
+            raise RuntimeError(f"{logger.dropped} rows dropped")
+        return rows / elapsed
+    return run
+
+
+def _newest(buffer: RingBuffer) -> tuple[int, int]:
+    """Number and timestamp (ns) of the newest sample in buffer."""
+    count = buffer.count
+    return count, int(buffer.timestamps[(count - 1) % buffer.capacity])
+
+
+class _FastController(ArduinoController):
+    def configure_fifo(self, period: int = END_TO_END_PERIOD) -> bool:
+        return super().configure_fifo(period)
+
+
+def end_to_end(duration: float = END_TO_END_TIME) -> float:
+    """Benchmark acquisition from a simulated Arduino through ArduinoWorker."""
+    from SpecControlVer5 import ArduinoWorker
+    from simulator import ValveFirmware
+
+    firmware = ValveFirmware(seed=0)
+    firmware.start()
+    transport = ModbusTransport()
+    parent = _Parent()
+    worker = ArduinoWorker(parent, port=firmware.port, mode=0, verbose=False)
+    worker.controller = _FastController(
+        port=firmware.port, verbose=False, mode=0,
+        calibration=parent.calibration, transport=transport)
+    try:
+        worker.start_timer()
+        worker.start()
+        # Connecting waits for the Arduino to come up
+        deadline = time.perf_counter() + 10
+        while worker.buffer.count == 0:
+            if time.perf_counter() > deadline or worker.isFinished():
+                raise RuntimeError("No samples from the simulated Arduino")
+            time.sleep(0.01)
+        first, first_time = _newest(worker.buffer)
+        time.sleep(duration)
+        last, last_time = _newest(worker.buffer)
+    finally:
+        worker.stop()
+        worker.wait()
+        transport.close()
+        firmware.close()
+    # Timed by the samples rather than the drains they arrived in
+    return (last - first) / ((last_time - first_time) / 1e9)
+
+
+# Unit and benchmark of each entry, in the order they are run
+BENCHMARKS = {
+    "sequence_10": ("steps/s", sequence_benchmark(10)),
+    "sequence_1k": ("steps/s", sequence_benchmark(1_000)),
+    "sequence_100k": ("steps/s", sequence_benchmark(100_000)),
+    "plot_update": ("samples/s", plot_update),
+    "csv_write": ("rows/s", write_benchmark(PressureLogger)),
+    "binary_write": ("rows/s", write_benchmark(BinaryPressureLogger)),
+    "end_to_end": ("samples/s", end_to_end),
+}
+
+
+def load_baseline(path: str) -> dict:
+    """Baseline throughput of each benchmark, empty if none is saved."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path: str, results: dict):
+    """Store results as the baseline, keeping benchmarks that were not run."""
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+
+def regressions(results: dict, baseline: dict,
+                tolerance: float = TOLERANCE) -> list[str]:
+    """
+    Compare results with the baseline.
+
+    Args:
+        results (dict): Result of each benchmark, as run_benchmark returns
+        baseline (dict): Saved results, in the same form
+        tolerance (float): Fraction of the baseline throughput that may be
+            lost
+
+    Returns:
+        list[str]: Names of the benchmarks slower than allowed
+    """
+    return [name for name, result in results.items()
+            if name in baseline and result["throughput"]
+            < baseline[name]["throughput"] * (1 - tolerance)]
+
+
+def run_benchmark(name: str, runs: int = 5) -> dict:
+    """
+    Run one benchmark several times.
+
+    Args:
+        name (str): Key of the benchmark in BENCHMARKS
+        runs (int): Number of runs, the best is kept
+
+    Returns:
+        dict: Throughput and unit, as stored in the baseline
+    """
+    unit, benchmark = BENCHMARKS[name]
+    throughput = max(benchmark() for _ in range(runs))
+    return {"throughput": round(throughput, 1), "unit": unit}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput benchmarks with a regression gate.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--only", nargs="+", metavar="NAME",
+                        choices=list(BENCHMARKS),
+                        help="Benchmarks to run, default all")
+    parser.add_argument("--save", action="store_true",
+                        help="Store the results as the baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit with status 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Fraction of the baseline throughput that may "
+                        "be lost")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QtWidgets.QApplication(sys.argv)
+    app.setApplicationName("perfBenchmark")
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    for name in args.only or BENCHMARKS:
+        if name == "end_to_end" and not sys.platform.startswith("linux"):
+            print(f"{name:>14}: skipped, the simulator needs pseudo-terminals")
+            continue
+        result = run_benchmark(name, args.runs)
+        results[name] = result
+        line = f"{name:>14}: {result['throughput']:12.1f} {result['unit']:<9}"
+        if name in baseline:
+            change = result["throughput"] / baseline[name]["throughput"] - 1
+            line += f" {change:+7.1%} against baseline"
+        print(line, flush=True)
+
+    if args.save:
+        save_baseline(args.baseline, results)
+        print(f"Saved baseline to {args.baseline}")
+    if args.check:
+        slower = regressions(results, baseline, args.tolerance)
+        missing = [name for name in results if name not in baseline]
+        if missing:
+            print(f"No baseline for {', '.join(missing)}")
+        if slower:
+            print(f"Regressed by more than {args.tolerance:.0%}: "
+                  f"{', '.join(slower)}")
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
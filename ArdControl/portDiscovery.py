@@ -0,0 +1,271 @@
+"""
+File: portDiscovery.py
+Description: Finds the valve and motor Arduinos by probing every serial port for their Modbus slaves.
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass
+
+import serial
+from serial.tools import list_ports
+from PyQt6 import QtCore
+
+from modbusTransport import ModbusTransport, Priority, get_transport
+
+# Modbus slave address of each device
+ROLES = {"valve": 10, "motor": 11}
+# USB serial number to role of every device found before
+PORT_CACHE_PATH = os.path.join("C:\\ssbubble", "serial_ports.json")
+# Environment variable listing more ports to probe, separated by os.pathsep,
+# e.g. the pseudo-terminals of the simulator
+EXTRA_PORTS_ENV = "SSBUBBLE_EXTRA_PORTS"
+
+
+@dataclass
+class PortInfo:
+    """
+    Serial port that might have a device on it.
+
+    Attributes:
+        device (str): Port name, e.g. "COM7" or "/dev/ttyACM0"
+        serial_number (str): USB serial number, None if not a USB device
+        description (str): Description from the operating system
+    """
+    device: str
+    serial_number: str | None = None
+    description: str = ""
+
+
+def list_serial_ports(extra_ports=()) -> list[PortInfo]:
+    """
+    List the serial ports of this machine.
+
+    Args:
+        extra_ports: Additional port names to include, e.g. ptys of a
+            simulator, which the operating system does not list. Ports
+            named in the SSBUBBLE_EXTRA_PORTS environment variable are
+            always included.
+
+    Returns:
+        list[PortInfo]: Every port, without duplicates
+    """
+    ports = {info.device: PortInfo(info.device, info.serial_number,
+                                   info.description)
+             for info in list_ports.comports()}
+    if sys.platform.startswith("linux"):
+        # USB serial adapters the system listing can miss
+        for device in glob.glob("/dev/ttyUSB*") + glob.glob("/dev/ttyACM*"):
+            ports.setdefault(device, PortInfo(device))
+    from_env = os.environ.get(EXTRA_PORTS_ENV, "").split(os.pathsep)
+    for device in [*extra_ports, *from_env]:
+        if device:
+            ports.setdefault(device, PortInfo(device))
+    return list(ports.values())
+
+
+def _crc16(frame: bytes) -> int:
+    # Modbus RTU CRC, sent low byte first
+    crc = 0xFFFF
+    for byte in frame:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def _read_request(slave: int) -> bytes:
+    # Read one holding register at address 0
+    frame = bytes([slave, 0x03, 0, 0, 0, 1])
+    return frame + _crc16(frame).to_bytes(2, "little")
+
+
+def _answered(port: serial.Serial, slave: int) -> bool:
+    """Send a read to a slave and check for any valid reply from it."""
+    port.reset_input_buffer()
+    port.write(_read_request(slave))
+    # An exception reply is 5 bytes, a register reply 7
+    reply = port.read(5)
+    if len(reply) == 5 and reply[0] == slave and not reply[1] & 0x80:
+        reply += port.read(reply[2] + 5 - len(reply))
+    return (len(reply) >= 5 and reply[0] == slave
+            and _crc16(reply[:-2]) == int.from_bytes(reply[-2:], "little"))
+
+
+def probe_port(device: str, slaves=tuple(ROLES.values()),
+               timeout: float = 0.1, boot_timeout: float = 2.0,
+               baudrate: int = 9600) -> list[int]:
+    """
+    Find which Modbus slaves answer on a serial port.
+
+    Any reply from a slave, including a Modbus exception, counts. Opening
+    the port resets most Arduinos, so slaves are asked repeatedly until one
+    answers or boot_timeout passes. Once a device has answered, the other
+    slaves are asked once each.
+
+    Args:
+        device (str): Port to probe
+        slaves: Slave addresses to look for
+        timeout (float): Time to wait for each reply (s)
+        boot_timeout (float): Time to keep asking before giving up (s)
+        baudrate (int): Baud rate of the devices
+
+    Returns:
+        list[int]: Slaves that answered
+    """
+    try:
+        port = serial.Serial(device, baudrate=baudrate, timeout=timeout)
+    except (serial.SerialException, OSError) as e:
+        logging.debug(f"Cannot open {device}: {e}")
+        return []
+    found = []
+    try:
+        deadline = time.monotonic() + boot_timeout
+        waiting = list(slaves)
+        while waiting and not found and time.monotonic() < deadline:
+            for slave in list(waiting):
+                if _answered(port, slave):
+                    found.append(slave)
+                    waiting.remove(slave)
+                    break
+        for slave in waiting if found else ():
+            if _answered(port, slave):
+                found.append(slave)
+    except (serial.SerialException, OSError) as e:
+        logging.debug(f"Error probing {device}: {e}")
+    finally:
+        port.close()
+    return found
+
+
+class PortDiscovery(QtCore.QObject):
+    """
+    Finds the serial port of each device.
+
+    Ports whose USB serial number was seen before are assigned straight from
+    the cache, so a known setup is found without opening any port. The rest
+    are probed concurrently, each on its own transport thread, and newly
+    found devices are added to the cache. The threads of ports without a
+    device are stopped afterwards.
+
+    Signals:
+        ports_found(dict): Port name of each role found, from start()
+    """
+
+    ports_found = QtCore.pyqtSignal(dict)
+
+    def __init__(self, transport: ModbusTransport | None = None,
+                 cache_path: str = PORT_CACHE_PATH, timeout: float = 0.1,
+                 boot_timeout: float = 2.0, parent=None):
+        """
+        Initialize the discovery service.
+
+        Args:
+            transport (ModbusTransport): Runs the probes, defaults to the
+                shared transport
+            cache_path (str): File caching the role of each serial number
+            timeout (float): Time to wait for each probe reply (s)
+            boot_timeout (float): Time to wait for a device to boot (s)
+            parent (QObject): Parent object
+        """
+        super().__init__(parent)
+        self.transport = transport or get_transport()
+        self.cache_path = cache_path
+        self.timeout = timeout
+        self.boot_timeout = boot_timeout
+        self.cache = self._load_cache()
+
+    def _load_cache(self) -> dict:
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.error(f"Invalid serial port cache, ignoring it: {e}")
+            return {}
+
+    def _save_cache(self):
+        try:
+            directory = os.path.dirname(self.cache_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(self.cache_path, "w") as f:
+                json.dump(self.cache, f, indent=4)
+        except OSError as e:
+            logging.error(f"Could not save serial port cache: {e}")
+
+    def start(self, extra_ports=(), refresh: bool = False):
+        """
+        Discover the devices without waiting, emitting ports_found.
+
+        Returns:
+            concurrent.futures.Future: Port name of each role found
+        """
+        future = self.transport.run_coroutine(
+            self.discover_async(extra_ports, refresh))
+        future.add_done_callback(
+            lambda f: self.ports_found.emit(
+                {} if f.exception() else f.result()))
+        return future
+
+    def discover(self, extra_ports=(), refresh: bool = False) -> dict:
+        """Blocking form of start(), taking the same arguments."""
+        return self.transport.run_coroutine(
+            self.discover_async(extra_ports, refresh)).result()
+
+    async def discover_async(self, extra_ports=(),
+                             refresh: bool = False) -> dict:
+        """
+        Find the port of each device.
+
+        Args:
+            extra_ports: Port names to probe as well as the listed ports
+            refresh (bool): Probe every port, ignoring the cache
+
+        Returns:
+            dict: Port name of each role found, e.g. {"valve": "COM7"}
+        """
+        start = time.perf_counter()
+        ports = list_serial_ports(extra_ports)
+        found = {}
+        if not refresh:
+            for port in ports:
+                role = self.cache.get(port.serial_number or "")
+                if role in ROLES and role not in found:
+                    found[role] = port.device
+        unprobed = [port for port in ports
+                    if port.device not in found.values()]
+        if len(found) < len(ROLES) and unprobed:
+            results = await asyncio.gather(*(
+                self.transport.call(
+                    port.device, probe_port, port.device,
+                    timeout=self.timeout, boot_timeout=self.boot_timeout,
+                    priority=Priority.USER)
+                for port in unprobed), return_exceptions=True)
+            updated = False
+            for port, slaves in zip(unprobed, results):
+                if isinstance(slaves, BaseException):
+                    continue
+                for role, slave in ROLES.items():
+                    if slave in slaves and role not in found:
+                        found[role] = port.device
+                        if port.serial_number:
+                            self.cache[port.serial_number] = role
+                            updated = True
+            if updated:
+                self._save_cache()
+            # Only the ports of devices found are used, the rest keep no thread
+            for port in unprobed:
+                if port.device not in found.values():
+                    self.transport.release(port.device)
+        summary = ", ".join(f"{role} on {device}"
+                            for role, device in found.items())
+        logging.info(f"Found {summary or 'no devices'} in "
+                     f"{(time.perf_counter() - start) * 1000:.0f} ms")
+        return found
@@ -0,0 +1,299 @@
+"""
+File: pressureLogger.py
+Description: Writes pressure readings to disk from a background thread.
+
+Recordings can be plain CSV or a chunked binary format holding typed columns:
+
+    magic (8 bytes) | header length (uint32 LE) | JSON header | records...
+
+Records are fixed-size rows of RECORD_DTYPE appended in chunks, so a
+recording is loaded with a single np.frombuffer call.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+from typing import IO
+
+import numpy as np
+
+
+class PressureLogger(threading.Thread):
+    """
+    Buffered CSV writer for pressure readings.
+
+    Rows are handed over through a bounded queue and written in batches by a
+    dedicated thread, so a slow disk or network share never stalls the caller.
+    If the queue fills up, new rows are dropped and counted rather than
+    blocking. A reading taken after the connection was lost and restored
+    is preceded by a row with empty pressures, marking the gap.
+
+    Attributes:
+        path (str): CSV file being written
+        written (int): Number of rows written to the file
+        dropped (int): Number of rows discarded because the queue was full
+    """
+
+    HEADER = ["Time", "Pressure 1", "Pressure 2", "Pressure 3", "Pressure 4"]
+    # Seconds between reports of a backlog or of dropped rows while saving
+    REPORT_INTERVAL = 30.0
+
+    def __init__(self, path: str, queue_size: int = 10000,
+                 batch_size: int = 500, fsync_interval: float = 5.0):
+        """
+        Open the file and write the header.
+
+        Args:
+            path (str): CSV file to create
+            queue_size (int): Maximum number of rows waiting to be written
+            batch_size (int): Maximum number of rows written per batch
+            fsync_interval (float): Seconds between forced syncs to disk
+
+        Raises:
+            OSError: If the file cannot be created
+        """
+        super().__init__(daemon=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.written = 0
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = self._open()
+
+    def _open(self) -> IO:
+        f = open(self.path, "w", newline="")
+        csv.writer(f).writerow(self.HEADER)
+        return f
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of rows waiting to be written."""
+        return self._queue.qsize()
+
+    def log(self, snapshot, pressures, step: int = -1,
+            motor_position: float = 0.0) -> bool:
+        """
+        Queue a row without blocking.
+
+        Args:
+            snapshot (ArduinoSnapshot): Reading from the Arduino
+            pressures: Converted pressure of each gauge
+            step (int): Index of the running sequence step, -1 if none
+            motor_position (float): Motor position (mm)
+
+        Returns:
+            bool: False if the row was dropped because the queue was full
+        """
+        try:
+            self._queue.put_nowait(
+                (time.time(), snapshot, pressures, step, motor_position))
+            return True
+        except queue.Full:
+            if self.dropped == 0:
+                logging.warning(f"Save queue full with {self.queue_depth} "
+                                f"readings, dropping pressure readings")
+            self.dropped += 1
+            return False
+
+    def _report(self, reported: int) -> int:
+        """Log the backlog and any rows dropped since the last report."""
+        depth = self.queue_depth
+        if self.dropped > reported:
+            logging.warning(f"{self.dropped} readings dropped so far, "
+                            f"{depth} waiting to be written")
+        elif depth > self._queue.maxsize // 2:
+            logging.warning(f"Save file falling behind, {depth} readings "
+                            f"waiting to be written")
+        return self.dropped
+
+    def run(self):
+        last_sync = time.monotonic()
+        last_report = last_sync
+        reported = 0
+        unsynced = False
+        running = True
+        while running:
+            try:
+                batch = [self._queue.get(timeout=self.fsync_interval)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # None is queued by close() after the last row
+            if None in batch:
+                running = False
+                batch = [row for row in batch if row is not None]
+
+            try:
+                if batch:
+                    self._write_batch(batch)
+                    self.written += len(batch)
+                    unsynced = True
+                if unsynced and (not running or time.monotonic() - last_sync
+                                 >= self.fsync_interval):
+                    self._sync()
+                    last_sync = time.monotonic()
+                    unsynced = False
+            except OSError as e:
+                logging.error(f"Could not write to save file: {e}")
+                self.dropped += len(batch)
+            if running and time.monotonic() - last_report >= self.REPORT_INTERVAL:
+                reported = self._report(reported)
+                last_report = time.monotonic()
+        self._file.close()
+
+    def _write_batch(self, batch):
+        rows = []
+        for wall_time, snapshot, p, _, _ in batch:
+            stamp = time.strftime('%H:%M:%S', time.localtime(wall_time))
+            if snapshot.gap_before:
+                rows.append(f"{stamp}, , , , \n")
+            rows.append(f"{stamp}, {p[0]}, {p[1]}, {p[2]}, {p[3]}\n")
+        self._file.write("".join(rows))
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Write out every queued row, sync and close the file."""
+        if self.is_alive():
+            self._queue.put(None)
+            self.join()
+        elif not self._file.closed:
+            self._file.close()
+        logging.info(f"Saved {self.written} readings to {self.path}")
+        if self.dropped:
+            logging.warning(f"{self.dropped} readings could not be saved")
+
+
+class BinaryPressureLogger(PressureLogger):
+    """
+    Chunked binary recorder for pressure, valve, sequence and motor data.
+
+    Stores monotonic nanosecond timestamps, raw gauge counts, converted
+    pressures, the valve coil bitmask, the running sequence step and the motor
+    position as typed columns. Each batch is appended as one chunk. The
+    first reading after a lost connection has FLAG_GAP set.
+    """
+
+    MAGIC = b"SSBREC01"
+    VERSION = 2
+    FLAG_GAP = 0x01
+    RECORD_DTYPE = np.dtype([
+        ("time_ns", "<i8"),         # Host monotonic time of the reading
+        ("raw", "<u2", (4,)),       # Raw gauge counts
+        ("pressure", "<f8", (4,)),  # Converted pressures
+        ("valves", "u1"),           # Valve coil bitmask, bit n = valve n
+        ("step", "<i4"),            # Sequence step index, -1 if none
+        ("motor_position", "<f4"),  # Motor position (mm)
+        ("flags", "u1"),            # FLAG_GAP
+    ])
+
+    def _open(self) -> IO:
+        f = open(self.path, "wb")
+        header = json.dumps({
+            "version": self.VERSION,
+            "dtype": self.RECORD_DTYPE.descr,
+            # Pair of clocks to turn monotonic timestamps into wall time
+            "start_wall_ns": time.time_ns(),
+            "start_monotonic_ns": time.monotonic_ns(),
+        }).encode()
+        f.write(self.MAGIC + struct.pack("<I", len(header)) + header)
+        return f
+
+    def _write_batch(self, batch):
+        _, snapshots, pressures, steps, motor_positions = zip(*batch)
+        chunk = np.empty(len(batch), dtype=self.RECORD_DTYPE)
+        chunk["time_ns"] = [snapshot.host_time_ns for snapshot in snapshots]
+        chunk["raw"] = [snapshot.pressures for snapshot in snapshots]
+        chunk["pressure"] = pressures
+        chunk["valves"] = [snapshot.valve_mask for snapshot in snapshots]
+        chunk["step"] = steps
+        chunk["motor_position"] = motor_positions
+        chunk["flags"] = [self.FLAG_GAP if snapshot.gap_before else 0
+                          for snapshot in snapshots]
+        self._file.write(chunk.tobytes())
+
+
+def load_recording(path: str):
+    """
+    Load a binary recording.
+
+    Args:
+        path (str): Recording written by BinaryPressureLogger
+
+    Returns:
+        tuple: (header dict, structured array with one row per reading)
+
+    Raises:
+        ValueError: If the file is not a recording
+    """
+    with open(path, "rb") as f:
+        magic = f.read(len(BinaryPressureLogger.MAGIC))
+        if magic != BinaryPressureLogger.MAGIC:
+            raise ValueError(f"{path} is not a pressure recording")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length))
+        dtype = np.dtype([tuple(column) for column in header["dtype"]])
+        data = f.read()
+    # Ignore a partly written last record left by a crash
+    usable = len(data) - len(data) % dtype.itemsize
+    return header, np.frombuffer(data[:usable], dtype=dtype)
+
+
+def export_csv(path: str, csv_path: str | None = None) -> str:
+    """
+    Export a binary recording in the CSV layout used by PressureLogger.
+
+    Times are written with millisecond resolution, and gaps in the
+    recording as rows with empty pressures.
+
+    Args:
+        path (str): Recording to export
+        csv_path (str): Output file, defaults to path with a .csv extension
+
+    Returns:
+        str: Path of the written CSV file
+    """
+    header, records = load_recording(path)
+    if csv_path is None:
+        csv_path = os.path.splitext(path)[0] + ".csv"
+    offset_ns = header["start_wall_ns"] - header["start_monotonic_ns"]
+    # Version 1 recordings have no flags column
+    if "flags" in (records.dtype.names or ()):
+        gaps = records["flags"] & BinaryPressureLogger.FLAG_GAP
+    else:
+        gaps = np.zeros(len(records), dtype=np.uint8)
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(PressureLogger.HEADER)
+        for time_ns, pressure, gap in zip(
+                records["time_ns"], records["pressure"], gaps):
+            wall_ns = int(time_ns) + offset_ns
+            stamp = time.strftime("%H:%M:%S", time.localtime(wall_ns / 1e9))
+            stamp = f"{stamp}.{wall_ns // 1_000_000 % 1000:03d}"
+            if gap:
+                writer.writerow([stamp, "", "", "", ""])
+            writer.writerow([stamp, *pressure.tolist()])
+    return csv_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export a binary pressure recording to CSV.")
+    parser.add_argument("recording", help="Binary recording to export")
+    parser.add_argument("--output", help="CSV file to write")
+    args = parser.parse_args()
+    print(f"Written {export_csv(args.recording, args.output)}")
@@ -0,0 +1,108 @@
+"""
+File: reconnectSupervisor.py
+Description: Schedules reconnect attempts to a serial device with bounded exponential backoff.
+"""
+
+import logging
+import time
+
+
+class ReconnectSupervisor:
+    """
+    Decides when to retry a lost serial connection, and for how long.
+
+    The owner reports a lost connection with lost(), checks due() before
+    each attempt, and reports the outcome with failed() or recovered(). The
+    delay between attempts doubles after each failure up to max_delay, so a
+    device that comes straight back is reconnected quickly while one that
+    is unplugged does not saturate the port. Once the device has been down
+    for longer than give_up_after, gave_up is set and the owner should
+    close the session instead. All calls must come from one thread.
+
+    Attributes:
+        name (str): Device name for log messages
+        reconnects (int): Successful reconnects
+        downtime (float): Total time spent disconnected, excluding the
+            current outage (s)
+        attempts (int): Failed attempts during the current outage
+        down_since (float): monotonic time the connection was lost, or None
+            while connected
+    """
+
+    def __init__(self, name: str, initial_delay: float = 0.5,
+                 max_delay: float = 8.0, give_up_after: float = 60.0):
+        """
+        Initialize the supervisor.
+
+        Args:
+            name (str): Device name for log messages
+            initial_delay (float): Wait before the first attempt (s)
+            max_delay (float): Longest wait between attempts (s)
+            give_up_after (float): Outage length after which attempts stop
+                (s), or None to keep trying
+        """
+        self.name = name
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.give_up_after = give_up_after
+        self.reconnects = 0
+        self.downtime = 0.0
+        self.attempts = 0
+        self.down_since = None
+        self._delay = initial_delay
+        self._next_attempt = 0.0
+
+    @property
+    def down(self) -> bool:
+        """True while the connection is lost."""
+        return self.down_since is not None
+
+    @property
+    def gave_up(self) -> bool:
+        """True once the current outage has outlasted give_up_after."""
+        return (self.down and self.give_up_after is not None
+                and self.outage() > self.give_up_after)
+
+    def outage(self) -> float:
+        """Length of the current outage (s), 0 while connected."""
+        if self.down_since is None:
+            return 0.0
+        return time.monotonic() - self.down_since
+
+    def lost(self):
+        """Record that the connection was lost, if not already known."""
+        if self.down:
+            return
+        self.down_since = time.monotonic()
+        self.attempts = 0
+        self._delay = self.initial_delay
+        self._next_attempt = self.down_since + self._delay
+        logging.warning(f"Lost connection to {self.name}, reconnecting")
+
+    def due(self) -> bool:
+        """True if a reconnect attempt should be made now."""
+        return (self.down and not self.gave_up
+                and time.monotonic() >= self._next_attempt)
+
+    def failed(self):
+        """Record a failed attempt and back off before the next."""
+        self.attempts += 1
+        self._delay = min(self._delay * 2, self.max_delay)
+        self._next_attempt = time.monotonic() + self._delay
+        if self.gave_up:
+            logging.error(
+                f"Could not reconnect to {self.name} after "
+                f"{self.attempts} attempts, giving up")
+
+    def recovered(self):
+        """Record a successful reconnect."""
+        if not self.down:
+            return
+        outage = self.outage()
+        self.downtime += outage
+        self.reconnects += 1
+        self.down_since = None
+        logging.info(
+            f"Reconnected to {self.name} after {outage:.1f} s "
+            f"({self.reconnects} reconnects, {self.downtime:.1f} s down "
+            f"in total)")
@@ -0,0 +1,114 @@
+"""
+File: ringBuffer.py
+Description: Preallocated NumPy buffer for sharing pressure samples between threads.
+"""
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-capacity circular buffer of pressure samples.
+
+    A single writer (the acquisition thread) appends samples while any number
+    of readers (plot, CSV writer, sequence engine) copy out recent samples
+    without taking a lock. The write counter is only advanced once a sample is
+    completely stored, and readers discard any rows that were overwritten while
+    they were copying, so a reader never sees a half written sample.
+
+    Attributes:
+        capacity (int): Number of samples held before the oldest is overwritten
+        count (int): Total number of samples ever written
+        sample_period (float): Nominal time between samples (ms), set by the
+            writer so readers can size their windows
+    """
+
+    def __init__(self, capacity: int = 65536, channels: int = 4,
+                 sample_period: float = 100):
+        """
+        Initialize the buffer.
+
+        Args:
+            capacity (int): Number of samples to keep
+            channels (int): Number of pressure channels per sample
+            sample_period (float): Nominal time between samples (ms)
+        """
+        self.capacity = capacity
+        self.channels = channels
+        self.count = 0
+        self.sample_period = sample_period
+
+        # Preallocated columns, indexed by sample number % capacity
+        self.timestamps = np.zeros(capacity, dtype=np.int64)  # monotonic ns
+        self.raw = np.zeros((capacity, channels), dtype=np.uint16)
+        self.pressures = np.zeros((capacity, channels), dtype=np.float64)
+        self.valve_masks = np.zeros(capacity, dtype=np.uint8)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp: int, raw, pressures, valve_mask: int):
+        """
+        Store one sample. Must only be called from the writer thread.
+
+        Args:
+            timestamp (int): Monotonic time of the sample in ns
+            raw: Raw gauge readings, one per channel
+            pressures: Calibrated pressures, one per channel
+            valve_mask (int): Valve coil states packed into a bitmask
+        """
+        i = self.count % self.capacity
+        self.timestamps[i] = timestamp
+        self.raw[i] = raw
+        self.pressures[i] = pressures
+        self.valve_masks[i] = valve_mask
+        # Publish the sample only once every column has been written
+        self.count += 1
+
+    def latest(self, n: int):
+        """
+        Copy out the most recent samples, oldest first.
+
+        Args:
+            n (int): Maximum number of samples to return
+
+        Returns:
+            tuple: (first sample number, timestamps, raw, pressures,
+                valve_masks)
+        """
+        count = self.count
+        return self.since(max(count - n, 0), count)
+
+    def since(self, start: int, end: int | None = None):
+        """
+        Copy out every sample numbered from start onwards, oldest first.
+
+        Samples that have already been overwritten are skipped, so the first
+        sample number returned may be later than start.
+
+        Args:
+            start (int): Sample number of the first sample wanted
+            end (int): Sample number to stop before, defaults to the latest
+
+        Returns:
+            tuple: (first sample number, timestamps, raw, pressures,
+                valve_masks)
+        """
+        if end is None:
+            end = self.count
+        start = max(start, end - self.capacity, 0)
+        index = np.arange(start, end) % self.capacity
+        timestamps = self.timestamps[index]
+        raw = self.raw[index]
+        pressures = self.pressures[index]
+        valve_masks = self.valve_masks[index]
+
+        # Drop any rows the writer lapped while we were copying
+        overwritten = self.count - self.capacity - start
+        if overwritten > 0:
+            start += overwritten
+            timestamps = timestamps[overwritten:]
+            raw = raw[overwritten:]
+            pressures = pressures[overwritten:]
+            valve_masks = valve_masks[overwritten:]
+        return start, timestamps, raw, pressures, valve_masks
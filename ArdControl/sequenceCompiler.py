@@ -0,0 +1,153 @@
+"""
+File: sequenceCompiler.py
+Description: Compiles Prospa sequence strings into array-backed programs.
+
+A sequence is a run of steps such as "d100e200b5000", each a step type letter
+followed by its length in ms. A capital 'M' anywhere in the sequence enables
+the motor, after which each step may carry a target position, e.g. "b500m-5".
+The 'M' is removed before the steps are read, as Prospa may place it
+anywhere, including inside a step such as "b500Mm-5".
+"""
+
+import re
+
+import numpy as np
+
+
+class SequenceError(ValueError):
+    """Raised for an invalid sequence, with the position of the problem."""
+
+    def __init__(self, message: str, position: int):
+        super().__init__(f"{message} at position {position}")
+        self.position = position
+
+
+class SequenceProgram:
+    """
+    Compiled sequence held as parallel NumPy arrays, one entry per step.
+
+    Attributes:
+        step_types (str): Step type letter for each code
+        codes (np.ndarray): Step type code of each step
+        durations (np.ndarray): Length of each step (ms)
+        motor_positions (np.ndarray): Motor target of each step
+        write_masks (np.ndarray): Valves written by each step, bit n = valve n
+        value_masks (np.ndarray): States written to those valves
+        motor_flag (bool): True if the sequence uses the motor
+    """
+
+    def __init__(self, step_types: str, codes, durations, motor_positions,
+                 write_masks, value_masks, motor_flag: bool):
+        self.step_types = step_types
+        self.codes = codes
+        self.durations = durations
+        self.motor_positions = motor_positions
+        self.write_masks = write_masks
+        self.value_masks = value_masks
+        self.motor_flag = motor_flag
+
+    @classmethod
+    def empty(cls, step_types: str = "") -> "SequenceProgram":
+        """Program with no steps, held before a sequence is loaded."""
+        return cls(step_types, np.zeros(0, dtype=np.uint8),
+                   np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                   np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint8),
+                   False)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def total_time(self) -> int:
+        """Length of the whole sequence (ms)."""
+        return int(self.durations.sum())
+
+    def step_type(self, i: int) -> str:
+        return self.step_types[self.codes[i]]
+
+    def valve_states(self, i: int) -> list[int]:
+        """Valve states of step i, with 2 for valves left unchanged."""
+        write, value = int(self.write_masks[i]), int(self.value_masks[i])
+        return [(value >> n) & 1 if (write >> n) & 1 else 2 for n in range(8)]
+
+
+def _masks(valve_states) -> tuple[int, int]:
+    write = sum(1 << n for n, state in enumerate(valve_states) if state != 2)
+    value = sum(1 << n for n, state in enumerate(valve_states) if state == 1)
+    return write, value
+
+
+def _unstripped(sequence: str, position: int) -> int:
+    # Position in sequence of a character of it with every 'M' removed
+    for i, c in enumerate(sequence):
+        if c != 'M':
+            if position == 0:
+                return i
+            position -= 1
+    return len(sequence)
+
+
+def compile_sequence(sequence: str, valve_settings: dict) -> SequenceProgram:
+    """
+    Compile a sequence string in a single tokenizer pass.
+
+    Args:
+        sequence (str): Sequence string from Prospa
+        valve_settings (dict): Valve states for each step type letter
+
+    Returns:
+        SequenceProgram: Compiled sequence
+
+    Raises:
+        SequenceError: If the sequence is empty or malformed
+    """
+    motor_flag = 'M' in sequence
+    steps = sequence.replace('M', '')
+
+    def error(message: str, position: int) -> SequenceError:
+        return SequenceError(message, _unstripped(sequence, position))
+
+    step_types = "".join(valve_settings)
+    motor = r"(?:m(?P<motor>-?\d*))?" if motor_flag else ""
+    token = re.compile(
+        rf"(?P<type>[{re.escape(step_types)}])(?P<time>\d*){motor}")
+
+    codes = []
+    durations = []
+    motor_positions = []
+    position = 0
+    for match in token.finditer(steps):
+        if match.start() != position:
+            raise error(f"Invalid step type '{steps[position]}'", position)
+        position = match.end()
+
+        if not match.group("time") or int(match.group("time")) <= 0:
+            raise error("Invalid time length", match.start("time"))
+        motor_position = 0
+        if motor_flag and match.group("motor") is not None:
+            if match.group("motor") in ("", "-"):
+                raise error("Invalid motor position", match.start("motor"))
+            motor_position = int(match.group("motor"))
+
+        codes.append(step_types.index(match.group("type")))
+        durations.append(int(match.group("time")))
+        motor_positions.append(motor_position)
+
+    if position != len(steps):
+        raise error(f"Invalid step type '{steps[position]}'", position)
+    if not codes:
+        raise SequenceError("Sequence has no steps", 0)
+
+    # Valve masks of each step type, looked up for every step at once
+    type_masks = np.array([_masks(valve_settings[t]) for t in step_types],
+                          dtype=np.uint8)
+    codes = np.array(codes, dtype=np.uint8)
+    return SequenceProgram(
+        step_types=step_types,
+        codes=codes,
+        durations=np.array(durations, dtype=np.int64),
+        motor_positions=np.array(motor_positions, dtype=np.int32),
+        write_masks=type_masks[codes, 0],
+        value_masks=type_masks[codes, 1],
+        motor_flag=motor_flag,
+    )
@@ -0,0 +1,149 @@
+"""
+File: sequenceEngine.py
+Description: Runs valve/motor sequences on a dedicated thread against absolute deadlines.
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+from PyQt6 import QtCore
+
+from modbusTransport import Priority
+
+
+class SequenceEngine(QtCore.QThread):
+    """
+    Executes a sequence of steps with precise step boundaries.
+
+    The start time of every step is computed up front from the sequence start,
+    so timing errors never accumulate. The thread sleeps until shortly before
+    each boundary and then spins for the last moment. Valve writes are issued
+    early by the measured write latency, so they land on the planned time.
+
+    Signals:
+        step_started(int, str, int): Step index, step type and length (ms)
+        progress(float, float): Time left in the step and sequence (s)
+        sequence_finished(bool): True if every step ran, False if stopped
+
+    Attributes:
+        planned_starts (np.ndarray): Planned start of each step (perf_counter s)
+        timing_errors (np.ndarray): Actual minus planned valve switch time of
+            each step (ms), NaN until the write has completed
+    """
+
+    step_started = QtCore.pyqtSignal(int, str, int)
+    progress = QtCore.pyqtSignal(float, float)
+    sequence_finished = QtCore.pyqtSignal(bool)
+
+    # Final part of each wait that is spent spinning instead of sleeping (s)
+    SPIN_TIME = 0.002
+    # Upper bound on how early a valve write is issued (s)
+    MAX_LEAD_TIME = 0.1
+
+    def __init__(self, program, arduino_worker, motor_worker=None,
+                 label_rate: float = 10):
+        """
+        Initialize the engine.
+
+        Args:
+            program (SequenceProgram): Compiled sequence to run
+            arduino_worker (ArduinoWorker): Worker that writes the valves
+            motor_worker (MotorWorker): Worker that moves the motor, or None
+                if the sequence does not use the motor
+            label_rate (float): Progress signals per second
+        """
+        super().__init__()
+        self.program = program
+        self.arduino_worker = arduino_worker
+        self.motor_worker = motor_worker
+        self.label_interval = 1 / label_rate
+
+        # Estimated time from issuing a valve write to it completing (s)
+        self.lead_time = 0.02
+        self.planned_starts = np.zeros(len(program) + 1)
+        self.timing_errors = np.full(len(program), np.nan)
+        self.current_index = -1
+
+        self._abort = threading.Event()
+        self._next_progress = 0.0
+
+    def stop(self):
+        """Abandon the sequence after the current step."""
+        self._abort.set()
+        self.wait()
+
+    def run(self):
+        # Absolute start of every step, plus the end of the sequence
+        durations = self.program.durations / 1000
+        start = time.perf_counter() + self.lead_time
+        self.planned_starts = start + np.concatenate(([0], np.cumsum(durations)))
+        self._next_progress = time.perf_counter()
+
+        completed = True
+        for i in range(len(self.program)):
+            if not self._wait_until(self.planned_starts[i] - self.lead_time):
+                completed = False
+                break
+            self.current_index = i
+            self._dispatch(i)
+            self.step_started.emit(i, self.program.step_type(i),
+                                   int(self.program.durations[i]))
+        else:
+            completed = self._wait_until(self.planned_starts[-1])
+
+        self.current_index = -1
+        self._log_timing()
+        self.sequence_finished.emit(completed)
+
+    def _wait_until(self, deadline: float) -> bool:
+        """Sleep until deadline, emitting progress. False if stopped."""
+        while True:
+            if self._abort.is_set():
+                return False
+            now = time.perf_counter()
+            if now >= self._next_progress:
+                self._emit_progress(now)
+                self._next_progress += self.label_interval
+                if self._next_progress < now:
+                    self._next_progress = now + self.label_interval
+            if now >= deadline:
+                return True
+            wake = min(deadline, self._next_progress) - now
+            if wake > self.SPIN_TIME:
+                self._abort.wait(wake - self.SPIN_TIME)
+            else:
+                time.sleep(0)  # Spin, but let other threads run
+
+    def _emit_progress(self, now: float):
+        i = self.current_index
+        step_left = self.planned_starts[i + 1] - now if i >= 0 else 0.0
+        total_left = self.planned_starts[-1] - now
+        self.progress.emit(max(step_left, 0.0), max(total_left, 0.0))
+
+    def _dispatch(self, i: int):
+        """Issue the valve and motor commands for step i."""
+        issued = time.perf_counter()
+
+        def written(done: float):
+            # Called on the acquisition thread once the write has gone out
+            self.timing_errors[i] = (done - self.planned_starts[i]) * 1000
+            latency = done - issued
+            self.lead_time = min(
+                0.8 * self.lead_time + 0.2 * latency, self.MAX_LEAD_TIME)
+
+        self.arduino_worker.set_valve_states(
+            self.program.valve_states(i), done=written,
+            priority=Priority.SEQUENCE)
+
+        motor_position = int(self.program.motor_positions[i])
+        if self.motor_worker is not None and motor_position >= 0:
+            self.motor_worker.command_signal.emit(motor_position)
+
+    def _log_timing(self):
+        errors = self.timing_errors[~np.isnan(self.timing_errors)]
+        if len(errors):
+            logging.info(
+                f"Step timing error: mean {np.mean(errors):.1f} ms, "
+                f"max {np.max(np.abs(errors)):.1f} ms over {len(errors)} steps")
@@ -0,0 +1,131 @@
+"""
+File: sequenceWatcher.py
+Description: Watches for the sequence file written by Prospa and writes the handshake reply.
+"""
+
+import logging
+import os
+import tempfile
+
+from PyQt6 import QtCore
+
+# Files shared with Prospa
+SEQUENCE_PATH = os.path.join("C:\\ssbubble", "sequence.txt")
+PROSPA_PATH = os.path.join("C:\\ssbubble", "prospa.txt")
+
+
+class SequenceFileWatcher(QtCore.QObject):
+    """
+    Signals as soon as a complete sequence file has been written.
+
+    Change notifications come from a QFileSystemWatcher on the file and its
+    folder. A notification starts a short debounce timer, and the file is
+    only reported once its size and modification time have stopped changing,
+    so a partly written file is never read. If the folder cannot be watched
+    (e.g. some network shares), the file is polled instead.
+
+    Signals:
+        file_ready(str): Path of the complete sequence file
+    """
+
+    file_ready = QtCore.pyqtSignal(str)
+
+    def __init__(self, path: str = SEQUENCE_PATH, debounce: int = 50,
+                 poll_interval: int = 500, parent=None):
+        """
+        Initialize the watcher.
+
+        Args:
+            path (str): Sequence file to wait for
+            debounce (int): Time the file must be unchanged before it is
+                reported (ms)
+            poll_interval (int): Polling interval when notifications are not
+                available (ms)
+            parent (QObject): Parent object
+        """
+        super().__init__(parent)
+        self.path = path
+        self.watching = False
+        self._last_stat = None
+
+        self._watcher = QtCore.QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._changed)
+        self._watcher.fileChanged.connect(self._changed)
+
+        self._debounce_timer = QtCore.QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(debounce)
+        self._debounce_timer.timeout.connect(self._check)
+
+        self._poll_timer = QtCore.QTimer(self)
+        self._poll_timer.setInterval(poll_interval)
+        self._poll_timer.timeout.connect(self._changed)
+
+    def start(self):
+        """Start waiting for the sequence file."""
+        if self.watching:
+            return
+        self.watching = True
+        self._last_stat = None
+        directory = os.path.dirname(self.path)
+        if os.path.isdir(directory) and self._watcher.addPath(directory):
+            logging.info("Waiting for sequence file")
+        else:
+            logging.warning(
+                f"Cannot watch {directory}, polling for sequence file")
+            self._poll_timer.start()
+        # The file may already be there
+        self._changed()
+
+    def stop(self):
+        """Stop waiting for the sequence file."""
+        self.watching = False
+        self._poll_timer.stop()
+        self._debounce_timer.stop()
+        paths = self._watcher.files() + self._watcher.directories()
+        if paths:
+            self._watcher.removePaths(paths)
+
+    def _changed(self, *_):
+        if self.watching and not self._debounce_timer.isActive():
+            self._debounce_timer.start()
+
+    def _check(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self._last_stat = None
+            return
+        # Also watch the file itself, to hear about appends to it
+        if self.path not in self._watcher.files():
+            self._watcher.addPath(self.path)
+
+        current = (stat.st_size, stat.st_mtime_ns)
+        if stat.st_size == 0 or current != self._last_stat:
+            # Still being written, check again once it settles
+            self._last_stat = current
+            self._debounce_timer.start()
+            return
+        self._last_stat = None
+        self.file_ready.emit(self.path)
+
+
+def write_atomic(path: str, text: str):
+    """
+    Replace a file in one step, so a reader never sees it half written.
+
+    Args:
+        path (str): File to write
+        text (str): New contents
+    """
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except OSError:
+        os.remove(temp_path)
+        raise
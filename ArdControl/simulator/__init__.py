@@ -0,0 +1,57 @@
+"""
+File: __init__.py
+Description: Hardware-free simulator of the valve and motor Arduinos, serving their Modbus slaves over pseudo-terminals.
+
+Run it on its own with "python -m simulator" from ArdControl, or start a
+SimulatedRig from a test or benchmark and connect the controllers to its
+ports. Linux only, as it needs pseudo-terminals.
+"""
+
+from .modbusSlave import ModbusSlave, ModbusException, crc16
+from .motorFirmware import MotorFirmware, MotorModel
+from .valveFirmware import GasModel, ValveFirmware, bar_to_raw, raw_to_bar
+
+
+class SimulatedRig:
+    """
+    Valve and motor firmware running together, as on the spectrometer.
+
+    Can be used as a context manager, which starts both boards and closes
+    them on exit.
+
+    Attributes:
+        valve (ValveFirmware): Simulated valve Arduino, slave 10
+        motor (MotorFirmware): Simulated motor board, slave 11
+    """
+
+    def __init__(self, valve: ValveFirmware | None = None,
+                 motor: MotorFirmware | None = None):
+        """
+        Create the rig.
+
+        Args:
+            valve (ValveFirmware): Valve board, defaults to current firmware
+            motor (MotorFirmware): Motor board, defaults to current firmware
+        """
+        self.valve = valve or ValveFirmware()
+        self.motor = motor or MotorFirmware()
+
+    @property
+    def ports(self) -> dict:
+        """Port of each device, keyed by role as in portDiscovery."""
+        return {"valve": self.valve.port, "motor": self.motor.port}
+
+    def start(self):
+        self.valve.start()
+        self.motor.start()
+
+    def close(self):
+        self.valve.close()
+        self.motor.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
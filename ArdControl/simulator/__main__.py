@@ -0,0 +1,51 @@
+"""
+File: __main__.py
+Description: Runs the simulated valve and motor boards until interrupted.
+
+Usage:
+    python -m simulator [--link-dir DIR] [--baudrate N] [--supply BAR]
+"""
+
+import argparse
+import logging
+import os
+import time
+
+from portDiscovery import EXTRA_PORTS_ENV
+
+from . import GasModel, MotorFirmware, SimulatedRig, ValveFirmware
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the simulated valve and motor boards.")
+    parser.add_argument("--link-dir", help="Directory for stable symlinks "
+                        "to the ports, e.g. /tmp")
+    parser.add_argument("--baudrate", type=int, default=9600)
+    parser.add_argument("--supply", type=float, default=8.0,
+                        help="Gas supply pressure (bar)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    links = {role: os.path.join(args.link_dir, f"ttySIM{role.upper()}")
+             if args.link_dir else None for role in ("valve", "motor")}
+    rig = SimulatedRig(
+        ValveFirmware(GasModel(args.supply), seed=args.seed,
+                      baudrate=args.baudrate, link=links["valve"]),
+        MotorFirmware(baudrate=args.baudrate, link=links["motor"]))
+    with rig:
+        ports = {role: links[role] or port for role, port in rig.ports.items()}
+        for role, port in ports.items():
+            logging.info(f"Simulated {role} board on {port}")
+        logging.info(f"To let the GUI find them: export {EXTRA_PORTS_ENV}="
+                     f"{os.pathsep.join(ports.values())}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+File: modbusSlave.py
+Description: Modbus RTU slave served over a Linux pseudo-terminal, with the timing of a real serial line.
+"""
+
+import logging
+import os
+import select
+import threading
+import time
+import tty
+
+# Function codes
+READ_COILS = 1
+READ_DISCRETE_INPUTS = 2
+READ_HOLDING_REGISTERS = 3
+READ_INPUT_REGISTERS = 4
+WRITE_SINGLE_COIL = 5
+WRITE_SINGLE_REGISTER = 6
+WRITE_MULTIPLE_COILS = 15
+WRITE_MULTIPLE_REGISTERS = 16
+
+# Exception codes
+ILLEGAL_FUNCTION = 1
+ILLEGAL_DATA_ADDRESS = 2
+ILLEGAL_DATA_VALUE = 3
+
+# Bits on the line per byte, 8N1
+BITS_PER_BYTE = 10
+
+
+def crc16(frame: bytes) -> int:
+    """Modbus RTU CRC of a frame, sent low byte first."""
+    crc = 0xFFFF
+    for byte in frame:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def with_crc(frame: bytes) -> bytes:
+    """Frame with its CRC appended."""
+    return frame + crc16(frame).to_bytes(2, "little")
+
+
+class ModbusException(Exception):
+    """Request the slave answers with a Modbus exception reply."""
+
+    def __init__(self, code: int):
+        super().__init__(f"Modbus exception {code}")
+        self.code = code
+
+
+class ModbusSlave(threading.Thread):
+    """
+    Firmware of a Modbus RTU slave, run on a thread of its own.
+
+    Like the ModbusSerial library used by the firmware, only addresses that
+    were added can be accessed, and a request touching any other address
+    gets an illegal data address exception. Subclasses add their coils and
+    registers in __init__ and emulate the firmware loop in tick(), which is
+    called every tick_period of simulated time, including the time spent
+    waiting for the serial line.
+
+    The slave owns the master side of a pseudo-terminal. Hosts open port,
+    the slave side, as if it were the Arduino's serial port. Requests are
+    framed by the 3.5 character silence of Modbus RTU, and every reply is
+    held back for the time the request and reply would take on the wire,
+    so transactions take as long as they do on the real 9600 baud line.
+
+    Attributes:
+        slave_id (int): Modbus address of the slave
+        port (str): Path of the pseudo-terminal to open, e.g. "/dev/pts/3"
+        lock (threading.RLock): Held while the firmware state changes,
+            take it to inspect the state consistently
+        requests (int): Requests answered, including exception replies
+        last_request (float): monotonic time of the last request, or None
+    """
+
+    def __init__(self, slave_id: int, name: str, baudrate: int = 9600,
+                 tick_period: float = 0.001, turnaround: float = 0.001,
+                 link: str | None = None):
+        """
+        Create the slave and its pseudo-terminal.
+
+        Args:
+            slave_id (int): Modbus address of the slave
+            name (str): Name of the thread and log messages
+            baudrate (int): Line speed used for the transaction timing
+            tick_period (float): Simulated time per tick() (s)
+            turnaround (float): Time the firmware takes to start replying (s)
+            link (str): Path of a symlink to create to the port, or None
+        """
+        super().__init__(name=name, daemon=True)
+        self.slave_id = slave_id
+        self.baudrate = baudrate
+        self.tick_period = tick_period
+        self.turnaround = turnaround
+        self.coils = {}
+        self.holding_registers = {}
+        self.input_registers = {}
+        self.lock = threading.RLock()
+        self.requests = 0
+        self.last_request = None
+
+        self._master, self._slave = os.openpty()
+        # Raw bytes both ways, the host's serial settings replace these
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self.link = link
+        if link is not None:
+            if os.path.lexists(link):
+                os.remove(link)
+            os.symlink(self.port, link)
+        self.boot_time = time.monotonic()
+        self._next_tick = self.boot_time
+        self._closing = threading.Event()
+
+    # Data model, as in the ModbusSerial library
+
+    def add_coil(self, address: int, value: bool = False):
+        self.coils[address] = bool(value)
+
+    def add_holding_register(self, address: int, value: int = 0):
+        self.holding_registers[address] = value & 0xFFFF
+
+    def add_input_register(self, address: int, value: int = 0):
+        self.input_registers[address] = value & 0xFFFF
+
+    def millis(self) -> int:
+        """Firmware millis() at the current simulated time."""
+        return int((time.monotonic() - self.boot_time) * 1000) & 0xFFFFFFFF
+
+    # Firmware hooks
+
+    def tick(self, now: float):
+        """Run one pass of the firmware loop at monotonic time now."""
+
+    def on_request(self, now: float):
+        """Called when a request for this slave starts to arrive."""
+
+    # Serial line
+
+    def character_time(self) -> float:
+        """Time one byte takes on the line (s)."""
+        return BITS_PER_BYTE / self.baudrate
+
+    def run(self):
+        silence = max(3.5 * self.character_time(), 0.00175)
+        while not self._closing.is_set():
+            self._run_ticks()
+            wait = max(self._next_tick - time.monotonic(), 0)
+            try:
+                readable, _, _ = select.select([self._master], [], [], wait)
+            except (OSError, ValueError):
+                return  # Closed
+            if not readable:
+                continue
+            # A frame ends with a silence on the line
+            frame = b""
+            while readable:
+                try:
+                    frame += os.read(self._master, 512)
+                except OSError:
+                    return
+                readable, _, _ = select.select([self._master], [], [], silence)
+            self._handle_frame(frame)
+
+    def _run_ticks(self):
+        now = time.monotonic()
+        with self.lock:
+            while self._next_tick <= now:
+                self.tick(self._next_tick)
+                self._next_tick += self.tick_period
+            # Far behind, e.g. after the thread was starved, skip ahead
+            if now - self._next_tick > 1.0:
+                self._next_tick = now
+
+    def _handle_frame(self, frame: bytes):
+        if len(frame) < 4 or frame[0] != self.slave_id:
+            return  # Noise, or another slave on the bus
+        if crc16(frame[:-2]) != int.from_bytes(frame[-2:], "little"):
+            logging.debug(f"{self.name}: dropped frame with bad CRC")
+            return
+        received = time.monotonic()
+        with self.lock:
+            self.last_request = received
+            self.on_request(received)
+            try:
+                pdu = self.process(frame[1:-2])
+            except ModbusException as e:
+                pdu = bytes([frame[1] | 0x80, e.code])
+            self.requests += 1
+        reply = with_crc(bytes([self.slave_id]) + pdu)
+        # The request and reply take this long on the real line
+        wire_time = ((len(frame) + len(reply)) * self.character_time()
+                     + self.turnaround)
+        deadline = received + wire_time
+        while time.monotonic() < deadline:
+            self._run_ticks()
+            time.sleep(min(self.tick_period,
+                           max(deadline - time.monotonic(), 0)))
+        try:
+            os.write(self._master, reply)
+        except OSError:
+            pass
+
+    def process(self, pdu: bytes) -> bytes:
+        """
+        Answer one request.
+
+        Args:
+            pdu (bytes): Function code and data of the request
+
+        Returns:
+            bytes: Function code and data of the reply
+
+        Raises:
+            ModbusException: The request gets an exception reply
+        """
+        function = pdu[0]
+        if function in (READ_COILS, READ_HOLDING_REGISTERS,
+                        READ_INPUT_REGISTERS):
+            if len(pdu) != 5:
+                raise ModbusException(ILLEGAL_DATA_VALUE)
+            address = int.from_bytes(pdu[1:3], "big")
+            count = int.from_bytes(pdu[3:5], "big")
+            if function == READ_COILS:
+                if not 1 <= count <= 2000:
+                    raise ModbusException(ILLEGAL_DATA_VALUE)
+                bits = self._read(self.coils, address, count)
+                data = bytearray((count + 7) // 8)
+                for i, bit in enumerate(bits):
+                    data[i // 8] |= bit << (i % 8)
+                return bytes([function, len(data)]) + bytes(data)
+            if not 1 <= count <= 125:
+                raise ModbusException(ILLEGAL_DATA_VALUE)
+            table = (self.holding_registers
+                     if function == READ_HOLDING_REGISTERS
+                     else self.input_registers)
+            values = self._read(table, address, count)
+            return (bytes([function, 2 * count])
+                    + b"".join(v.to_bytes(2, "big") for v in values))
+
+        if function in (WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER):
+            if len(pdu) != 5:
+                raise ModbusException(ILLEGAL_DATA_VALUE)
+            address = int.from_bytes(pdu[1:3], "big")
+            value = int.from_bytes(pdu[3:5], "big")
+            if function == WRITE_SINGLE_COIL:
+                if value not in (0x0000, 0xFF00):
+                    raise ModbusException(ILLEGAL_DATA_VALUE)
+                self._write(self.coils, address, [value == 0xFF00])
+            else:
+                self._write(self.holding_registers, address, [value])
+            return pdu
+
+        if function in (WRITE_MULTIPLE_COILS, WRITE_MULTIPLE_REGISTERS):
+            if len(pdu) < 6 or len(pdu) != 6 + pdu[5]:
+                raise ModbusException(ILLEGAL_DATA_VALUE)
+            address = int.from_bytes(pdu[1:3], "big")
+            count = int.from_bytes(pdu[3:5], "big")
+            data = pdu[6:]
+            if function == WRITE_MULTIPLE_COILS:
+                if len(data) != (count + 7) // 8:
+                    raise ModbusException(ILLEGAL_DATA_VALUE)
+                values = [bool(data[i // 8] >> (i % 8) & 1)
+                          for i in range(count)]
+                self._write(self.coils, address, values)
+            else:
+                if len(data) != 2 * count:
+                    raise ModbusException(ILLEGAL_DATA_VALUE)
+                values = [int.from_bytes(data[i:i + 2], "big")
+                          for i in range(0, len(data), 2)]
+                self._write(self.holding_registers, address, values)
+            return pdu[:5]
+
+        raise ModbusException(ILLEGAL_FUNCTION)
+
+    @staticmethod
+    def _read(table: dict, address: int, count: int) -> list:
+        try:
+            return [int(table[a]) for a in range(address, address + count)]
+        except KeyError:
+            raise ModbusException(ILLEGAL_DATA_ADDRESS) from None
+
+    @staticmethod
+    def _write(table: dict, address: int, values: list):
+        addresses = range(address, address + len(values))
+        if any(a not in table for a in addresses):
+            raise ModbusException(ILLEGAL_DATA_ADDRESS)
+        for a, value in zip(addresses, values):
+            table[a] = value
+
+    def close(self):
+        """Stop the firmware and remove the port."""
+        self._closing.set()
+        if self.is_alive():
+            self.join(1.0)
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        if self.link is not None and os.path.islink(self.link):
+            os.remove(self.link)
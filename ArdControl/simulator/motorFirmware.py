@@ -0,0 +1,282 @@
+"""
+File: motorFirmware.py
+Description: Simulated uStepper motor board (slave 11) running the register map of DAT_MotorControl_v1.ino.
+"""
+
+import logging
+
+from motionProfile import MotionProfile
+
+from .modbusSlave import ModbusSlave
+
+
+class MotorModel:
+    """
+    Kinematics of the sample shuttle.
+
+    Moves to a position follow a trapezoidal MotionProfile from rest, with
+    the speed and acceleration the firmware set for the move. A new move
+    starts from wherever the motor is, as if it had stopped there.
+    Continuous runs, used to find the top switch, move at a constant
+    velocity. The top and bottom switches stop any motion that reaches
+    them, like the firmware's interrupts.
+
+    Attributes:
+        position (float): Current position (steps)
+        top_switch (float): Position of the top switch (steps)
+        bottom_switch (float): Position of the bottom switch (steps)
+        speedup (float): Factor the motor runs faster than real time by,
+            to shorten tests
+    """
+
+    def __init__(self, position: float = 2_500_000,
+                 top_switch: float = 2_600_000, bottom_switch: float = 0,
+                 speedup: float = 1.0):
+        self.position = float(position)
+        self.top_switch = float(top_switch)
+        self.bottom_switch = float(bottom_switch)
+        self.speedup = speedup
+        self._start = self.position
+        self._target = self.position
+        self._started = 0.0
+        self._profile = MotionProfile()  # Of the current move
+        self._velocity = 0.0  # Of a continuous run (steps/s)
+
+    @property
+    def moving(self) -> bool:
+        return self._velocity != 0 or self.position != self._target
+
+    @property
+    def at_top(self) -> bool:
+        return self.position >= self.top_switch
+
+    @property
+    def at_bottom(self) -> bool:
+        return self.position <= self.bottom_switch
+
+    def move_to(self, target: float, now: float, profile: MotionProfile):
+        """Start a move to target with the speed and acceleration of profile."""
+        self._velocity = 0.0
+        self._profile = profile
+        self._start = self.position
+        self._target = min(max(float(target), self.bottom_switch),
+                           self.top_switch)
+        self._started = now
+
+    def run(self, velocity: float, now: float):
+        """Run continuously at velocity (steps/s) until a switch is hit."""
+        self._start = self.position
+        self._started = now
+        self._velocity = velocity
+
+    def stop(self):
+        """Stop at once."""
+        self._velocity = 0.0
+        self._target = self.position
+
+    def update(self, now: float):
+        """Advance the position to time now."""
+        elapsed = (now - self._started) * self.speedup
+        if self._velocity:
+            self.position = self._start + self._velocity * elapsed
+            self._target = self.position
+        elif self.position != self._target:
+            distance = abs(self._target - self._start)
+            total, travelled = self._profile._scalar_move(distance, elapsed)
+            if elapsed >= total:
+                self.position = self._target
+            else:
+                direction = 1 if self._target > self._start else -1
+                self.position = self._start + direction * travelled
+        if self.position >= self.top_switch or self.position <= self.bottom_switch:
+            self.position = min(max(self.position, self.bottom_switch),
+                                self.top_switch)
+            if self._velocity:
+                self.stop()
+
+
+class MotorFirmware(ModbusSlave):
+    """
+    Simulated motor board.
+
+    Commands are taken from the command register when the host sets the
+    command flag coil, or at once when 'X' is written together with the
+    target. Moves to a target and to the top run at the speed register,
+    4000 steps/s at boot, and the 5 mm nudges at the firmware's slow
+    speed. The other moves keep the last speed set, as on the board.
+    Calibration runs up to the top switch at a quarter of the maximum
+    velocity, then parks at the up position. The position, status flags
+    and move sequence registers are kept up to date, and the calibrated
+    coil is cleared after 2 s without requests, as on the board. The
+    blocking 'e' and 'm' commands of the firmware are replaced by their
+    final move.
+
+    Attributes:
+        motor (MotorModel): Kinematics of the shuttle
+        top_position (int): Calibrated top of travel (steps)
+        calibrating (bool): Running up to the top switch
+        move_sequence (int): Moves accepted, modulo 2**16
+        profile (MotionProfile): Speed and acceleration last set
+    """
+
+    SLAVE_ID = 11
+    COMMAND_COIL = 1
+    CALIBRATED_COIL = 2
+    INIT_COIL = 3
+    COMMAND_HREG = 2
+    TARGET_HREG = 3
+    POSITION_HREG = 5
+    TOP_HREG = 7
+    SPEED_HREG = 9
+    FLAGS_HREG = 10
+    MOVE_SEQUENCE_HREG = 11
+    COMMS_TIMEOUT = 2.0
+    # Speed settings of the firmware (steps/s and steps/s^2)
+    MAX_VELOCITY = 6500
+    MAX_ACCELERATION = 23250
+    BOOT_SPEED = 4000
+    # Offsets from the top switch, as in the firmware (steps)
+    UP_OFFSET = 100_000
+    DOWN_OFFSET = 2_475_000
+    SIX_MT_OFFSET = 2_475_000 - 1_284_300
+    # moveAngle(225) with 200 steps/rev and 256 microsteps (steps)
+    NUDGE = 32_000
+
+    def __init__(self, motor: MotorModel | None = None, status: bool = True,
+                 **kwargs):
+        """
+        Create the simulated board.
+
+        Args:
+            motor (MotorModel): Kinematics, defaults to parked just below
+                the top switch
+            status (bool): Provide the status and move sequence registers
+                10-11, False emulates older firmware
+            **kwargs: Passed to ModbusSlave, e.g. baudrate or link
+        """
+        super().__init__(self.SLAVE_ID, "MotorFirmware", **kwargs)
+        self.motor = motor or MotorModel()
+        for address in (self.COMMAND_COIL, self.CALIBRATED_COIL,
+                        self.INIT_COIL):
+            self.add_coil(address)
+        last = self.MOVE_SEQUENCE_HREG if status else self.SPEED_HREG
+        for address in range(self.COMMAND_HREG, last + 1):
+            self.add_holding_register(address)
+        self.holding_registers[self.SPEED_HREG] = self.BOOT_SPEED
+        self.top_position = 0
+        self.calibrating = False
+        self.move_sequence = 0
+        self.profile = self._custom_speed()
+        self.last_comms = self.boot_time
+
+    @property
+    def up_position(self) -> int:
+        return self.top_position - self.UP_OFFSET
+
+    @property
+    def down_position(self) -> int:
+        return self.top_position - self.DOWN_OFFSET
+
+    def on_request(self, now: float):
+        self.last_comms = now
+
+    def tick(self, now: float):
+        if now - self.last_comms > self.COMMS_TIMEOUT:
+            self.coils[self.CALIBRATED_COIL] = False
+
+        self.motor.update(now)
+        if self.calibrating and self.motor.at_top:
+            self._finish_calibration()
+        self._write_long(self.POSITION_HREG, round(self.motor.position))
+
+        command = self.holding_registers[self.COMMAND_HREG]
+        if command == ord('X') and not self.calibrating:
+            # Written together with the target, no command flag needed
+            self._handle(command, now)
+            self.holding_registers[self.COMMAND_HREG] = 0
+        elif self.coils[self.COMMAND_COIL] and not self.calibrating:
+            self._handle(command, now)
+            self.holding_registers[self.COMMAND_HREG] = 0
+            self.coils[self.COMMAND_COIL] = False
+
+        if self.FLAGS_HREG in self.holding_registers:
+            self.holding_registers[self.FLAGS_HREG] = (
+                int(self.coils[self.CALIBRATED_COIL])
+                | int(self.motor.moving or self.calibrating) << 1
+                | int(self.motor.at_top) << 2
+                | int(self.motor.at_bottom) << 3)
+
+    def _custom_speed(self) -> MotionProfile:
+        # setCustomSpeed(), a speed of 0 leaves the motor standing
+        return MotionProfile(
+            max_velocity=max(self.holding_registers[self.SPEED_HREG], 1),
+            acceleration=self.MAX_ACCELERATION)
+
+    def _handle(self, command: int, now: float):
+        char = chr(command) if command else ""
+        if char in ("x", "X", "t"):
+            self.profile = self._custom_speed()
+        elif char in ("y", "z"):
+            # slowSpeed()
+            self.profile = MotionProfile(
+                max_velocity=self.MAX_VELOCITY / 2,
+                acceleration=self.MAX_ACCELERATION / 2)
+
+        if char in ("x", "X"):
+            # The target is measured down from the up position
+            target = self._read_long(self.TARGET_HREG)
+            position = max(min(self.up_position, self.up_position - target),
+                           self.down_position)
+            self.motor.move_to(position, now, self.profile)
+            self._accept_move()
+        elif char == "s":
+            self.motor.stop()
+        elif char == "c":
+            self.coils[self.CALIBRATED_COIL] = False
+            self.calibrating = True
+            self.motor.run(self.MAX_VELOCITY / 4, now)
+        elif char == "i":
+            self.calibrating = True
+            self.motor.run(self.MAX_VELOCITY / 4, now)
+        elif char in ("t", "e"):
+            self.motor.move_to(self.up_position, now, self.profile)
+        elif char in ("b", "m"):
+            self.motor.move_to(self.down_position, now, self.profile)
+        elif char == "6":
+            self.motor.move_to(self.top_position - self.SIX_MT_OFFSET, now,
+                               self.profile)
+        elif char == "y":
+            self.motor.move_to(self.motor.position + self.NUDGE, now,
+                               self.profile)
+        elif char == "z":
+            self.motor.move_to(self.motor.position - self.NUDGE, now,
+                               self.profile)
+        elif char == "u":
+            self.motor.run(self.MAX_VELOCITY / 2, now)
+        elif command:
+            logging.debug(f"{self.name}: ignored command {command}")
+
+    def _finish_calibration(self):
+        # What the top switch interrupt does once calibration has started
+        self.calibrating = False
+        self.top_position = round(self.motor.position)
+        self._write_long(self.TOP_HREG, self.up_position)
+        self._write_long(self.TARGET_HREG, 0)
+        self.coils[self.COMMAND_COIL] = True
+        self.holding_registers[self.COMMAND_HREG] = ord('x')
+        self.coils[self.CALIBRATED_COIL] = True
+
+    def _accept_move(self):
+        self.move_sequence = (self.move_sequence + 1) & 0xFFFF
+        if self.MOVE_SEQUENCE_HREG in self.holding_registers:
+            self.holding_registers[self.MOVE_SEQUENCE_HREG] = self.move_sequence
+
+    def _write_long(self, address: int, value: int):
+        value &= 0xFFFFFFFF
+        self.holding_registers[address] = value >> 16
+        self.holding_registers[address + 1] = value & 0xFFFF
+
+    def _read_long(self, address: int) -> int:
+        value = (self.holding_registers[address] << 16
+                 | self.holding_registers[address + 1])
+        return value - (1 << 32) if value & 0x80000000 else value
@@ -0,0 +1,380 @@
+"""
+File: valveFirmware.py
+Description: Simulated valve Arduino (slave 10) running the register map of main.cpp over a lumped gas model.
+"""
+
+import numpy as np
+
+from .modbusSlave import ModbusSlave
+
+# Valve indices, as in main.cpp
+GAS1, GAS2, IN, OUT, VENT, SHORT = range(6)
+
+# Vent states, as in main.cpp
+VENT_IDLE, VENT_VENTING, VENT_DONE, VENT_TIMED_OUT = range(4)
+
+
+def bar_to_raw(pressure):
+    """Gauge reading of a pressure, inverse of convertToBar() in main.cpp."""
+    return np.asarray(pressure) * 100 * 0.8248 + 203.53
+
+
+def raw_to_bar(raw):
+    """Pressure of a gauge reading, as convertToBar() in main.cpp."""
+    return (np.asarray(raw) - 203.53) / 0.8248 / 100
+
+
+class GasModel:
+    """
+    Lumped model of the gas lines, driven by the valve states.
+
+    The system is three volumes, each with a gauge, plus the regulated
+    supply on gauge 1. An open valve lets gas flow between its two ends in
+    proportion to the pressure difference. The outlet always bleeds to
+    atmosphere through a restriction.
+
+        supply --GAS1/GAS2--> inlet --IN--> tube --OUT--> outlet --> air
+                              inlet --VENT--> air
+                              inlet --SHORT--> outlet
+
+    Pressures are gauge pressures (bar), so atmosphere is 0.
+
+    Attributes:
+        supply (float): Regulated supply pressure (bar)
+        pressures (np.ndarray): Pressure of the supply, inlet, tube and
+            outlet, in gauge order (bar)
+    """
+
+    # Conductance of each valve when open, and of the outlet bleed (1/s)
+    CONDUCTANCES = {GAS1: 1.0, GAS2: 3.0, IN: 3.0, OUT: 4.0, VENT: 4.0,
+                    SHORT: 3.0}
+    BLEED = 10.0
+    # Relative size of the inlet, tube and outlet volumes
+    VOLUMES = np.array([1.0, 1.0, 0.5])
+
+    def __init__(self, supply: float = 8.0, pressures=(0.0, 0.0, 0.0)):
+        """
+        Initialize the model.
+
+        Args:
+            supply (float): Regulated supply pressure (bar)
+            pressures: Starting pressure of the inlet, tube and outlet (bar)
+        """
+        self.supply = supply
+        self.pressures = np.array([supply, *pressures], dtype=np.float64)
+
+    def step(self, valves, dt: float):
+        """
+        Advance the model.
+
+        Args:
+            valves: State of each valve output, indexed as in main.cpp
+            dt (float): Time step (s), small against the fastest time
+                constant, about 0.03 s
+        """
+        supply, inlet, tube, outlet = self.pressures
+        c = self.CONDUCTANCES
+        flow = np.zeros(3)  # Into the inlet, tube and outlet
+        feed = (c[GAS1] * valves[GAS1] + c[GAS2] * valves[GAS2]) * (supply - inlet)
+        flow[0] += feed
+        between = [(IN, 0, 1, inlet, tube), (OUT, 1, 2, tube, outlet),
+                   (SHORT, 0, 2, inlet, outlet)]
+        for valve, a, b, pa, pb in between:
+            if valves[valve]:
+                f = c[valve] * (pa - pb)
+                flow[a] -= f
+                flow[b] += f
+        flow[0] -= c[VENT] * valves[VENT] * inlet
+        flow[2] -= self.BLEED * outlet
+        self.pressures[0] = self.supply
+        self.pressures[1:] += flow / self.VOLUMES * dt
+
+
+class ValveFirmware(ModbusSlave):
+    """
+    Simulated valve Arduino, running the loop of main.cpp.
+
+    The coils, registers, TTL and reset handling, comms timeout, 4 ms
+    oversampling, request statistics, sample FIFO and non-blocking
+    depressurise all follow the firmware. The gauges read the gas model
+    with ADC noise. There are no TTL inputs, so TTL control closes the
+    valves as it does with every TTL line low.
+
+    The register blocks added by later firmware can be left out to emulate
+    older boards, which answer them with an illegal data address.
+
+    Attributes:
+        gas (GasModel): Gas lines the valves act on
+        valves (list[int]): State of each valve output
+    """
+
+    SLAVE_ID = 10
+    VALVE_COILS = range(8)
+    TTL_COIL = 16
+    RESET_COIL = 17
+    DEPRESSURISE_COIL = 18
+    TEST_COIL = 19
+    VALVE_MASK_IREG = 4
+    STATUS_FLAGS_IREG = 5
+    TIMESTAMP_IREG = 6
+    STATS_MEAN_IREG = 8
+    STATS_MIN_IREG = 12
+    STATS_MAX_IREG = 16
+    STATS_COUNT_IREG = 20
+    STATS_MEAN_SCALE = 16
+    OVERSAMPLE_PERIOD = 0.004
+    VENT_STATE_IREG = 21
+    VENT_PROGRESS_IREG = 22
+    SAMPLE_PERIOD_HREG = 0
+    FIFO_HEAD_IREG = 32
+    FIFO_BASE_IREG = 33
+    FIFO_SIZE = 16
+    FIFO_RECORD_LENGTH = 8
+    MIN_SAMPLE_PERIOD = 10
+    MAX_SAMPLE_PERIOD = 1000
+    DEFAULT_SAMPLE_PERIOD = 50
+    COMMS_TIMEOUT = 2.0
+    VENT_TARGET = 0.1
+    VENT_TIMEOUT = 5.0
+
+    def __init__(self, gas: GasModel | None = None, noise: float = 1.5,
+                 seed: int | None = None, snapshot: bool = True,
+                 stats: bool = True, vent: bool = True, fifo: bool = True,
+                 **kwargs):
+        """
+        Create the simulated Arduino.
+
+        Args:
+            gas (GasModel): Gas lines, defaults to an unpressurised system
+            noise (float): Standard deviation of the gauge noise (counts)
+            seed (int): Seed of the noise, for repeatable runs
+            snapshot (bool): Provide the snapshot registers 4-7
+            stats (bool): Provide the statistics registers 8-20
+            vent (bool): Provide the vent status registers 21-22
+            fifo (bool): Provide the sample period register and FIFO
+            **kwargs: Passed to ModbusSlave, e.g. baudrate or link
+        """
+        super().__init__(self.SLAVE_ID, "ValveFirmware", **kwargs)
+        self.gas = gas or GasModel()
+        self.noise = noise
+        self._rng = np.random.default_rng(seed)
+        self.valves = [0] * 8
+
+        for address in self.VALVE_COILS:
+            self.add_coil(address)
+        self.add_coil(self.TTL_COIL, True)
+        self.add_coil(self.TEST_COIL)
+        self.add_coil(self.RESET_COIL)
+        self.add_coil(self.DEPRESSURISE_COIL)
+        for address in range(4):
+            self.add_input_register(address)
+        if snapshot:
+            for address in range(4, 8):
+                self.add_input_register(address)
+        if stats:
+            for address in range(8, 21):
+                self.add_input_register(address)
+        if vent:
+            self.add_input_register(self.VENT_STATE_IREG, VENT_IDLE)
+            self.add_input_register(self.VENT_PROGRESS_IREG)
+        if fifo:
+            self.add_holding_register(
+                self.SAMPLE_PERIOD_HREG, self.DEFAULT_SAMPLE_PERIOD)
+            self.add_input_register(self.FIFO_HEAD_IREG)
+            for i in range(self.FIFO_SIZE * self.FIFO_RECORD_LENGTH):
+                self.add_input_register(self.FIFO_BASE_IREG + i)
+
+        self.ttl_state = True
+        self.last_comms = self.boot_time
+        self.pressure_inputs = [0.0] * 4
+        self.sample_window = self._empty_window()
+        self.request_window = self._empty_window()
+        self.last_oversample = float("-inf")
+        self.next_sample = 0  # millis() of the next sample
+        self.sample_seq = 0
+        self.vent_state = VENT_IDLE
+        self.vent_start = 0.0
+        self.vent_start_pressure = 0.0
+        self._last_tick = None
+
+    # Register helpers that ignore blocks this firmware does not have
+
+    def _set_ireg(self, address: int, value):
+        if address in self.input_registers:
+            self.input_registers[address] = int(value) & 0xFFFF
+
+    def _ireg(self, address: int) -> int:
+        return self.input_registers.get(address, 0)
+
+    def on_request(self, now: float):
+        # Serial activity keeps the connection alive and ends the window
+        self.last_comms = now
+        self._update_stats_registers()
+
+    def tick(self, now: float):
+        dt = self.tick_period if self._last_tick is None else now - self._last_tick
+        self._last_tick = now
+        self.gas.step(self.valves, dt)
+
+        if not self.ttl_state and now - self.last_comms > self.COMMS_TIMEOUT:
+            self._reset()
+
+        if self.coils[self.TTL_COIL]:
+            if self.vent_state == VENT_VENTING:
+                self._finish_vent(VENT_IDLE)
+            # Every TTL input low
+            for valve in (IN, OUT, GAS1, GAS2, VENT, SHORT):
+                self.valves[valve] = 0
+            self.ttl_state = True
+        else:
+            if self.ttl_state:
+                self.last_comms = now
+                self.ttl_state = False
+            if self.coils[self.DEPRESSURISE_COIL]:
+                self._depressurise(now)
+            elif self.vent_state == VENT_VENTING:
+                self._finish_vent(VENT_IDLE)
+            if self.coils[self.RESET_COIL]:
+                self._reset()
+            for valve in range(6):
+                self.valves[valve] = int(self.coils[valve])
+
+        self._update_snapshot_registers()
+        if now - self.last_oversample >= self.OVERSAMPLE_PERIOD:
+            self.last_oversample = now
+            self._oversample()
+
+        millis = int(round((now - self.boot_time) * 1000)) & 0xFFFFFFFF
+        if millis >= self.next_sample:
+            # Schedule against a fixed timeline, unless too far behind
+            self.next_sample += self._sample_period()
+            if millis >= self.next_sample:
+                self.next_sample = millis + self._sample_period()
+            self._read_pressure()
+            self._update_pressure_registers(millis)
+            self._push_sample(millis)
+
+    def _reset(self):
+        self.ttl_state = True
+        self.coils[self.TTL_COIL] = True
+        self.coils[self.RESET_COIL] = False
+        if self.vent_state == VENT_VENTING:
+            self._finish_vent(VENT_IDLE)
+        for address in self.VALVE_COILS:
+            self.coils[address] = False
+        for valve in range(6):
+            self.valves[valve] = 0
+
+    def _update_snapshot_registers(self):
+        mask = sum(1 << i for i in self.VALVE_COILS if self.coils[i])
+        flags = (int(self.coils[self.TTL_COIL])
+                 | int(self.coils[self.RESET_COIL]) << 1
+                 | int(self.coils[self.DEPRESSURISE_COIL]) << 2)
+        self._set_ireg(self.VALVE_MASK_IREG, mask)
+        self._set_ireg(self.STATUS_FLAGS_IREG, flags)
+
+    def _sample_period(self) -> int:
+        period = self.holding_registers.get(
+            self.SAMPLE_PERIOD_HREG, self.DEFAULT_SAMPLE_PERIOD)
+        return min(max(period, self.MIN_SAMPLE_PERIOD), self.MAX_SAMPLE_PERIOD)
+
+    # Oversampling
+
+    @staticmethod
+    def _empty_window():
+        return {"sum": np.zeros(4), "min": np.full(4, 0xFFFF),
+                "max": np.zeros(4, dtype=np.int64), "count": 0}
+
+    def read_gauges(self) -> np.ndarray:
+        """One ADC reading of every gauge, with noise."""
+        raw = bar_to_raw(self.gas.pressures)
+        raw = raw + self._rng.normal(0, self.noise, 4)
+        return np.clip(np.rint(raw), 0, 1023).astype(np.int64)
+
+    def _oversample(self):
+        readings = self.read_gauges()
+        for window in (self.sample_window, self.request_window):
+            if window["count"] == 0xFFFF:
+                continue
+            window["sum"] += readings
+            window["min"] = np.minimum(window["min"], readings)
+            window["max"] = np.maximum(window["max"], readings)
+            window["count"] += 1
+
+    def _read_pressure(self):
+        if self.sample_window["count"] == 0:
+            self._oversample()
+        window = self.sample_window
+        self.pressure_inputs = (window["sum"] / window["count"]).tolist()
+        self.sample_window = self._empty_window()
+
+    def _update_stats_registers(self):
+        window = self.request_window
+        count = window["count"]
+        for i in range(4):
+            mean = 0
+            if count:
+                mean = (int(window["sum"][i]) * self.STATS_MEAN_SCALE
+                        + count // 2) // count
+            self._set_ireg(self.STATS_MEAN_IREG + i, mean)
+            self._set_ireg(self.STATS_MIN_IREG + i,
+                           window["min"][i] if count else 0)
+            self._set_ireg(self.STATS_MAX_IREG + i, window["max"][i])
+        self._set_ireg(self.STATS_COUNT_IREG, count)
+        self.request_window = self._empty_window()
+
+    def _update_pressure_registers(self, now: int):
+        for i in range(4):
+            self._set_ireg(i, self.pressure_inputs[i] + 0.5)
+        self._set_ireg(self.TIMESTAMP_IREG, now >> 16)
+        self._set_ireg(self.TIMESTAMP_IREG + 1, now)
+
+    def _push_sample(self, time_ms: int):
+        if self.FIFO_HEAD_IREG not in self.input_registers:
+            return
+        self.sample_seq = (self.sample_seq + 1) & 0xFFFF
+        record = [self.sample_seq, time_ms >> 16, time_ms & 0xFFFF,
+                  *(int(p + 0.5) for p in self.pressure_inputs),
+                  self._ireg(self.STATUS_FLAGS_IREG) << 8
+                  | self._ireg(self.VALVE_MASK_IREG) & 0xFF]
+        base = (self.FIFO_BASE_IREG
+                + self.sample_seq % self.FIFO_SIZE * self.FIFO_RECORD_LENGTH)
+        for i, value in enumerate(record):
+            self._set_ireg(base + i, value)
+        self._set_ireg(self.FIFO_HEAD_IREG, self.sample_seq)
+
+    # Depressurise state machine
+
+    def _depressurise(self, now: float):
+        pressure = float(raw_to_bar(self.pressure_inputs[2]))
+        if self.vent_state != VENT_VENTING:
+            if pressure <= self.VENT_TARGET:
+                self._finish_vent(VENT_DONE)
+                return
+            self.vent_start = now
+            self.vent_start_pressure = pressure
+            self.vent_state = VENT_VENTING
+            for address in self.VALVE_COILS:
+                self.coils[address] = False
+            self.coils[OUT] = True
+            self.coils[SHORT] = True
+            self._set_ireg(self.VENT_STATE_IREG, self.vent_state)
+            self._set_ireg(self.VENT_PROGRESS_IREG, 0)
+            return
+
+        drop = self.vent_start_pressure - self.VENT_TARGET
+        progress = int(100 * (self.vent_start_pressure - pressure) / drop)
+        self._set_ireg(self.VENT_PROGRESS_IREG, min(max(progress, 0), 100))
+        if pressure <= self.VENT_TARGET:
+            self._finish_vent(VENT_DONE)
+        elif now - self.vent_start > self.VENT_TIMEOUT:
+            self._finish_vent(VENT_TIMED_OUT)
+
+    def _finish_vent(self, state: int):
+        for address in self.VALVE_COILS:
+            self.coils[address] = False
+        self.coils[self.DEPRESSURISE_COIL] = False
+        self.vent_state = state
+        self._set_ireg(self.VENT_STATE_IREG, state)
+        if state == VENT_DONE:
+            self._set_ireg(self.VENT_PROGRESS_IREG, 100)
@@ -0,0 +1,180 @@
+import time
+import unittest
+
+from arduinoController import ArduinoController, ValveStateCache
+from modbusTransport import ModbusTransport
+
+
+class TestValveStateCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ValveStateCache()
+
+    # Test a masked request - 2 leaves a valve as it was
+    def test_request(self):
+        self.cache.request([1, 1, 0, 0, 0, 0, 0, 0])
+        target = self.cache.request([2, 0, 1, 2, 2, 2, 2, 2])
+        self.assertEqual(target, [1, 0, 1, 0, 0, 0, 0, 0])
+        self.assertTrue(self.cache.pending)
+        self.assertEqual(self.cache.pending_target(), (target, 2))
+
+    # Test a write landing - confirms the states, nothing left to write
+    def test_written(self):
+        target = self.cache.request([1, 0, 0, 0, 0, 0, 0, 0])
+        self.cache.written(target, 1)
+        self.assertFalse(self.cache.pending)
+        self.assertEqual(self.cache.states, target)
+        self.assertEqual(self.cache.pending_target(), (None, 1))
+
+    # An older write landing after a newer request leaves it pending
+    def test_written_out_of_date(self):
+        first = self.cache.request([1, 0, 0, 0, 0, 0, 0, 0])
+        self.cache.request([0, 1, 2, 2, 2, 2, 2, 2])
+        self.cache.written(first, 1)
+        self.assertTrue(self.cache.pending)
+
+    # Test a reconcile - agreeing reads and reads while writing are accepted
+    def test_reconcile(self):
+        target = self.cache.request([1, 0, 0, 0, 0, 0, 0, 0])
+        # Read before the write landed, the target stands
+        self.assertTrue(self.cache.reconcile([0] * 8))
+        self.assertEqual(self.cache.target, target)
+        self.cache.written(target, 1)
+        self.assertTrue(self.cache.reconcile(target))
+        self.assertEqual(self.cache.mismatches, 0)
+
+    # A read that disagrees once nothing is pending wins over the cache
+    def test_reconcile_mismatch(self):
+        self.assertFalse(self.cache.reconcile([0, 0, 0, 0, 0, 0, 0, 1]))
+        self.assertEqual(self.cache.mismatches, 1)
+        self.assertEqual(self.cache.target, [0, 0, 0, 0, 0, 0, 0, 1])
+        self.assertTrue(self.cache.reconcile([0, 0, 0, 0, 0, 0, 0, 1]))
+
+    def test_cancel_pending(self):
+        self.cache.request([1, 1, 1, 1, 1, 1, 1, 1])
+        self.cache.cancel_pending()
+        self.assertFalse(self.cache.pending)
+        self.assertEqual(self.cache.target, [0] * 8)
+
+    # After a reset the target is written again
+    def test_resend(self):
+        target = self.cache.request([1, 0, 0, 0, 0, 0, 0, 0])
+        self.cache.written(target, 1)
+        self.cache.resend()
+        self.assertEqual(self.cache.pending_target(), (target, 2))
+
+
+class _FifoArduino:
+    """Input registers of the firmware sample FIFO, without the serial line."""
+
+    def __init__(self, seq: int, period: int):
+        self.seq = seq
+        self.period = period
+        length = ArduinoController.FIFO_SIZE * ArduinoController.FIFO_RECORD_LENGTH
+        self.registers = [0] * (ArduinoController.FIFO_BASE_ADDRESS + length)
+        self.reads = []
+
+    def push(self, count: int):
+        # Store each record in its slot, as the firmware does
+        for _ in range(count):
+            self.seq = (self.seq + 1) & 0xFFFF
+            millis = self.seq * self.period
+            record = [self.seq, millis >> 16, millis & 0xFFFF,
+                      *[self.seq % 1024] * 4, 0b11]
+            base = (ArduinoController.FIFO_BASE_ADDRESS
+                    + self.seq % ArduinoController.FIFO_SIZE
+                    * ArduinoController.FIFO_RECORD_LENGTH)
+            self.registers[base:base + len(record)] = record
+
+    def read_registers(self, address, count, functioncode=3):
+        self.reads.append((address, count))
+        if address + count > len(self.registers):
+            raise IOError("Illegal data address")
+        return self.registers[address:address + count]
+
+
+class TestDrainSamples(unittest.TestCase):
+
+    PERIOD = 50
+
+    def start(self, seq):
+        self.arduino = _FifoArduino(seq, self.PERIOD)
+        self.controller = ArduinoController(
+            "TEST", verbose=False, mode=0, transport=ModbusTransport())
+        self.controller.arduino = self.arduino  # type: ignore
+        self.controller.fifo_supported = True
+        self.controller.sample_period = self.PERIOD
+        self.controller._last_seq = seq
+
+    def drain(self, count):
+        # Drain as if count sample periods had passed since the last one
+        self.arduino.push(count)
+        self.controller._last_drain = (time.perf_counter()
+                                       - count * self.PERIOD / 1000)
+        samples = self.controller.drain_samples()
+        assert samples is not None, "drain failed"
+        return samples
+
+    def seqs(self, samples):
+        return [sample.firmware_time // self.PERIOD & 0xFFFF
+                for sample in samples]
+
+    # Test a drain - every new sample, in order, in one read
+    def test_drain(self):
+        self.start(100)
+        samples = self.drain(5)
+        self.assertEqual(self.seqs(samples), [101, 102, 103, 104, 105])
+        self.assertEqual(len(self.arduino.reads), 1)
+        self.assertEqual(samples[-1].valve_states[:2], [1, 1])
+        self.assertFalse(any(sample.gap_before for sample in samples))
+        self.assertEqual(self.drain(0), [])
+
+    # Test the wrap - across the end of the ring and of the 16-bit sequence
+    def test_wrap(self):
+        self.start(0xFFFF - 3)
+        seqs = []
+        for _ in range(6):
+            seqs += self.seqs(self.drain(3))
+        expected = [(0xFFFF - 3 + i) & 0xFFFF for i in range(1, 19)]
+        self.assertEqual(seqs, expected)
+        self.assertEqual(self.controller.lost_samples, 0)
+
+    # A run past the last slot is read in two parts, still in order
+    def test_split_read(self):
+        self.start(ArduinoController.FIFO_SIZE - 3)
+        samples = self.drain(6)
+        self.assertEqual(self.seqs(samples), list(range(14, 20)))
+        base = ArduinoController.FIFO_BASE_ADDRESS
+        length = ArduinoController.FIFO_RECORD_LENGTH
+        # Slots 14-15, then 0-5 as the estimate asks for two spare records
+        self.assertEqual(self.arduino.reads,
+                         [(base + 14 * length, 2 * length),
+                          (base, 6 * length)])
+
+    # Test a stall - overwritten samples are counted and the gap marked
+    def test_lost_samples(self):
+        self.start(10)
+        samples = self.drain(ArduinoController.FIFO_SIZE + 4)
+        seqs = self.seqs(samples)
+        self.assertEqual(seqs, list(range(seqs[0], seqs[0] + len(samples))))
+        self.assertEqual(self.controller.lost_samples, seqs[0] - 11)
+        self.assertGreaterEqual(self.controller.lost_samples, 4)
+        self.assertTrue(samples[0].gap_before)
+        # The next drain carries on from where this one stopped
+        rest = self.controller.drain_samples()
+        assert rest is not None, "drain failed"
+        self.assertEqual(self.seqs(rest)[0], seqs[-1] + 1)
+        self.assertFalse(rest[0].gap_before)
+
+    # Test the drain limit - one read stays within DRAIN_TIME at 9600 baud
+    def test_drain_limit(self):
+        self.start(0)
+        limit = self.controller.drain_limit()
+        self.drain(ArduinoController.FIFO_SIZE - 1)
+        _, count = self.arduino.reads[0]
+        self.assertEqual(count, limit * ArduinoController.FIFO_RECORD_LENGTH)
+        self.assertLessEqual(count, 125)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import threading
+import time
+import unittest
+
+from modbusTransport import DeadlineExceeded, ModbusTransport, Priority
+
+PORT = "TEST"
+
+
+class TestModbusTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = ModbusTransport()
+        self.calls = []
+        # Holds the port busy so the requests after it queue up
+        self.release = threading.Event()
+        self.busy = self.transport.submit(PORT, self.release.wait, 5)
+
+    def tearDown(self):
+        self.release.set()
+        self.transport.close()
+
+    def call(self, name):
+        self.calls.append(name)
+        return name
+
+    def submit(self, name, **kwargs):
+        return self.transport.submit(PORT, self.call, name, **kwargs)
+
+    def run_queued(self, futures):
+        self.release.set()
+        return [future.result(timeout=5) for future in futures]
+
+    # Test the priority - most urgent first, submission order within a class
+    def test_priority(self):
+        futures = [self.submit("poll 1"),
+                   self.submit("toggle", priority=Priority.USER),
+                   self.submit("poll 2"),
+                   self.submit("vent", priority=Priority.EMERGENCY),
+                   self.submit("step", priority=Priority.SEQUENCE)]
+        self.run_queued(futures)
+        self.assertEqual(self.calls,
+                         ["vent", "step", "toggle", "poll 1", "poll 2"])
+
+    # Test coalescing - a burst with one key makes only the newest call
+    def test_coalesce(self):
+        futures = [self.submit(f"write {i}", key="valves") for i in range(5)]
+        results = self.run_queued(futures)
+        self.assertEqual(self.calls, ["write 4"])
+        self.assertEqual(results, ["write 4"] * 5)
+        self.assertEqual(self.transport.coalesced(PORT), 4)
+
+    # A merged request keeps the more urgent priority
+    def test_coalesce_priority(self):
+        futures = [self.submit("poll"),
+                   self.submit("read", key="coils"),
+                   self.submit("read now", key="coils",
+                               priority=Priority.USER)]
+        self.run_queued(futures)
+        self.assertEqual(self.calls, ["read now", "poll"])
+
+    # A request that has started is not replaced
+    def test_no_coalesce_once_started(self):
+        self.release.set()
+        self.busy.result(timeout=5)
+        started = threading.Event()
+        finish = threading.Event()
+        first = self.transport.submit(
+            PORT, lambda: (started.set(), finish.wait(5)), key="valves")
+        self.assertTrue(started.wait(5))
+        second = self.submit("write", key="valves")
+        finish.set()
+        first.result(timeout=5)
+        self.assertEqual(second.result(timeout=5), "write")
+        self.assertEqual(self.transport.coalesced(PORT), 0)
+
+    # Test the deadline - a request still waiting when it passes is dropped
+    def test_deadline(self):
+        late = self.submit("late", deadline=time.perf_counter() + 0.01)
+        on_time = self.submit("on time", deadline=time.perf_counter() + 5)
+        time.sleep(0.05)
+        self.release.set()
+        with self.assertRaises(DeadlineExceeded):
+            late.result(timeout=5)
+        self.assertEqual(on_time.result(timeout=5), "on time")
+        self.assertEqual(self.calls, ["on time"])
+
+    # Errors reach the caller through the future
+    def test_exception(self):
+        def fail():
+            raise OSError("port gone")
+        future = self.transport.submit(PORT, fail)
+        self.release.set()
+        with self.assertRaises(OSError):
+            future.result(timeout=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import math
+import unittest
+
+import numpy as np
+
+from motionProfile import MotionProfile, plan_motion
+from sequenceCompiler import compile_sequence
+
+VALVE_SETTINGS = {
+    'd': [0, 0, 0, 0, 0, 2, 2, 2],
+    'b': [2, 1, 1, 1, 0, 2, 2, 2],
+}
+
+
+class TestMotionProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.profile = MotionProfile(max_velocity=4000, acceleration=20000,
+                                     steps_per_mm=6400)
+
+    # Test a long move - reaches full speed, trapezoidal
+    def test_move_time_trapezoid(self):
+        # 800 steps to reach 4000 steps/s and stop again
+        self.assertAlmostEqual(float(self.profile.move_time(6400)),
+                               6400 / 4000 + 4000 / 20000)
+        self.assertAlmostEqual(float(self.profile.move_time(800)), 0.4)
+
+    # Test a short move - never reaches full speed, triangular
+    def test_move_time_triangle(self):
+        self.assertAlmostEqual(float(self.profile.move_time(200)),
+                               2 * math.sqrt(200 / 20000))
+        self.assertEqual(float(self.profile.move_time(0)), 0.0)
+
+    def test_move_time_vectorised(self):
+        distances = np.array([-6400, 200, 6400])
+        times = self.profile.move_time(distances)
+        self.assertEqual(times.shape, (3,))
+        self.assertAlmostEqual(times[0], times[2])
+        self.assertAlmostEqual(self.profile.move_time_mm(1.0), times[2])
+
+    # Test the position - starts, ends and passes the midpoint on time
+    def test_position(self):
+        total = float(self.profile.move_time(6400))
+        t = np.array([-1.0, 0.0, total / 2, total, total + 1])
+        positions = self.profile.position(1000, 7400, t)
+        np.testing.assert_allclose(positions, [1000, 1000, 4200, 7400, 7400])
+        # Backwards moves mirror forwards ones
+        np.testing.assert_allclose(self.profile.position(7400, 1000, t),
+                                   [7400, 7400, 4200, 1000, 1000])
+
+    def test_position_monotonic(self):
+        t = np.linspace(0, float(self.profile.move_time(300)), 50)
+        self.assertTrue(np.all(np.diff(self.profile.position(0, 300, t)) >= 0))
+
+    # The scalar form used by the planner agrees with the array form
+    def test_scalar_move(self):
+        for d in (200.0, 6400.0):
+            total, travelled = self.profile._scalar_move(d, 0.1)
+            self.assertAlmostEqual(total, float(self.profile.move_time(d)))
+            self.assertAlmostEqual(
+                travelled, float(self.profile.position(0, d, 0.1)))
+
+
+class TestPlanMotion(unittest.TestCase):
+
+    def setUp(self):
+        self.profile = MotionProfile(max_velocity=4000, acceleration=20000,
+                                     steps_per_mm=6400)
+
+    # Test a feasible plan - every move fits in its step
+    def test_feasible(self):
+        program = compile_sequence("Md2000m1b2000m-1d2000m0", VALVE_SETTINGS)
+        plan = plan_motion(program, self.profile)
+        self.assertTrue(plan.feasible)
+        self.assertAlmostEqual(plan.move_times[0], 1800)
+        # A negative target leaves the motor where it is
+        self.assertEqual(plan.move_times[1], 0)
+        self.assertEqual(plan.targets.tolist(), [1, 1, 0])
+        self.assertEqual(plan.start_positions.tolist(), [0, 1, 1])
+
+    # Test an infeasible plan - found, and padded when asked
+    def test_infeasible(self):
+        program = compile_sequence("Md500m1b500m0", VALVE_SETTINGS)
+        plan = plan_motion(program, self.profile)
+        self.assertFalse(plan.feasible)
+        self.assertEqual(plan.infeasible.tolist(), [0, 1])
+        padded = plan_motion(program, self.profile, pad=True)
+        self.assertTrue(padded.feasible)
+        self.assertEqual(padded.durations.tolist(), [1800, 1800])
+
+    # Test the trace - follows the planned moves
+    def test_trace(self):
+        program = compile_sequence("Md2000m1d2000m0", VALVE_SETTINGS)
+        times, positions = plan_motion(program, self.profile).trace(rate=10)
+        self.assertEqual(len(times), 40)
+        self.assertAlmostEqual(positions[0], 0)
+        self.assertAlmostEqual(positions[19], 1)
+        self.assertAlmostEqual(positions[39], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
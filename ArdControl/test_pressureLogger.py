@@ -0,0 +1,86 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from arduinoController import ArduinoSnapshot
+from pressureLogger import (BinaryPressureLogger, PressureLogger,
+                            export_csv, load_recording)
+
+
+def snapshot(i, gap_before=False):
+    return ArduinoSnapshot(pressures=[i, i + 1, i + 2, i + 3],
+                           valve_states=[1, 0, 1, 0, 0, 0, 0, 0],
+                           host_time_ns=1_000_000_000 + i * 50_000_000,
+                           gap_before=gap_before)
+
+
+class TestBinaryPressureLogger(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "recording.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, count, batch_size=500):
+        logger = BinaryPressureLogger(self.path, batch_size=batch_size)
+        logger.start()
+        for i in range(count):
+            self.assertTrue(logger.log(snapshot(i, gap_before=i == 3),
+                                       [i * 0.5] * 4, step=i % 3,
+                                       motor_position=i * 0.25))
+        logger.close()
+        self.assertEqual(logger.written, count)
+        self.assertEqual(logger.dropped, 0)
+
+    # Test the round trip - every column reads back as written
+    def test_round_trip(self):
+        self.record(10, batch_size=4)
+        header, records = load_recording(self.path)
+        self.assertEqual(header["version"], BinaryPressureLogger.VERSION)
+        self.assertEqual(records.dtype, BinaryPressureLogger.RECORD_DTYPE)
+        self.assertEqual(len(records), 10)
+        i = np.arange(10)
+        np.testing.assert_array_equal(records["time_ns"],
+                                      1_000_000_000 + i * 50_000_000)
+        np.testing.assert_array_equal(records["raw"][:, 3], i + 3)
+        np.testing.assert_array_equal(records["pressure"][:, 0], i * 0.5)
+        np.testing.assert_array_equal(records["valves"], 0b101)
+        np.testing.assert_array_equal(records["step"], i % 3)
+        np.testing.assert_array_equal(records["motor_position"], i * 0.25)
+        np.testing.assert_array_equal(
+            records["flags"], np.where(i == 3, BinaryPressureLogger.FLAG_GAP, 0))
+
+    # Test a crash mid-write - the partial last record is ignored
+    def test_partial_record(self):
+        self.record(5)
+        with open(self.path, "ab") as f:
+            f.write(b"\x00" * (BinaryPressureLogger.RECORD_DTYPE.itemsize // 2))
+        _, records = load_recording(self.path)
+        self.assertEqual(len(records), 5)
+
+    def test_not_a_recording(self):
+        with open(self.path, "w") as f:
+            f.write("Time, Pressure 1\n")
+        with self.assertRaises(ValueError):
+            load_recording(self.path)
+
+    # Test the export - CSV layout of PressureLogger, with the gap marked
+    def test_export_csv(self):
+        self.record(5)
+        with open(export_csv(self.path), newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], PressureLogger.HEADER)
+        # One row per reading, and an empty row before the gap
+        self.assertEqual(len(rows), 1 + 5 + 1)
+        self.assertEqual(rows[4][1:], ["", "", "", ""])
+        self.assertEqual(rows[5][1:], ["1.5"] * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
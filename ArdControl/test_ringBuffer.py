@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+
+from ringBuffer import RingBuffer
+
+
+class TestRingBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = RingBuffer(capacity=8, channels=4)
+
+    def fill(self, count):
+        for i in range(count):
+            self.buffer.append(i * 1000, [i] * 4, [i * 0.5] * 4, i & 0xFF)
+
+    def test_latest(self):
+        self.fill(5)
+        start, timestamps, raw, pressures, masks = self.buffer.latest(3)
+        self.assertEqual(start, 2)
+        self.assertEqual(timestamps.tolist(), [2000, 3000, 4000])
+        self.assertEqual(raw[:, 0].tolist(), [2, 3, 4])
+        self.assertEqual(pressures[:, 3].tolist(), [1.0, 1.5, 2.0])
+        self.assertEqual(masks.tolist(), [2, 3, 4])
+        self.assertEqual(len(self.buffer), 5)
+
+    # Test the wrap - only the newest capacity samples are kept, in order
+    def test_wrap(self):
+        self.fill(20)
+        self.assertEqual(len(self.buffer), 8)
+        start, timestamps, _, _, _ = self.buffer.latest(100)
+        self.assertEqual(start, 12)
+        self.assertEqual(timestamps.tolist(), list(range(12000, 20000, 1000)))
+
+    # Test since - samples already overwritten are skipped
+    def test_since_overwritten(self):
+        self.fill(20)
+        start, timestamps, _, _, _ = self.buffer.since(5)
+        self.assertEqual(start, 12)
+        self.assertEqual(len(timestamps), 8)
+        start, timestamps, _, _, _ = self.buffer.since(15, 18)
+        self.assertEqual(start, 15)
+        self.assertEqual(timestamps.tolist(), [15000, 16000, 17000])
+
+    # Rows the writer laps during a copy are dropped from the result
+    def test_lapped_during_copy(self):
+        self.fill(8)
+        end = self.buffer.count
+        self.fill(3)  # Stands in for writes while the reader was copying
+        start, timestamps, _, _, _ = self.buffer.since(0, end)
+        self.assertEqual(start, 3)
+        self.assertTrue(np.all(np.diff(timestamps) > 0))
+        self.assertEqual(len(timestamps), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+import numpy as np
+
+from sequenceCompiler import SequenceError, compile_sequence
+
+VALVE_SETTINGS = {
+    'd': [0, 0, 0, 0, 0, 2, 2, 2],
+    'n': [1, 1, 1, 1, 1, 2, 2, 2],
+    'e': [0, 0, 0, 0, 0, 2, 2, 2],
+    'b': [2, 1, 1, 1, 0, 2, 2, 2],
+    's': [2, 2, 2, 0, 0, 2, 2, 2],
+    'h': [2, 0, 0, 0, 0, 2, 2, 2]
+}
+
+
+class TestCompileSequence(unittest.TestCase):
+
+    def assertErrorAt(self, sequence, position, message):
+        with self.assertRaises(SequenceError) as context:
+            compile_sequence(sequence, VALVE_SETTINGS)
+        self.assertEqual(context.exception.position, position)
+        self.assertIn(message, str(context.exception))
+
+    # Test a valve only sequence - types, durations and valve masks
+    def test_compile(self):
+        program = compile_sequence("d100e200b5000", VALVE_SETTINGS)
+        self.assertEqual(len(program), 3)
+        self.assertFalse(program.motor_flag)
+        self.assertEqual([program.step_type(i) for i in range(3)],
+                         ['d', 'e', 'b'])
+        self.assertEqual(program.durations.tolist(), [100, 200, 5000])
+        self.assertEqual(program.total_time, 5300)
+        self.assertEqual(program.motor_positions.tolist(), [0, 0, 0])
+        self.assertEqual(program.valve_states(2), VALVE_SETTINGS['b'])
+
+    # Test a motor sequence - targets are optional on each step
+    def test_compile_motor(self):
+        program = compile_sequence("Md100m5b500m-5e200", VALVE_SETTINGS)
+        self.assertTrue(program.motor_flag)
+        self.assertEqual(program.durations.tolist(), [100, 500, 200])
+        self.assertEqual(program.motor_positions.tolist(), [5, -5, 0])
+
+    # The motor flag may sit anywhere, even inside a step
+    def test_motor_flag_placement(self):
+        for sequence in ("Md100b500m-5", "d100b500Mm-5", "d100b5M00m-5",
+                         "d100b500m-5M"):
+            program = compile_sequence(sequence, VALVE_SETTINGS)
+            self.assertTrue(program.motor_flag)
+            self.assertEqual(program.durations.tolist(), [100, 500])
+            self.assertEqual(program.motor_positions.tolist(), [0, -5])
+
+    # Error positions count the motor flag, pointing into the file as written
+    def test_error_position_after_motor_flag(self):
+        self.assertErrorAt("MMd100x200", 6, "Invalid step type 'x'")
+        self.assertErrorAt("d100Mm-e200", 6, "Invalid motor position")
+        self.assertErrorAt("d100eMb200", 6, "Invalid time length")
+
+    # Test the error positions - each points at the offending character
+    def test_invalid_step_type(self):
+        self.assertErrorAt("d100x200", 4, "Invalid step type 'x'")
+
+    def test_trailing_character(self):
+        self.assertErrorAt("d100e200!", 8, "Invalid step type '!'")
+
+    def test_invalid_time_length(self):
+        self.assertErrorAt("d100e", 5, "Invalid time length")
+        self.assertErrorAt("d100e0b5", 5, "Invalid time length")
+
+    def test_invalid_motor_position(self):
+        self.assertErrorAt("Md100m-e200", 6, "Invalid motor position")
+        self.assertErrorAt("Md100me200", 6, "Invalid motor position")
+
+    # Without the motor flag an 'm' is not part of any step
+    def test_motor_position_without_flag(self):
+        self.assertErrorAt("d100m5", 4, "Invalid step type 'm'")
+
+    def test_empty(self):
+        self.assertErrorAt("", 0, "Sequence has no steps")
+        self.assertErrorAt("M", 0, "Sequence has no steps")
+
+    # Test a long sequence - compiles into arrays of the full length
+    def test_long_sequence(self):
+        program = compile_sequence("d100e200" * 5000, VALVE_SETTINGS)
+        self.assertEqual(len(program), 10000)
+        self.assertEqual(program.total_time, 1_500_000)
+        self.assertTrue(np.all(program.codes[1::2] == program.codes[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
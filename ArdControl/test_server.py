@@ -1,254 +1,227 @@
-import unittest
-from unittest import mock
-from unittest.mock import patch, MagicMock, mock_open
+import sys
 import time
+import unittest
 import logging
-import serial
-import os
-from arduinoController import ArduinoController
+
+import numpy as np
+
+from arduinoController import ArduinoController, VentState
+from motorController import MotorController
+from modbusTransport import ModbusTransport
+from simulator import GasModel, MotorFirmware, MotorModel, ValveFirmware
 
 # Configure logging to capture error logs for the tests
 logging.basicConfig(level=logging.ERROR)
 
+# Fast enough that calibrating and moving take well under two seconds
+SPEEDUP = 200
+
+
+def poll(read, done, timeout=5.0, interval=0.1):
+    """Call read until done(result) or timeout, returning the last result."""
+    end = time.monotonic() + timeout
+    result = read()
+    while not done(result) and time.monotonic() < end:
+        time.sleep(interval)
+        result = read()
+    return result
 
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "needs pseudo-terminals")
 class TestArduinoController(unittest.TestCase):
 
-    # Set up the test
+    # Start one simulated Arduino and connect to it
+    @classmethod
+    def setUpClass(cls):
+        cls.firmware = ValveFirmware(GasModel(supply=8.0), seed=0)
+        cls.firmware.start()
+        cls.transport = ModbusTransport()
+        cls.controller = ArduinoController(
+            cls.firmware.port, verbose=False, mode=0, transport=cls.transport)
+        cls.controller.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.transport.close()
+        cls.firmware.close()
+
+    # Reads that must succeed, failing the test otherwise
+    def snapshot(self):
+        snapshot = self.controller.get_snapshot()
+        assert snapshot is not None, "snapshot read failed"
+        return snapshot
+
+    def drain(self):
+        samples = self.controller.drain_samples()
+        assert samples is not None, "drain failed"
+        return samples
+
+    # Start each test with every valve closed and the lines empty
     def setUp(self):
-        self.port = 'COM3'
-        self.baudrate = 9600
-        self.verbose = True
-        self.mode = 0
-        self.controller = ArduinoController(self.port, self.verbose, self.mode)
-
-    # Test the initialization of the ArduinoController
-    def test_initialization(self):
-        self.assertEqual(self.controller.port, self.port)
-        self.assertEqual(self.controller.baudrate, self.baudrate)
-        self.assertEqual(self.controller.verbose, self.verbose)
-        self.assertEqual(self.controller.mode, self.mode)
-        self.assertIsNone(self.controller.arduino)
-        self.assertFalse(self.controller.serial_connected)
-        self.assertFalse(self.controller.shutdown_flag)
-        self.assertFalse(self.controller.save_pressure)
-        self.assertFalse(self.controller.new_reading)
-        self.assertAlmostEqual(
-            self.controller.last_heartbeat_time, time.time(), delta=1)
-        self.assertEqual(self.controller.heartbeat_time, 5)
-        self.assertFalse(self.controller.auto_control)
-        self.assertIsInstance(self.controller.commands_dict, dict)
-
-    # Test the serial connection to the Arduino - success
-    @patch('serial.Serial')
-    def test_connect_arduino_success(self, mock_serial):
-        mock_serial.return_value.is_open = True
-        self.controller.connect_arduino()
+        self.controller.set_valves([0] * 8)
+        with self.firmware.lock:
+            self.firmware.gas.pressures[1:] = 0.0
+
+    # Test the start function - configures the sample FIFO
+    def test_start(self):
         self.assertTrue(self.controller.serial_connected)
-        self.assertIsNotNone(self.controller.arduino)
-
-    # Test the serial connection to the Arduino - failure
-    @patch('serial.Serial')
-    def test_connect_arduino_failure(self, mock_serial):
-        mock_serial.side_effect = serial.SerialException
-        self.controller.connect_arduino()
-        self.assertFalse(self.controller.serial_connected)
-        self.assertIsNone(self.controller.arduino)
-
-    # Test the start function - successfully connected
-    @patch.object(ArduinoController, 'connect_arduino')
-    @patch.object(ArduinoController, 'start_heartbeat')
-    @patch.object(ArduinoController, 'start_reading')
-    def test_start(self, mock_start_reading, mock_start_heartbeat, mock_connect_arduino):
-        mock_connect_arduino.return_value = None
-        self.controller.serial_connected = True
-        self.controller.start()
-        mock_connect_arduino.assert_called_once()
-        mock_start_heartbeat.assert_called_once()
-        mock_start_reading.assert_called_once()
-
-    # Test the start functions activates heartbeat function
-    @patch('serial.Serial')
-    def test_start_heartbeat(self, mock_serial):
-        mock_serial_instance = mock_serial.return_value
-        mock_serial_instance.is_open = True
-        self.controller.arduino = mock_serial_instance
-        self.controller.serial_connected = True
-        self.controller.start_heartbeat()
-        self.assertTrue(self.controller.heartbeat_thread.is_alive())
-
-    # Test the start functions activates reading function
-    @patch('serial.Serial')
-    def test_start_reading(self, mock_serial):
-        mock_serial_instance = mock_serial.return_value
-        mock_serial_instance.is_open = True
-        self.controller.arduino = mock_serial_instance
-        self.controller.serial_connected = True
-        self.controller.start_reading()
-        self.assertTrue(self.controller.reading_thread.is_alive())
-
-    # Test the start function - not connected
-    @patch.object(ArduinoController, 'connect_arduino')
-    @patch.object(ArduinoController, 'start_heartbeat')
-    @patch.object(ArduinoController, 'start_reading')
-    def test_start_not_connected(self, mock_start_reading, mock_start_heartbeat, mock_connect_arduino):
-        mock_connect_arduino.return_value = None
-        self.controller.serial_connected = False
+        self.assertTrue(self.controller.fifo_supported)
+        self.assertFalse(self.controller.ttl_enabled)
+        self.assertEqual(self.firmware.holding_registers[0],
+                         ArduinoController.SAMPLE_PERIOD)
+
+    # Test the snapshot - valves, statistics and vent status in one read
+    def test_get_snapshot(self):
+        self.controller.set_valves([1, 0, 0, 0, 0, 0, 0, 0])
+        requests = self.firmware.requests
+        snapshot = self.snapshot()
+        self.assertEqual(self.firmware.requests, requests + 1)
+        self.assertEqual(snapshot.valve_states, [1, 0, 0, 0, 0, 0, 0, 0])
+        self.assertFalse(snapshot.ttl)
+        self.assertEqual(snapshot.vent_state, VentState.IDLE)
+        stats = snapshot.stats
+        assert stats is not None and stats.mean_mbar is not None
+        self.assertGreater(stats.count, 0)
+        # The supply gauge reads the regulated pressure
+        self.assertAlmostEqual(stats.mean_mbar[0], 8.0, delta=0.05)
+        self.assertTrue(np.all(stats.minimum <= stats.maximum))
+
+    # Test the valves - building pressure fills the tube
+    def test_set_valves_builds_pressure(self):
+        self.controller.set_valves([0, 1, 1, 0, 0, 0, 0, 0])
+        snapshot = poll(self.snapshot, lambda s: s.mbar[2] > 4.0)
+        assert snapshot.mbar is not None
+        self.assertGreater(snapshot.mbar[2], 4.0)
+        self.assertEqual(self.controller.valve_cache.target[:3], [0, 1, 1])
+
+    # Test the FIFO drain - every sample arrives, in order
+    def test_drain_samples(self):
+        self.controller.configure_fifo(self.controller.SAMPLE_PERIOD)
+        lost = self.controller.lost_samples
+        samples = []
+        for _ in range(8):
+            time.sleep(0.25)
+            samples += self.drain()
+        times = np.array([s.firmware_time for s in samples])
+        self.assertGreater(len(samples), 30)
+        self.assertEqual(self.controller.lost_samples, lost)
+        self.assertTrue(np.all(np.diff(times) == self.controller.sample_period))
+        self.assertFalse(any(s.gap_before for s in samples))
+
+    # Test the vent - the firmware keeps answering while it depressurises
+    def test_send_depressurise(self):
+        with self.firmware.lock:
+            self.firmware.gas.pressures[1:] = [6.0, 6.0, 0.0]
+        self.controller.configure_fifo(self.controller.SAMPLE_PERIOD)
+        time.sleep(0.25)
+        self.drain()
+        self.controller.send_depressurise()
+        states = []
+        samples = []
+        for _ in range(40):
+            time.sleep(0.25)
+            samples = self.drain()
+            self.assertTrue(self.controller.serial_connected)
+            states.append(samples[-1].vent_state)
+            if samples[-1].vent_state != VentState.VENTING:
+                break
+        self.assertIn(VentState.VENTING, states)
+        self.assertEqual(states[-1], VentState.DONE)
+        self.assertEqual(self.controller.vent_progress, 100)
+        self.assertLess(samples[-1].mbar[2], 0.15)
+        self.assertEqual(samples[-1].valve_states, [0] * 8)
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "needs pseudo-terminals")
+class TestArduinoControllerLegacy(unittest.TestCase):
+
+    # Test the fallbacks - firmware without snapshot, statistics, vent or FIFO
+    def test_legacy_firmware(self):
+        firmware = ValveFirmware(snapshot=False, stats=False, vent=False,
+                                 fifo=False)
+        firmware.start()
+        transport = ModbusTransport()
+        try:
+            controller = ArduinoController(
+                firmware.port, verbose=False, mode=0, transport=transport)
+            controller.start()
+            self.assertTrue(controller.serial_connected)
+            self.assertFalse(controller.fifo_supported)
+            controller.set_valves([1, 1, 0, 0, 0, 0, 0, 0])
+            snapshot = controller.get_snapshot()
+            assert snapshot is not None
+            self.assertFalse(controller.snapshot_supported)
+            self.assertIsNone(snapshot.stats)
+            self.assertEqual(snapshot.valve_states[:3], [1, 1, 0])
+        finally:
+            transport.close()
+            firmware.close()
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "needs pseudo-terminals")
+class TestMotorController(unittest.TestCase):
+
+    # Start a simulated motor board with a fast motor
+    def start(self, **kwargs):
+        self.firmware = MotorFirmware(MotorModel(speedup=SPEEDUP), **kwargs)
+        self.firmware.start()
+        self.transport = ModbusTransport()
+        self.controller = MotorController(self.firmware.port,
+                                          transport=self.transport)
         self.controller.start()
-        mock_connect_arduino.assert_called_once()
-        mock_start_heartbeat.assert_not_called()
-        mock_start_reading.assert_not_called()
-
-    # Test sending a valid command to the Arduino
-    @patch('serial.Serial')
-    def test_send_command_valid(self, mock_serial):
-        mock_serial_instance = mock_serial.return_value
-        mock_serial_instance.is_open = True
-        self.controller.arduino = mock_serial_instance
-        self.controller.serial_connected = True
-
-        command = "HEARTBEAT"
-        self.controller.send_command(command)
-        mock_serial_instance.write.assert_called_with(b'y')
-
-    # Test sending an invalid command string to the Arduino
-    @patch('serial.Serial')
-    def test_send_command_invalid(self, mock_serial):
-        mock_serial_instance = mock_serial.return_value
-        mock_serial_instance.is_open = True
-        self.controller.arduino = mock_serial_instance
-        self.controller.serial_connected = True
-
-        command = "INVALID_COMMAND"
-        self.controller.send_command(command)
-        self.controller.arduino.write.assert_not_called()
-
-    @patch('serial.Serial')
-    @patch('time.sleep', return_value=None)
-    def test_heartbeat(self, mock_sleep, mock_serial):
-        mock_serial_instance = mock_serial.return_value
-        mock_serial_instance.is_open = True
-        self.controller.arduino = mock_serial_instance
-        self.controller.serial_connected = True
-
-        self.controller.start_heartbeat()
-        # Ensure time.sleep is called with 3 seconds
-        mock_sleep.assert_called_with(3)
-
-        self.controller.arduino.write.assert_called_with(
-            self.controller.commands_dict["HEARTBEAT"].encode())
-
-        # Ensure time.sleep is called with 3 seconds
-        mock_sleep.assert_called_with(3)
-
-        self.controller.arduino.write.assert_called_with(
-            self.controller.commands_dict["HEARTBEAT"].encode())
-
-    @patch('time.time', return_value=1234567890)
-    def test_process_response_heartbeat_ack(self, mock_time):
-        response = "HEARTBEAT_ACK"
-        self.controller.process_response(response)
-        self.assertEqual(self.controller.last_heartbeat_time, 1234567890)
-
-    def test_process_response_pressure_reading(self):
-        response = "P 1013 1014 1015 1016 1 1 1 1 1 1 0 1 C"
-        self.controller.process_response(response)
-
-        expected_pressure_values = ["1013", "1014", "1015", "1016"]
-        expected_valve_states = ["1", "1",
-                                 "1", "1", "1", "1", "0", "1"]
-
-        self.assertEqual(self.controller.pressure_values,
-                         expected_pressure_values)
-        self.assertEqual(self.controller.valve_states, expected_valve_states)
-        self.assertTrue(self.controller.new_reading)
-        self.assertEqual(
-            self.controller.readings[-1], expected_pressure_values + expected_valve_states)
-
-    @patch('logging.info')
-    def test_process_response_log_message(self, mock_logging_info):
-        response = "LOG: This is a test log message"
-        self.controller.process_response(response)
-
-        # Check if logging.info was called with the correct message
-        mock_logging_info.assert_called_with("Ard: This is a test log message")
-
-    @patch('logging.warning')
-    def test_process_response_unknown(self, mock_logging_warning):
-        response = "UNKNOWN_RESPONSE"
-        self.controller.process_response(response)
-
-        # Check if logging.warning was called with the correct message
-        mock_logging_warning.assert_called_with(
-            "Unknown response: UNKNOWN_RESPONSE")
-
-    # Test that the controller stops the threads and closes the serial connection when heartbeat times out
-    @patch.object(ArduinoController, 'connect_arduino')
-    @patch.object(ArduinoController, 'start_heartbeat')
-    @patch.object(ArduinoController, 'start_reading')
-    @patch.object(ArduinoController, 'stop')
-    @patch('serial.Serial')
-    @patch('time.time', return_value=1234567890)
-    def test_heartbeat_timeout(self, mock_start_reading, mock_start_heartbeat, mock_connect_arduino, mock_stop, mock_serial, mock_time):
-        mock_connect_arduino.return_value = mock_serial
-        self.controller.serial_connected = True
-        self.controller.start()
-        self.controller.last_heartbeat_time = time.time() - 10
-
-        # Act
-        # This should trigger the stop method due to heartbeat timeout
-        self.controller.start_reading()
-
-        # Assert
-        mock_stop.assert_called()
-
-        self.controller.stop()
-
-    @patch("builtins.open", new_callable=mock_open)
-    @patch("os.path.exists", side_effect=[False, True])
-    @patch("os.makedirs")
-    def test_save_pressure_data_creates_file(self, mock_exists, mock_open, mock_makedirs):
-        # Arrange
-        file_path = "pressure_data.csv"
-        self.controller.save_pressure_data(True, "pressure data.csv")
-
-        # Act
-        file_created = os.path.exists(file_path)
-        self.controller.save_pressure_data(False, "pressure data.csv")
-        self.controller.stop()
-
-        # Assert
-        mock_open.assert_called_with(file_path)
-        self.assertTrue(file_created)
-
-    @patch("builtins.open", new_callable=mock_open)
-    @patch("os.path.exists", side_effect=[False, True])
-    @patch("os.makedirs")
-    @patch("time.time", return_value=1234567890)
-    @patch("csv.writer")
-    @patch("serial.Serial")
-    def test_save_pressure_data_to_csv(self, mock_makedirs, mock_exists, mock_open, mock_time, mock_writer, mock_serial):
-
-        # Arrange
-        file_path = "pressure_data.csv"
-        self.controller.pressure_values = [1013, 1014, 1015, 1016]
-        self.controller.valve_states = [1, 1, 1, 1, 1, 1, 0, 1]
-
-        # Mock in_waiting attribute as an integer
-
-        # Act
-        self.controller.save_pressure_data(True, file_path)
-
-        # Assert
-        mock_makedirs.assert_called_once_with("C:\\NMR Results")
-        mock_open.assert_called_once_with(file_path, 'w')
-        mock_writer.return_value.writerow.assert_called_once_with(
-            ['1234567890', '1013', '1014', '1015', '1016', '1', '1', '1', '1', '1', '1', '0', '1'])
-        self.assertEqual(self.controller.pressure_data_filepath,
-                         "C:\\NMR Results\\pressure_data.csv")
-        self.controller.pressure_data_thread.start.assert_called_once()
-
-        self.controller.save_pressure_data(False, file_path)
-        self.controller.stop()
+        self.assertTrue(self.controller.serial_connected)
+
+    def tearDown(self):
+        self.transport.close()
+        self.firmware.close()
+
+    # Status read that must succeed, failing the test otherwise
+    def status(self):
+        status = self.controller.get_status()
+        assert status is not None, "status read failed"
+        return status
+
+    def calibrate(self):
+        self.controller.calibrate()
+        # Calibration ends parked at the up position, the top of travel
+        return poll(self.status,
+                    lambda s: s.calibrated and s.position == s.top_position)
+
+    # Test calibration - finds the top and parks at the up position
+    def test_calibrate(self):
+        self.start()
+        status = self.calibrate()
+        self.assertTrue(status.calibrated)
+        self.assertEqual(status.top_position,
+                         self.firmware.motor.top_switch - MotorFirmware.UP_OFFSET)
+        self.assertEqual(status.position, status.top_position)
+        self.assertEqual(status.speed, MotorFirmware.BOOT_SPEED)
+
+    # Test a move - acknowledged through the move sequence register
+    def test_move_to_position(self):
+        self.start()
+        self.calibrate()
+        self.assertTrue(self.controller.move_to_position(1_000_000))
+        self.assertIsNotNone(self.controller.pending_move)
+        status = poll(self.status,
+                      lambda s: not s.busy and s.move_sequence == 2)
+        self.assertIsNone(self.controller.pending_move)
+        self.assertEqual(status.target, 1_000_000)
+        self.assertEqual(status.top_position - status.position, 1_000_000)
+
+    # Test the fallbacks - firmware without the status registers
+    def test_legacy_firmware(self):
+        self.start(status=False)
+        # Old firmware answers the status read with an exception, which
+        # minimalmodbus waits out until its timeout, longer than the
+        # firmware's comms timeout. Find that out before calibrating.
+        self.controller.get_status()
+        self.calibrate()
+        self.assertFalse(self.controller.status_supported)
+        self.assertTrue(self.controller.move_to_position(500_000))
+        status = poll(self.status,
+                      lambda s: s.top_position - s.position == 500_000)
+        self.assertEqual(status.top_position - status.position, 500_000)
 
 
 if __name__ == '__main__':
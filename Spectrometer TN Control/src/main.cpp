@@ -11,6 +11,40 @@ const int testCoil = 19;
 const int depressuriseCoil = 18;
 const int resetCoil = 17;
 
+// Snapshot input registers, read by the host in one transaction together with the pressures
+const int valveMaskIreg = 4;
+const int statusFlagsIreg = 5;
+const int timestampHighIreg = 6;
+const int timestampLowIreg = 7;
+
+// Oversampling statistics of the window since the last host request, in the same read as the snapshot
+const int statsMeanIreg = 8;        // 4 regs, mean in 1/statsMeanScale raw counts
+const int statsMinIreg = 12;        // 4 regs, raw counts
+const int statsMaxIreg = 16;        // 4 regs, raw counts
+const int statsCountIreg = 20;      // readings per gauge in the window
+const int statsMeanScale = 16;
+// Four analogRead() calls take about 450 us, so reading every 4 ms keeps oversampling to about 11%
+// of the loop while still averaging 12 readings into each 50 ms sample
+const unsigned long oversamplePeriod = 4000; //time between gauge readings (us)
+
+// Depressurise progress, advanced from loop() while the depressurise coil is set
+const int ventStateIreg = 21;       // one of the vent states below
+const int ventProgressIreg = 22;    // percent of the pressure drop done
+const int ventIdle = 0; const int ventVenting = 1; const int ventDone = 2; const int ventTimedOut = 3;
+const float ventTarget = 0.1;       // pressure at which venting is done (bar)
+const unsigned long ventTimeout = 5000; //longest time to vent for (ms)
+
+// Pressure sample FIFO, drained by the host in bulk reads.
+// Record n of the ring is held at fifoBaseIreg + n * fifoRecordLength. A run of records past the
+// last slot carries on from the first, which the host reads separately.
+const int samplePeriodHreg = 0;     // holding reg, time between samples (ms)
+const int fifoHeadIreg = 32;        // sequence number of the newest sample
+const int fifoBaseIreg = 33;
+const int fifoSize = 16;
+const int fifoRecordLength = 8;     // seq, time high, time low, 4 pressures, valve mask | status flags << 8
+const unsigned int minSamplePeriod = 10;
+const unsigned int maxSamplePeriod = 1000;
+
 const int GAS1 = 0; const int GAS2 = 1; const int IN = 2; const int OUT = 3; const int VENT = 4; const int SHORT = 5;
 const int LEDS[] = {32, 34, 36, 38, 40, 42, 44, 46};
 const int VALVES[] = {8, 26, 9, 10, 22, 52, 28, 30};
@@ -23,7 +57,7 @@ const int valveCoil[] = {0, 1, 2, 3, 4, 5, 6, 7}; //coil addresses for valves
 const int STATUS_LEDS[] = {5, 6, 7, 11, 12, 13, 23, 50};
 
 //default timings
-const unsigned long pollTime = 500; //default time between pressure readings
+const unsigned long defaultSamplePeriod = 50; //default time between pressure samples (ms)
 
 //TTL Pins, T4 and T5 not working??
 const int T1 = 25; const int T2 = 3; const int T3 = 4; const int T4 = 2; const int T5 = 24; const int T6 = 27;
@@ -41,7 +75,23 @@ bool serialConnected = 0; //serial connection state
 
 float pressureInputs[4] = {0,0,0,0};  //container for pressure values from the analog pins
 
-unsigned long tPoll = 0; //start time
+//running statistics of the gauge readings over a window
+struct PressureWindow {
+    unsigned long sum[4];
+    word min[4];
+    word max[4];
+    word count;
+};
+PressureWindow sampleWindow; //readings since the last pressure sample
+PressureWindow requestWindow; //readings since the last host request
+unsigned long tOversample = 0; //time of the last gauge reading (us)
+
+int ventState = ventIdle; //state of the depressurise state machine
+unsigned long ventStart = 0; //time venting started
+float ventStartPressure = 0; //pressure when venting started (bar)
+
+unsigned long tSample = 0; //time the next pressure sample is due
+word sampleSeq = 0; //sequence number of the last sample pushed to the FIFO
 unsigned long mbTimeout = 2000; //timeout length for no comms
 unsigned long mbLast = 0; //time of last modbus command
 
@@ -61,6 +111,26 @@ ModbusSerial mb (MySerial, SlaveId, TxenPin);
 // # | TTL Coil                 | 16      | Used to enable/disable TTL control      |
 // # | Reset Coil               | 17      | Used to reset the system from GUI       |
 // # | depressurise Coil        | 18      | Used to depressurise system from GUI    |
+// # | Valve mask register      | 4       | Input reg, bit n = valve coil n         |
+// # | Status flags register    | 5       | Input reg, bit0 TTL, bit1 reset,        |
+// # | ,                        | ,       | bit2 depressurise                       |
+// # | Timestamp registers      | 6-7     | Input regs, millis() of last pressure   |
+// # | ,                        | ,       | reading, high word first                |
+// # | Stats mean registers     | 8-11    | Input regs, mean reading of each gauge  |
+// # | ,                        | ,       | since the last host request, x16        |
+// # | Stats min registers      | 12-15   | Input regs, lowest reading of each      |
+// # | ,                        | ,       | gauge                                   |
+// # | Stats max registers      | 16-19   | Input regs, highest reading of each     |
+// # | ,                        | ,       | gauge                                   |
+// # | Stats count register     | 20      | Input reg, readings per gauge in window |
+// # | Vent state register      | 21      | Input reg, 0 idle, 1 venting, 2 done,   |
+// # | ,                        | ,       | 3 timed out                             |
+// # | Vent progress register   | 22      | Input reg, percent of pressure drop     |
+// # | Sample period register   | 0       | Holding reg, ms per sample (10-1000)    |
+// # | FIFO head register       | 32      | Input reg, seq of the newest sample     |
+// # | FIFO records             | 33-160  | Input regs, 16 records of 8 regs: seq,  |
+// # | ,                        | ,       | millis() high/low, 4 raw pressures,     |
+// # | ,                        | ,       | valve mask + flags << 8                 |
 // # +--------------------------+---------+-----------------------------------------+
 
 void declarePins();
@@ -71,8 +141,16 @@ void reset();
 void setValves();
 void setValve(int valve, int state);
 void readPressure();
+void oversample();
+void clearWindow(PressureWindow &window);
+void addToWindow(PressureWindow &window, word readings[4]);
+void updateStatsRegisters();
 void updatePressureRegisters();
+void updateSnapshotRegisters();
+void pushSample(unsigned long time);
+unsigned long samplePeriod();
 void depressurise();
+void finishVent(int state);
 float convertToBar(float pressure);
 void setLED(int led, bool state);
 void updateStatus();
@@ -89,6 +167,8 @@ void setup() {
     declarePins();
     initLEDs();
     addCoils();
+    clearWindow(sampleWindow);
+    clearWindow(requestWindow);
     // Add Lamp1Coil register - Use addCoil() for digital outputs
     // mb.addCoil(Lamp1Coil);
     pinMode(test_led, OUTPUT);
@@ -110,6 +190,9 @@ void loop() {
     }
     
 
+    //a request is arriving, publish the statistics of the window it ends before answering it
+    if(MySerial.available()>0){updateStatsRegisters();}
+
     // Call once inside loop() - all magic here
     mb.task();
 
@@ -117,14 +200,16 @@ void loop() {
     // digitalWrite (13, mb.Coil (Lamp1Coil));
 
     if (mb.coil(TTLCoil) == true){
+        if (ventState == ventVenting){finishVent(ventIdle);} //TTL control takes over the valves
         handleTTL();
         TTLState = true;
     }
     else{
         if (TTLState == true){mbLast = millis();TTLState = false;serialConnected = true;}  //If system was in TTL mode, update mbLast and TTLState
 
-        //check for depressurise command
-        if(mb.coil(depressuriseCoil) == 1){depressurise();} //check for depressurise command
+        //check for depressurise command, the vent runs over many loops
+        if(mb.coil(depressuriseCoil) == 1){depressurise();}
+        else if(ventState == ventVenting){finishVent(ventIdle);} //cancelled by the host
 
         //check for reset command   
         if(mb.coil(resetCoil) == 1){reset();} //check for reset command   
@@ -132,11 +217,22 @@ void loop() {
         setValves(); //set valves based on coil values  
     }
 
-    if((long)(millis() - tPoll) > (long)pollTime){ //if it's time to poll the pressure sensors
-        tPoll = millis(); //update tPoll
+    updateSnapshotRegisters(); //keep valve/status registers in step with the coils
+
+    if(micros() - tOversample >= oversamplePeriod){ //read the gauges much faster than they are sampled
+        tOversample = micros();
+        oversample();
+    }
+
+    if((long)(millis() - tSample) >= 0){ //if it's time to sample the pressure sensors
+        unsigned long now = millis();
+        //schedule against a fixed timeline so the rate doesn't drift, unless too far behind
+        tSample += samplePeriod();
+        if((long)(now - tSample) >= 0){tSample = now + samplePeriod();}
         //read pressure sensors
         readPressure();
         updatePressureRegisters();
+        pushSample(now);
 
         //if(convertToBar(pressureInputs[2]) > 1000){depressurise();} //if pressure is too high, vent
     }
@@ -200,6 +296,25 @@ void addCoils(){
 
     for (int i = 0; i < 4; i++){
         mb.addIreg(i, 0);
+        mb.addIreg(statsMeanIreg + i, 0);
+        mb.addIreg(statsMinIreg + i, 0);
+        mb.addIreg(statsMaxIreg + i, 0);
+    }
+    mb.addIreg(statsCountIreg, 0);
+    mb.addIreg(ventStateIreg, ventIdle);
+    mb.addIreg(ventProgressIreg, 0);
+
+    mb.addIreg(valveMaskIreg, 0);
+    mb.addIreg(statusFlagsIreg, 0);
+    mb.addIreg(timestampHighIreg, 0);
+    mb.addIreg(timestampLowIreg, 0);
+
+    mb.addHreg(samplePeriodHreg, defaultSamplePeriod);
+    //every register is a node of the library's linked list, searched from the start for each
+    //register of a request, so the FIFO is added last and held only once
+    mb.addIreg(fifoHeadIreg, 0);
+    for (int i = 0; i < fifoSize * fifoRecordLength; i++){
+        mb.addIreg(fifoBaseIreg + i, 0);
     }
 }
 
@@ -245,6 +360,7 @@ void reset(){
     TTLState = true;
     mb.setCoil(TTLCoil, true);
     mb.setCoil(resetCoil, 0);
+    if (ventState == ventVenting){finishVent(ventIdle);}
     for (int i = 0; i < 8; i++) {
         mb.setCoil(valveCoil[i], 0);
     }
@@ -265,48 +381,151 @@ void setValves(){
 }
 
 void readPressure(){
-    pressureInputs[0] = analogRead(Pressure1);
-    pressureInputs[1] = analogRead(Pressure2);
-    pressureInputs[2] = analogRead(Pressure3);
-    pressureInputs[3] = analogRead(Pressure4);
+    //mean of the readings since the last sample, or a fresh reading if there were none
+    if (sampleWindow.count == 0){oversample();}
+    for (int i = 0; i < 4; i++){
+        pressureInputs[i] = (float)sampleWindow.sum[i] / sampleWindow.count;
+    }
+    clearWindow(sampleWindow);
+}
+
+void oversample(){
+    word readings[4] = {
+        (word)analogRead(Pressure1),
+        (word)analogRead(Pressure2),
+        (word)analogRead(Pressure3),
+        (word)analogRead(Pressure4),
+    };
+    addToWindow(sampleWindow, readings);
+    addToWindow(requestWindow, readings);
+}
+
+void clearWindow(PressureWindow &window){
+    for (int i = 0; i < 4; i++){
+        window.sum[i] = 0;
+        window.min[i] = 0xFFFF;
+        window.max[i] = 0;
+    }
+    window.count = 0;
+}
+
+void addToWindow(PressureWindow &window, word readings[4]){
+    if (window.count == 0xFFFF){return;} //window left open too long, keep what we have
+    for (int i = 0; i < 4; i++){
+        window.sum[i] += readings[i];
+        if (readings[i] < window.min[i]){window.min[i] = readings[i];}
+        if (readings[i] > window.max[i]){window.max[i] = readings[i];}
+    }
+    window.count++;
+}
+
+void updateStatsRegisters(){
+    //publish the window and start a new one, all zero if there were no readings
+    for (int i = 0; i < 4; i++){
+        word mean = 0;
+        if (requestWindow.count > 0){
+            mean = (requestWindow.sum[i] * statsMeanScale + requestWindow.count / 2) / requestWindow.count;
+        }
+        mb.setIreg(statsMeanIreg + i, mean);
+        mb.setIreg(statsMinIreg + i, requestWindow.count > 0 ? requestWindow.min[i] : 0);
+        mb.setIreg(statsMaxIreg + i, requestWindow.max[i]);
+    }
+    mb.setIreg(statsCountIreg, requestWindow.count);
+    clearWindow(requestWindow);
 }
 
 void updatePressureRegisters(){
-    mb.setIreg(0, pressureInputs[0]);
-    mb.setIreg(1, pressureInputs[1]);
-    mb.setIreg(2, pressureInputs[2]);
-    mb.setIreg(3, pressureInputs[3]);
+    mb.setIreg(0, pressureInputs[0] + 0.5);
+    mb.setIreg(1, pressureInputs[1] + 0.5);
+    mb.setIreg(2, pressureInputs[2] + 0.5);
+    mb.setIreg(3, pressureInputs[3] + 0.5);
+
+    //timestamp of this reading so the host can tell fresh samples from repeats
+    unsigned long now = millis();
+    mb.setIreg(timestampHighIreg, (now >> 16) & 0xFFFF);
+    mb.setIreg(timestampLowIreg, now & 0xFFFF);
+}
+
+void updateSnapshotRegisters(){
+    //pack the valve coils into one register
+    word valveMask = 0;
+    for (int i = 0; i < 8; i++)
+    {
+        if (mb.coil(valveCoil[i])){valveMask |= (1 << i);}
+    }
+    mb.setIreg(valveMaskIreg, valveMask);
+
+    //pack the TTL, reset and depressurise coils into one register
+    word statusFlags = 0;
+    if (mb.coil(TTLCoil)){statusFlags |= 0x01;}
+    if (mb.coil(resetCoil)){statusFlags |= 0x02;}
+    if (mb.coil(depressuriseCoil)){statusFlags |= 0x04;}
+    mb.setIreg(statusFlagsIreg, statusFlags);
+}
+
+unsigned long samplePeriod(){
+    //sample period set by the host, within limits
+    return constrain(mb.hreg(samplePeriodHreg), minSamplePeriod, maxSamplePeriod);
+}
+
+void pushSample(unsigned long time){
+    //store the sample in its slot of the FIFO
+    sampleSeq++;
+    word record[fifoRecordLength] = {
+        sampleSeq,
+        (word)((time >> 16) & 0xFFFF),
+        (word)(time & 0xFFFF),
+        (word)(pressureInputs[0] + 0.5),
+        (word)(pressureInputs[1] + 0.5),
+        (word)(pressureInputs[2] + 0.5),
+        (word)(pressureInputs[3] + 0.5),
+        (word)((mb.ireg(statusFlagsIreg) << 8) | (mb.ireg(valveMaskIreg) & 0xFF)),
+    };
+    int slot = sampleSeq % fifoSize;
+    for (int i = 0; i < fifoRecordLength; i++){
+        mb.setIreg(fifoBaseIreg + slot * fifoRecordLength + i, record[i]);
+    }
+    //publish the sample only once its record is complete
+    mb.setIreg(fifoHeadIreg, sampleSeq);
 }
 
 void depressurise(){
-    //depressurise the system
-    Serial.println("LOG: Depressurising system");
-    if(convertToBar(analogRead(Pressure3)) > 0.1){
-        setValve(GAS1, 0);
-        setValve(GAS2, 0);
-        setValve(IN, 0);
-        setValve(OUT, 1);
-        setValve(VENT, 0);
-        setValve(SHORT, 1);
-        unsigned long startTime = millis();
-        while (convertToBar(analogRead(Pressure3)) > 0.1) {
-            if ((long)(millis() - startTime) > 5000) {      //timeout, break loop
-                break;
-            }
-            delay(50);
+    //advance the vent by one step without blocking, so Modbus requests are still answered.
+    //The valves are driven through their coils so the host sees them change.
+    float pressure = convertToBar(pressureInputs[2]);
+    if (ventState != ventVenting){
+        if (pressure <= ventTarget){finishVent(ventDone); return;} //nothing to vent
+        ventStart = millis();
+        ventStartPressure = pressure;
+        ventState = ventVenting;
+        for (int i = 0; i < 8; i++) {
+            mb.setCoil(valveCoil[i], 0);
         }
-        setValve(SHORT, 0);
-        setValve(OUT, 0);
+        mb.setCoil(valveCoil[OUT], 1);
+        mb.setCoil(valveCoil[SHORT], 1);
+        mb.setIreg(ventStateIreg, ventState);
+        mb.setIreg(ventProgressIreg, 0);
+        return;
     }
-    else{
-        setValve(GAS1, 0);
-        setValve(GAS2, 0);
-        setValve(IN, 0);
-        setValve(OUT, 0);
-        setValve(VENT, 0);
-        setValve(SHORT, 0);
+
+    //progress as the share of the pressure drop done so far
+    float drop = ventStartPressure - ventTarget;
+    long progress = (long)(100 * (ventStartPressure - pressure) / drop);
+    mb.setIreg(ventProgressIreg, constrain(progress, 0, 100));
+
+    if (pressure <= ventTarget){finishVent(ventDone);}
+    else if ((long)(millis() - ventStart) > (long)ventTimeout){finishVent(ventTimedOut);} //timeout, stop venting
+}
+
+void finishVent(int state){
+    //close every valve and report how the vent ended
+    for (int i = 0; i < 8; i++) {
+        mb.setCoil(valveCoil[i], 0);
     }
-    mb.setCoil(depressuriseCoil, 0);  
+    mb.setCoil(depressuriseCoil, 0);
+    ventState = state;
+    mb.setIreg(ventStateIreg, ventState);
+    if (state == ventDone){mb.setIreg(ventProgressIreg, 100);}
 }
 
 float convertToBar(float pressure){
@@ -77,12 +77,17 @@ bool initFlag = false;
 const int intPin1 = 10; // This is the interrupt pin for the uStepper S32
 const int intPin2 = 9; // This is the interrupt pin for the uStepper S32
 
+const int statusReg = 10; // Status flags register, see table below
+const int moveSeqReg = 11; // Move sequence register, see table below
+
 // Steps/mm= (200 steps/rev × 256 microsteps)/2mm pitch = 25,600 steps/mm
 
 // # +--------------------------+---------+-----------------------------------------+
 // # |         Coil/reg         | Address |                 Purpose                 |
 // # +--------------------------+---------+-----------------------------------------+
 // # | Command Register         | 2       | Holds the command instruction           |
+// # | ,                        | ,       | 'X' written together with the target    |
+// # | ,                        | ,       | (FC16, regs 2-4) moves without the coil |
 // # | Desired Position Reg     | 3-4     | two hold registers used to contain the  |
 // # | ,                        | ,       | desired motor position                  |
 // # | Current Position Reg     | 5-6     | two hold registers used to contain the  |
@@ -90,6 +95,10 @@ const int intPin2 = 9; // This is the interrupt pin for the uStepper S32
 // # | Top Position Reg         | 7-8     | two hold registers used to contain the  |
 // # | ,                        | ,       | top motor position                      |
 // # | Speed Reg                | 9       | Contains the speed of the motor         |
+// # | Status Flags Reg         | 10      | bit0 calibrated, bit1 busy,             |
+// # | ,                        | ,       | bit2 top limit, bit3 bottom limit       |
+// # | Move Sequence Reg        | 11      | Incremented each time a move command is |
+// # | ,                        | ,       | accepted                                |
 // # | Command Coil             | 1       | Flag to show if command is waiting      |                
 // # | Calibration Coil         | 2       | Flag to show if motor is calibrated     |
 // # | Init Coil                | 3       | Flag to show if serial comms established|                
@@ -132,9 +141,15 @@ void loop() {
   mb.task(); // Modbus task, call early
 
   getCurrentPosition(); // Get current position
+  updateStatus(); // Status flags, read with the positions in one request
 
   //char input = MySerial.read();
-  if (mb.coil(1) == 1 && initFlag == false) {
+  if (mb.Hreg(2) == 'X' && initFlag == false) {
+    // Written together with the target in one request, no command flag needed
+    handleInput('X');
+    mb.setHreg(2, 0);
+  }
+  else if (mb.coil(1) == 1 && initFlag == false) {
     uint16_t input = mb.Hreg(2);
     handleInput(static_cast<char>(input));
     mb.setHreg(2, 0);
@@ -263,6 +278,7 @@ void handleInput(char input) {
         //Serial.print("Current position: "); Serial.println(currentPosition);
       }
       break;
+    case 'X': // Move to position, sent with the target
     case 'x': // Move to position
       //Serial.println("Moving to position!");
       //stepper.setCurrent(runCurrent);
@@ -276,6 +292,7 @@ void handleInput(char input) {
       setPosition = min(upPosition, (upPosition - setPosition));
       setPosition = max(downPosition, setPosition);
       stepper.movePosition(setPosition);
+      mb.setHreg(moveSeqReg, mb.Hreg(moveSeqReg) + 1); // Acknowledge the move
       break;
     case 'c': // Calibrate
       mb.setCoil(2, 0); // Set calibration flag to false
@@ -374,6 +391,8 @@ void addCoils(){
   mb.addHreg(7, 0);
   mb.addHreg(8, 0);
   mb.addHreg(9, 0);
+  mb.addHreg(statusReg, 0);
+  mb.addHreg(moveSeqReg, 0);
   mb.addCoil(1, 0);
   mb.addCoil(2, 0);
   mb.addCoil(3, 0);
@@ -391,6 +410,15 @@ void disassemble(int32_t combined, int16_t &high, uint16_t &low) {
     low = static_cast<uint16_t>(combined & 0xFFFF);
 }
 
+void updateStatus(){
+  uint16_t flags = 0;
+  if (mb.coil(2)) flags |= 0x01; // Calibrated
+  if (initFlag || stepper.getMotorState()) flags |= 0x02; // Moving or calibrating
+  if (digitalRead(intPin1) == HIGH) flags |= 0x04; // Top limit
+  if (digitalRead(intPin2) == HIGH) flags |= 0x08; // Bottom limit
+  mb.setHreg(statusReg, flags);
+}
+
 void setTopPosition(int32_t topPosition){
   int16_t high;
   uint16_t low;